@@ -0,0 +1,63 @@
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from datetime import datetime
+from ..models.communication_delivery import CommunicationDelivery
+from ..models.tenant import Tenant
+from ..models.property import Property
+
+class CommunicationDeliveryCRUD:
+    def get_tenant_history(
+        self,
+        db: Session,
+        tenant_id: int,
+        since: Optional[datetime] = None,
+        channel: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[CommunicationDelivery]:
+        """Deliveries to one tenant, newest first"""
+        query = db.query(CommunicationDelivery).filter(CommunicationDelivery.tenant_id == tenant_id)
+        if since:
+            query = query.filter(CommunicationDelivery.created_at >= since)
+        if channel:
+            query = query.filter(CommunicationDelivery.channel == channel)
+        return query.order_by(CommunicationDelivery.created_at.desc()).offset(skip).limit(limit).all()
+    
+    def get_failed_deliveries(
+        self,
+        db: Session,
+        owner_id: Optional[int] = None,
+        log_id: Optional[int] = None,
+        channel: Optional[str] = None,
+        since: Optional[datetime] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[CommunicationDelivery]:
+        """Failed deliveries, newest first, optionally limited to one owner's tenants"""
+        query = db.query(CommunicationDelivery).filter(CommunicationDelivery.status.in_(["failed", "error"]))
+        if owner_id is not None:
+            query = query.join(Tenant, Tenant.id == CommunicationDelivery.tenant_id).join(
+                Property, Property.id == Tenant.property_id
+            ).filter(Property.owner_id == owner_id)
+        if log_id is not None:
+            query = query.filter(CommunicationDelivery.log_id == log_id)
+        if channel:
+            query = query.filter(CommunicationDelivery.channel == channel)
+        if since:
+            query = query.filter(CommunicationDelivery.created_at >= since)
+        return query.order_by(CommunicationDelivery.created_at.desc()).offset(skip).limit(limit).all()
+    
+    def get_failed_tenant_ids(self, db: Session, log_id: int) -> Dict[str, List[int]]:
+        """Tenant ids with a failed delivery in a log, per channel"""
+        rows = db.query(CommunicationDelivery.channel, CommunicationDelivery.tenant_id).filter(
+            CommunicationDelivery.log_id == log_id,
+            CommunicationDelivery.status.in_(["failed", "error"]),
+            CommunicationDelivery.channel.in_(["email", "sms"])
+        ).distinct().all()
+        
+        failed: Dict[str, List[int]] = {}
+        for channel, tenant_id in rows:
+            failed.setdefault(channel, []).append(tenant_id)
+        return failed
+
+communication_delivery_crud = CommunicationDeliveryCRUD()
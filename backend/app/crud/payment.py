@@ -3,6 +3,7 @@ from typing import List, Optional
 from datetime import datetime, date
 from ..models.payment import Payment
 from ..schemas.payment import PaymentCreate, PaymentUpdate
+from ..services.tenant_ledger import tenant_ledger_service
 
 class PaymentCRUD:
     def create_payment(self, db: Session, payment: PaymentCreate) -> Payment:
@@ -22,6 +23,8 @@ class PaymentCRUD:
             notes=payment.notes
         )
         db.add(db_payment)
+        db.flush()
+        tenant_ledger_service.post_payment_record(db, db_payment)
         db.commit()
         db.refresh(db_payment)
         return db_payment
@@ -69,11 +72,17 @@ class PaymentCRUD:
         if not db_payment:
             return None
         
+        previous_tenant_id = db_payment.tenant_id
         update_data = payment_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_payment, field, value)
         
         db_payment.updated_at = datetime.utcnow()
+        db.flush()
+        # Amount, type, status or tenant may have changed; replay the affected ledgers
+        tenant_ids = {tenant_id for tenant_id in (previous_tenant_id, db_payment.tenant_id) if tenant_id}
+        if tenant_ids:
+            tenant_ledger_service.rebuild(db, list(tenant_ids))
         db.commit()
         db.refresh(db_payment)
         return db_payment
@@ -88,6 +97,7 @@ class PaymentCRUD:
         db_payment.payment_method = payment_method
         db_payment.reference_number = reference_number
         db_payment.updated_at = datetime.utcnow()
+        tenant_ledger_service.post_payment_record(db, db_payment)
         db.commit()
         db.refresh(db_payment)
         return db_payment
@@ -97,7 +107,11 @@ class PaymentCRUD:
         if not db_payment:
             return False
         
+        tenant_id = db_payment.tenant_id
         db.delete(db_payment)
+        db.flush()
+        if tenant_id:
+            tenant_ledger_service.rebuild(db, [tenant_id])
         db.commit()
         return True
     
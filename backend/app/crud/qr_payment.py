@@ -112,18 +112,17 @@ class QRCodePaymentCRUD:
         return True
 
     def cleanup_expired_qr_payments(self, db: Session) -> int:
-        """Clean up expired QR code payments."""
-        expired_payments = db.query(QRCodePayment).filter(
-            and_(
-                QRCodePayment.status == QRCodeStatus.ACTIVE,
-                QRCodePayment.expires_at <= datetime.utcnow()
-            )
-        ).all()
-        
-        for payment in expired_payments:
-            payment.status = QRCodeStatus.EXPIRED
+        """Mark active QR code payments past expires_at as expired (one UPDATE)."""
+        now = datetime.utcnow()
+        expired_count = db.query(QRCodePayment).filter(
+            QRCodePayment.status == QRCodeStatus.ACTIVE,
+            QRCodePayment.expires_at <= now
+        ).update(
+            {QRCodePayment.status: QRCodeStatus.EXPIRED, QRCodePayment.updated_at: now},
+            synchronize_session=False
+        )
         
         db.commit()
-        return len(expired_payments)
+        return expired_count
 
 qr_payment_crud = QRCodePaymentCRUD()
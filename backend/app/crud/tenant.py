@@ -3,6 +3,7 @@ from typing import List, Optional
 from datetime import datetime, date, timedelta
 from ..models.tenant import Tenant
 from ..schemas.tenant import TenantCreate, TenantUpdate, TenantPaymentStatus
+from ..services.recipient_groups import recipient_group_service
 
 class TenantCRUD:
     def create_tenant(self, db: Session, tenant: TenantCreate) -> Tenant:
@@ -36,6 +37,8 @@ class TenantCRUD:
         db.add(db_tenant)
         db.commit()
         db.refresh(db_tenant)
+        # Group counts are cached per owner and for admins, so drop them all
+        recipient_group_service.invalidate()
         return db_tenant
     
     def get_tenant_by_id(self, db: Session, tenant_id: int) -> Optional[Tenant]:
@@ -97,6 +100,7 @@ class TenantCRUD:
         db_tenant.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_tenant)
+        recipient_group_service.invalidate()
         return db_tenant
     
     def update_tenant_payment_status(self, db: Session, tenant_id: int, status: str, payment_date: date = None) -> Optional[Tenant]:
@@ -113,6 +117,7 @@ class TenantCRUD:
         db_tenant.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_tenant)
+        recipient_group_service.invalidate()
         return db_tenant
     
     def move_out_tenant(self, db: Session, tenant_id: int, move_out_date: date) -> Optional[Tenant]:
@@ -127,6 +132,7 @@ class TenantCRUD:
         db_tenant.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_tenant)
+        recipient_group_service.invalidate()
         return db_tenant
     
     def delete_tenant(self, db: Session, tenant_id: int) -> bool:
@@ -136,6 +142,7 @@ class TenantCRUD:
         
         db.delete(db_tenant)
         db.commit()
+        recipient_group_service.invalidate()
         return True
     
     def search_tenants(self, db: Session, query: str, skip: int = 0, limit: int = 100) -> List[Tenant]:
@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from contextlib import contextmanager
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
@@ -29,6 +31,19 @@ def get_db():
     finally:
         db.close()
 
+@contextmanager
+def get_session(db: Optional[Session] = None):
+    """Use the given session, or open a new one that is closed afterwards.
+    For services called both from requests (with a session) and from background jobs."""
+    if db is not None:
+        yield db
+        return
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
 def init_db():
     """Initialize database by creating all tables."""
     Base.metadata.create_all(bind=engine)
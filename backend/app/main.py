@@ -4,9 +4,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import os
 from pathlib import Path
+from sqlalchemy import inspect
 
 from .database import engine, Base
-from .routers import auth, property, unit, payment, maintenance, utility, analytics, unit_utility, rental_units, rental_stats, tenant, payment_monitoring, inspections, qr_payment, mobile_payment, property_qr, property_mobile_payment, agent, admin, payment_methods, inspection_payments, webhooks, communications, accounting, reports, airbnb, inspection_bookings, additional_services
+from .routers import auth, property, unit, payment, maintenance, utility, analytics, unit_utility, rental_units, rental_stats, tenant, payment_monitoring, inspections, qr_payment, mobile_payment, property_qr, property_mobile_payment, agent, admin, payment_methods, inspection_payments, webhooks, communications, accounting, reports, airbnb, inspection_bookings, additional_services, jobs, outbox, notifications, qr_images
 
 # Import all models to register them with SQLAlchemy
 from .models import *
@@ -48,6 +49,95 @@ def _ensure_sqlite_schema():
 
 _ensure_sqlite_schema()
 
+# Columns added to existing tables after they were first created.
+# create_all() never alters existing tables, so add these explicitly.
+_EXTRA_COLUMNS = [
+    ("communication_logs", "claimed_by", "VARCHAR"),
+    ("communication_logs", "claim_expires_at", "TIMESTAMP"),
+    ("communication_logs", "dispatch_attempts", "INTEGER DEFAULT 0"),
+    ("mobile_payments", "status_checked_at", "TIMESTAMP"),
+    ("mobile_payments", "next_status_check_at", "TIMESTAMP"),
+    ("payments", "invoice_key", "VARCHAR"),
+    ("tenant_balances", "opening_credit", "NUMERIC(12, 2)"),
+]
+
+def _ensure_columns():
+    try:
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table_name, column_name, column_type in _EXTRA_COLUMNS:
+                columns = {column["name"] for column in inspector.get_columns(table_name)}
+                if column_name not in columns:
+                    conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};")
+    except Exception as e:
+        print(f"⚠️  Warning: Could not add columns: {e}")
+
+_ensure_columns()
+
+# Enum values added after the PostgreSQL enum types were first created
+_EXTRA_ENUM_VALUES = [
+    ("paymentstatus", "FAILED"),
+]
+
+def _ensure_enum_values():
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        # ALTER TYPE ... ADD VALUE cannot run inside a transaction block on older servers
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for type_name, value in _EXTRA_ENUM_VALUES:
+                conn.exec_driver_sql(f"ALTER TYPE {type_name} ADD VALUE IF NOT EXISTS '{value}';")
+    except Exception as e:
+        print(f"⚠️  Warning: Could not add enum values: {e}")
+
+_ensure_enum_values()
+
+# Indexes added to existing tables after they were first created.
+# create_all() only builds indexes for new tables, so create these explicitly.
+_EXTRA_INDEXES = [
+    ("ix_tenants_next_payment_due", "tenants", "next_payment_due"),
+    ("ix_communication_logs_scheduled_at", "communication_logs", "scheduled_at"),
+    ("ix_notifications_user_read_created", "notifications", "user_id, is_read, created_at"),
+    ("ix_mobile_payments_next_status_check_at", "mobile_payments", "next_status_check_at"),
+    ("ix_payments_invoice_key", "payments", "invoice_key", "unique"),
+    ("ix_payments_status_due_date", "payments", "status, due_date"),
+    ("ix_qr_code_payments_status_expires_at", "qr_code_payments", "status, expires_at"),
+    (
+        "uq_inbound_webhook_events_provider_transaction_status", "inbound_webhook_events",
+        "provider, transaction_id, COALESCE(provider_status, '')", "unique"
+    ),
+]
+
+# Unique constraints replaced by a wider key (PostgreSQL; SQLite cannot drop constraints)
+_DROPPED_CONSTRAINTS = [
+    ("inbound_webhook_events", "uq_inbound_webhook_events_provider_transaction"),
+]
+
+def _drop_constraints():
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            for table_name, constraint_name in _DROPPED_CONSTRAINTS:
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint_name};")
+    except Exception as e:
+        print(f"⚠️  Warning: Could not drop constraints: {e}")
+
+_drop_constraints()
+
+def _ensure_indexes():
+    try:
+        with engine.begin() as conn:
+            for index_name, table_name, columns, *options in _EXTRA_INDEXES:
+                unique = "UNIQUE " if "unique" in options else ""
+                conn.exec_driver_sql(
+                    f"CREATE {unique}INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns});"
+                )
+    except Exception as e:
+        print(f"⚠️  Warning: Could not create indexes: {e}")
+
+_ensure_indexes()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Rental Management System API",
@@ -99,6 +189,10 @@ app.include_router(reports.router, prefix="/api/v1")
 app.include_router(airbnb.router, prefix="/api/v1")
 app.include_router(inspection_bookings.router, prefix="/api/v1")
 app.include_router(additional_services.router, prefix="/api/v1")
+app.include_router(jobs.router, prefix="/api/v1")
+app.include_router(outbox.router, prefix="/api/v1")
+app.include_router(notifications.router, prefix="/api/v1")
+app.include_router(qr_images.router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
@@ -126,6 +220,20 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️  Warning: Could not start payment scheduler: {e}")
         print("   Automation features will not be available")
+    
+    try:
+        from .services.outbox import outbox_worker
+        outbox_worker.start()
+        print("✅ Outbound message worker started")
+    except Exception as e:
+        print(f"⚠️  Warning: Could not start outbound message worker: {e}")
+    
+    try:
+        from .services.webhook_events import inbound_event_worker
+        inbound_event_worker.start()
+        print("✅ Inbound webhook worker started")
+    except Exception as e:
+        print(f"⚠️  Warning: Could not start inbound webhook worker: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -136,6 +244,20 @@ async def shutdown_event():
         print("✅ Automated payment scheduler stopped")
     except Exception as e:
         print(f"Warning: Error stopping scheduler: {e}")
+    
+    try:
+        from .services.outbox import outbox_worker
+        outbox_worker.stop()
+        print("✅ Outbound message worker stopped")
+    except Exception as e:
+        print(f"Warning: Error stopping outbound message worker: {e}")
+    
+    try:
+        from .services.webhook_events import inbound_event_worker
+        inbound_event_worker.stop()
+        print("✅ Inbound webhook worker stopped")
+    except Exception as e:
+        print(f"Warning: Error stopping inbound webhook worker: {e}")
 
 # Global exception handler
 @app.exception_handler(404)
@@ -15,7 +15,7 @@ from .utility import Utility
 from .maintenance import MaintenanceRequest
 from .notification import Notification
 from .inspection_booking import InspectionBooking
-from .qr_payment import QRCodePayment
+from .qr_payment import QRCodePayment, QRCodePaymentArchive
 from .mobile_payment import MobilePayment
 from .agent import Agent
 from .rental_unit import RentalUnit
@@ -26,6 +26,12 @@ from .communication_log import CommunicationLog
 from .airbnb import Airbnb
 from .airbnb_booking import AirbnbBooking
 from .additional_service import AdditionalService, inspection_booking_services
+from .payment_monitor_run import PaymentMonitorRun
+from .scheduled_job import ScheduledJob, JobRun
+from .outbound_message import OutboundMessage
+from .communication_delivery import CommunicationDelivery
+from .inbound_webhook_event import InboundWebhookEvent
+from .tenant_ledger import TenantLedgerEntry, TenantBalance
 
 # Export all models and enums
 __all__ = [
@@ -56,6 +62,7 @@ __all__ = [
     "Notification",
     "InspectionBooking",
     "QRCodePayment",
+    "QRCodePaymentArchive",
     "MobilePayment",
     "Agent",
     "RentalUnit",
@@ -66,5 +73,13 @@ __all__ = [
     "Airbnb",
     "AirbnbBooking",
     "AdditionalService",
-    "inspection_booking_services"
+    "inspection_booking_services",
+    "PaymentMonitorRun",
+    "ScheduledJob",
+    "JobRun",
+    "OutboundMessage",
+    "CommunicationDelivery",
+    "InboundWebhookEvent",
+    "TenantLedgerEntry",
+    "TenantBalance"
 ]
\ No newline at end of file
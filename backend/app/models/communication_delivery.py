@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..database import Base
+
+class CommunicationDelivery(Base):
+    __tablename__ = "communication_deliveries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    log_id = Column(Integer, ForeignKey("communication_logs.id"), nullable=False, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    channel = Column(String, nullable=False)  # email, sms (migrated rows without per-channel detail keep the log method)
+    recipient = Column(String)  # Email address or phone number used
+    status = Column(String, nullable=False)  # sent, failed, error
+    provider_message_id = Column(String)
+    provider_status = Column(String)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    
+    # Relationships
+    log = relationship("CommunicationLog", back_populates="deliveries")
+    tenant = relationship("Tenant")
+    
+    __table_args__ = (
+        # Per-tenant history, newest first
+        Index("ix_communication_deliveries_tenant_created", "tenant_id", "created_at"),
+        # Failure lookups by status and channel
+        Index("ix_communication_deliveries_status_channel", "status", "channel", "created_at"),
+    )
@@ -16,7 +16,10 @@ class CommunicationLog(Base):
     sent_count = Column(Integer, default=0)
     failed_count = Column(Integer, default=0)
     status = Column(String, default="pending")  # pending, sent, failed, scheduled
-    scheduled_at = Column(DateTime)
+    scheduled_at = Column(DateTime, index=True)
+    claimed_by = Column(String)  # Worker sending a scheduled log
+    claim_expires_at = Column(DateTime)  # Lease; the log can be reclaimed after this
+    dispatch_attempts = Column(Integer, default=0)  # Sends started; stalled sends are requeued up to a limit
     sent_at = Column(DateTime)
     delivery_report = Column(Text)  # JSON: detailed delivery status per recipient
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -24,6 +27,7 @@ class CommunicationLog(Base):
     # Relationships
     sender = relationship("User", foreign_keys=[sender_id])
     template = relationship("MessageTemplate", foreign_keys=[template_id])
+    deliveries = relationship("CommunicationDelivery", back_populates="log", cascade="all, delete-orphan")
 
 
 
@@ -24,6 +24,7 @@ class PaymentStatus(str, enum.Enum):
     PAID = "paid"
     OVERDUE = "overdue"
     PARTIAL = "partial"
+    FAILED = "failed"
 
 class PaymentType(str, enum.Enum):
     RENT = "rent"
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, text
+from datetime import datetime
+from ..database import Base
+
+class InboundWebhookEvent(Base):
+    __tablename__ = "inbound_webhook_events"
+    __table_args__ = (
+        # One event per reported status, so a later callback for the same transaction
+        # (e.g. SUCCESSFUL after PENDING) is stored; a missing status counts as ''
+        Index(
+            "uq_inbound_webhook_events_provider_transaction_status",
+            "provider", "transaction_id", text("COALESCE(provider_status, '')"),
+            unique=True
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, nullable=False)  # mtn, airtel
+    transaction_id = Column(String, nullable=False)  # Provider transaction id (or payload hash when missing)
+    external_id = Column(String, index=True)  # Our mobile payment external_id; events are applied in order per value
+    provider_status = Column(String)  # Status reported in the callback
+    payload = Column(Text, nullable=False)  # Raw callback body
+    
+    # Processing state
+    status = Column(String, default="pending", index=True)  # pending, processing, processed, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    locked_until = Column(DateTime)  # Claim lease while a worker is processing
+    last_error = Column(Text)
+    result = Column(String)  # e.g. paid, failed, payment_not_found, already_final
+    
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -33,6 +33,8 @@ class MobilePayment(Base):
     initiated_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime)
     failed_at = Column(DateTime)
+    status_checked_at = Column(DateTime)  # Last provider status poll
+    next_status_check_at = Column(DateTime, index=True)  # When the pending payment poller checks it next
     
     # Provider response data
     provider_response = Column(Text)  # JSON string of provider response
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Date, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Date, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -16,3 +16,8 @@ class Notification(Base):
     
     # Relationships
     user = relationship("User")
+    
+    __table_args__ = (
+        # Inbox pages and unread counts per user
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+    )
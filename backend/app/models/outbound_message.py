@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from datetime import datetime
+from ..database import Base
+
+class OutboundMessage(Base):
+    __tablename__ = "outbound_messages"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String, nullable=False)  # sms, email
+    provider = Column(String, nullable=False, index=True)  # africas_talking, sendgrid
+    recipient = Column(String, nullable=False)  # Phone number or email address
+    subject = Column(String)  # For emails
+    body = Column(Text, nullable=False)
+    html_body = Column(Text)
+    
+    # What the message is about, e.g. inspection_booking 12
+    source_type = Column(String)
+    source_id = Column(Integer)
+    
+    # Delivery state
+    status = Column(String, default="pending", index=True)  # pending, sending, sent, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=6)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    locked_until = Column(DateTime)  # Claim lease while a worker is sending
+    last_error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
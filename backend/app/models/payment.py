@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Date, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Date, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -21,6 +21,7 @@ class Payment(Base):
     payment_method = Column(String)  # cash, check, bank_transfer, online
     reference_number = Column(String)
     notes = Column(Text)
+    invoice_key = Column(String, unique=True, index=True)  # Set on generated invoices, e.g. unit_utility:12:7:202501
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -30,3 +31,8 @@ class Payment(Base):
     payer = relationship("User", back_populates="payments")
     utility = relationship("Utility", back_populates="payments")
     unit_utility = relationship("UnitUtility", back_populates="payments")
+    
+    __table_args__ = (
+        # Open (pending/overdue) payments by due date, for reminders
+        Index("ix_payments_status_due_date", "status", "due_date"),
+    )
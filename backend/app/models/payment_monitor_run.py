@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text
+from datetime import datetime
+from ..database import Base
+
+class PaymentMonitorRun(Base):
+    __tablename__ = "payment_monitor_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    mode = Column(String, nullable=False)  # full, incremental
+    status = Column(String, default="running")  # running, completed, failed
+    
+    # Due date window covered by this run
+    watermark_from = Column(Date)  # Watermark of the previous successful run (None for full runs)
+    watermark_to = Column(Date, nullable=False, index=True)  # Date the run evaluated statuses for
+    
+    # Per-run stats
+    overdue_updated = Column(Integer, default=0)
+    due_updated = Column(Integer, default=0)
+    pending_updated = Column(Integer, default=0)
+    moved_out_updated = Column(Integer, default=0)
+    status_changed = Column(Integer, default=0)
+    total_processed = Column(Integer, default=0)
+    duration_ms = Column(Integer)
+    error = Column(Text)
+    
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
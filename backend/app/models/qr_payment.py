@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Date, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Date, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
 from ..database import Base
@@ -27,3 +27,28 @@ class QRCodePayment(Base):
     tenant = relationship("Tenant", back_populates="qr_payments")
     payer = relationship("User", back_populates="qr_payments")
     mobile_payments = relationship("MobilePayment", back_populates="qr_payment", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Expiry sweeps: active codes past expires_at
+        Index("ix_qr_code_payments_status_expires_at", "status", "expires_at"),
+    )
+
+class QRCodePaymentArchive(Base):
+    """Used, expired and cancelled QR code payments moved out after the retention window"""
+    __tablename__ = "qr_code_payments_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Original qr_code_payments id
+    unit_id = Column(Integer, nullable=False)
+    tenant_id = Column(Integer)
+    payer_id = Column(Integer, nullable=False)
+    amount = Column(Numeric(10, 2), nullable=False)
+    account_number = Column(String, nullable=False)
+    mobile_money_provider = Column(SQLEnum(PaymentMethod))
+    qr_code_data = Column(Text, nullable=False)
+    qr_code_image_path = Column(String)
+    status = Column(SQLEnum(QRCodeStatus))
+    expires_at = Column(DateTime)
+    used_at = Column(DateTime)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..database import Base
+
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    description = Column(String)
+    cron_expression = Column(String, nullable=False)  # minute hour day-of-month month day-of-week (UTC)
+    is_enabled = Column(Boolean, default=True)
+    
+    # Scheduling state
+    next_run_at = Column(DateTime, index=True)
+    last_run_at = Column(DateTime)
+    last_status = Column(String)  # completed, failed
+    last_duration_ms = Column(Integer)
+    last_rows_processed = Column(Integer)
+    last_error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    runs = relationship("JobRun", back_populates="job", cascade="all, delete-orphan")
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("scheduled_jobs.id"), nullable=False, index=True)
+    trigger = Column(String, default="schedule")  # schedule, catch_up, manual
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    
+    scheduled_for = Column(DateTime)  # Planned fire time (None for manual runs)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Integer)
+    rows_processed = Column(Integer)
+    result = Column(Text)  # JSON summary returned by the job
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    job = relationship("ScheduledJob", back_populates="runs")
@@ -47,7 +47,7 @@ class Tenant(Base):
     is_active = Column(Boolean, default=True)
     rent_payment_status = Column(String, default="pending")  # pending, paid, overdue, partial
     last_payment_date = Column(Date)
-    next_payment_due = Column(Date)
+    next_payment_due = Column(Date, index=True)
     
     # Additional Information
     emergency_contact_name = Column(String)
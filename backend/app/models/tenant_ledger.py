@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, DateTime, Date, Numeric, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..database import Base
+
+class TenantLedgerEntry(Base):
+    __tablename__ = "tenant_ledger_entries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    entry_type = Column(String, nullable=False)  # charge, payment
+    amount = Column(Numeric(12, 2), nullable=False)  # Always positive; entry_type gives the direction
+    balance_after = Column(Numeric(12, 2), nullable=False)  # Tenant balance after this line (positive = owes)
+    entry_date = Column(Date, nullable=False)
+    description = Column(String)
+    
+    # Where the line comes from: rent (source_id = YYYYMM period), payment, mobile_payment
+    source_type = Column(String, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    tenant = relationship("Tenant")
+    
+    __table_args__ = (
+        # A source is posted to a tenant's ledger once per direction
+        UniqueConstraint("tenant_id", "source_type", "source_id", "entry_type", name="uq_tenant_ledger_entries_source"),
+        # Statement view, in posting order
+        Index("ix_tenant_ledger_entries_tenant_id", "tenant_id", "id"),
+    )
+
+class TenantBalance(Base):
+    __tablename__ = "tenant_balances"
+    
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), primary_key=True)
+    balance = Column(Numeric(12, 2), default=0)  # Charged minus paid; negative = credit
+    total_charged = Column(Numeric(12, 2), default=0)
+    total_paid = Column(Numeric(12, 2), default=0)
+    other_charged = Column(Numeric(12, 2), default=0)  # Non-rent charges (utilities, deposits, penalties)
+    paid_through = Column(Date)  # Last day of rent covered by payments
+    opening_credit = Column(Numeric(12, 2))  # Rent settled before the ledger; fixed at the first build
+    last_entry_id = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    tenant = relationship("Tenant")
@@ -20,7 +20,8 @@ from ..models.airbnb_booking import AirbnbBooking
 from ..models.airbnb import Airbnb
 from ..schemas.settings import SystemSettingsResponse, SystemSettingsUpdate
 from ..crud import settings as settings_crud
-from ..services.africas_talking import africas_talking_service
+from ..services.outbox import enqueue_sms
+from ..services.http_client import provider_http_client
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -377,10 +378,8 @@ async def approve_inspection_booking(
         # Update status to confirmed/approved
         booking.status = "confirmed"
         booking.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(booking)
         
-        # Send SMS confirmation to client via Africa's Talking
+        # Queue SMS confirmation to client, committed with the status change
         if booking.contact_phone:
             # Get rental unit details for the message
             unit_name = booking.rental_unit.title if booking.rental_unit else "Property"
@@ -407,8 +406,10 @@ Phone: +256754577922
 
 CarryIT Property Management""".strip()
             
-            # Send SMS via Africa's Talking
-            await africas_talking_service.send_sms(booking.contact_phone, sms_message, db)
+            enqueue_sms(db, booking.contact_phone, sms_message, source_type="inspection_booking", source_id=booking.id)
+        
+        db.commit()
+        db.refresh(booking)
         
         return {
             "message": "Inspection booking approved successfully",
@@ -447,10 +448,8 @@ async def reject_inspection_booking(
         if reason:
             booking.notes = f"Rejected: {reason}"
         booking.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(booking)
         
-        # Send SMS notification via Africa's Talking
+        # Queue SMS notification, committed with the status change
         if booking.contact_phone:
             unit_name = booking.rental_unit.title if booking.rental_unit else "Property"
             
@@ -470,7 +469,10 @@ Phone: +256754577922
 
 CarryIT Property Management""".strip()
             
-            await africas_talking_service.send_sms(booking.contact_phone, sms_message, db)
+            enqueue_sms(db, booking.contact_phone, sms_message, source_type="inspection_booking", source_id=booking.id)
+        
+        db.commit()
+        db.refresh(booking)
         
         return {
             "message": "Inspection booking rejected",
@@ -674,9 +676,8 @@ async def approve_airbnb_booking(
         
         # Update booking status
         booking.status = 'approved'
-        db.commit()
         
-        # Send SMS confirmation
+        # Queue SMS confirmation, committed with the status change
         prepayment_display = f"{booking.currency} {booking.prepayment_amount:,.0f}" if booking.prepayment_amount else f"{booking.currency} 0"
         remaining_display = f"{booking.currency} {booking.remaining_amount:,.0f}" if booking.remaining_amount else f"{booking.currency} 0"
         
@@ -704,18 +705,15 @@ Phone: +256754577922
 CarryIT Property Manager
 """
         
-        # Send SMS via Africa's Talking
-        await africas_talking_service.send_sms(
-            to_phone=booking.guest_phone,
-            message=sms_message.strip(),
-            db=db
-        )
+        if booking.guest_phone:
+            enqueue_sms(db, booking.guest_phone, sms_message.strip(), source_type="airbnb_booking", source_id=booking.id)
+        db.commit()
         
         return {
             "message": "Booking approved successfully",
             "booking_id": booking_id,
             "status": booking.status,
-            "sms_sent": True
+            "sms_sent": booking.guest_phone is not None
         }
         
     except HTTPException:
@@ -748,9 +746,8 @@ async def decline_airbnb_booking(
         
         # Update booking status
         booking.status = 'declined'
-        db.commit()
         
-        # Send SMS notification
+        # Queue SMS notification, committed with the status change
         sms_message = f"""
 BOOKING UPDATE
 
@@ -769,18 +766,15 @@ Phone: +256754577922
 CarryIT Property Manager
 """
         
-        # Send SMS via Africa's Talking
-        await africas_talking_service.send_sms(
-            to_phone=booking.guest_phone,
-            message=sms_message.strip(),
-            db=db
-        )
+        if booking.guest_phone:
+            enqueue_sms(db, booking.guest_phone, sms_message.strip(), source_type="airbnb_booking", source_id=booking.id)
+        db.commit()
         
         return {
             "message": "Booking declined",
             "booking_id": booking_id,
             "status": booking.status,
-            "sms_sent": True
+            "sms_sent": booking.guest_phone is not None
         }
         
     except HTTPException:
@@ -832,3 +826,9 @@ async def get_all_airbnb_payments(
             detail=f"Error fetching payments: {str(e)}"
         )
 
+@router.get("/provider-metrics")
+async def get_provider_metrics(
+    current_user: User = Depends(require_roles(["admin"]))
+):
+    """Latency, error counts and circuit state per external provider endpoint (since startup)."""
+    return provider_http_client.get_metrics()
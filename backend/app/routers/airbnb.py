@@ -13,7 +13,7 @@ from ..crud import airbnb as airbnb_crud
 from ..models.user import User
 from ..models.airbnb_booking import AirbnbBooking
 from ..services.mobile_money_service import mobile_money_service
-from ..services.africas_talking import africas_talking_service
+from ..services.outbox import enqueue_sms
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/airbnb", tags=["Airbnb"])
@@ -323,10 +323,8 @@ async def confirm_airbnb_payment(
     booking.payment_status = 'completed'
     booking.payment_date = datetime.utcnow()
     booking.status = 'confirmed'  # Booking confirmed after prepayment
-    db.commit()
-    db.refresh(booking)
     
-    # Send SMS confirmation to guest
+    # Queue SMS confirmation to guest, committed with the booking update
     airbnb = airbnb_crud.get_airbnb(db, booking.airbnb_id)
     if airbnb and booking.guest_phone:
         sms_message = f"""BOOKING CONFIRMED!
@@ -343,7 +341,10 @@ Remaining: {booking.currency} {booking.remaining_amount:,.0f} (Pay at check-in)
 
 Thank you for booking with CarryIT!"""
         
-        await africas_talking_service.send_sms(booking.guest_phone, sms_message, db)
+        enqueue_sms(db, booking.guest_phone, sms_message, source_type="airbnb_booking", source_id=booking.id)
+    
+    db.commit()
+    db.refresh(booking)
     
     return {
         "success": True,
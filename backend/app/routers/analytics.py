@@ -13,6 +13,7 @@ from ..database import get_db
 from ..auth import get_current_active_user, require_roles
 from ..schemas.analytics import PropertyAnalytics, PaymentAnalytics, MaintenanceAnalytics
 from ..services.analytics import analytics_service
+from ..services.tenant_ledger import tenant_ledger_service
 from ..models.user import User
 from ..models.property import Property
 from ..models.unit import Unit
@@ -105,43 +106,47 @@ async def get_owner_financial_summary(
                 if p.status == PaymentStatus.PAID
             )
             
-            # Analyze tenant payment status
+            # Tenant status from ledger balances (charged minus paid to date)
+            balances = tenant_ledger_service.get_balances(db, tenant_ids)
+            paid_by_tenant = {}
+            for p in current_month_payments:
+                if p.status == PaymentStatus.PAID:
+                    paid_by_tenant[p.tenant_id] = paid_by_tenant.get(p.tenant_id, 0) + float(p.amount)
+            
             tenants_paid = []
             tenants_unpaid = []
             tenants_paid_ahead = []
             
             for tenant in tenants:
-                # Get tenant's payments this month
-                tenant_payments = [p for p in current_month_payments if p.tenant_id == tenant.id]
-                total_paid = sum(float(p.amount) for p in tenant_payments if p.status == PaymentStatus.PAID)
-                
+                balance = balances.get(tenant.id)
+                outstanding = float(balance.balance or 0) if balance else 0.0
+                total_paid = paid_by_tenant.get(tenant.id, 0.0)
                 expected_amount = float(tenant.monthly_rent)
                 
-                if total_paid >= expected_amount:
+                if outstanding <= 0:
                     tenants_paid.append({
                         "id": tenant.id,
                         "name": f"{tenant.first_name} {tenant.last_name}",
                         "amount_paid": total_paid,
-                        "expected": expected_amount
+                        "expected": expected_amount,
+                        "paid_through": str(balance.paid_through) if balance and balance.paid_through else None
                     })
                     
-                    # Check if paid ahead (more than monthly rent)
-                    if total_paid > expected_amount:
-                        months_ahead = int((total_paid - expected_amount) / expected_amount)
-                        if months_ahead > 0:
-                            tenants_paid_ahead.append({
-                                "id": tenant.id,
-                                "name": f"{tenant.first_name} {tenant.last_name}",
-                                "months_ahead": months_ahead,
-                                "extra_amount": total_paid - expected_amount
-                            })
+                    months_ahead = tenant_ledger_service.months_ahead(balance, today)
+                    if months_ahead > 0:
+                        tenants_paid_ahead.append({
+                            "id": tenant.id,
+                            "name": f"{tenant.first_name} {tenant.last_name}",
+                            "months_ahead": months_ahead,
+                            "extra_amount": -outstanding
+                        })
                 else:
                     tenants_unpaid.append({
                         "id": tenant.id,
                         "name": f"{tenant.first_name} {tenant.last_name}",
                         "amount_paid": total_paid,
                         "expected": expected_amount,
-                        "remaining": expected_amount - total_paid,
+                        "remaining": outstanding,
                         "payment_status": tenant.rent_payment_status
                     })
             
@@ -150,7 +155,7 @@ async def get_owner_financial_summary(
                 "property_name": property.name,
                 "expected_monthly_revenue": expected_revenue,
                 "current_month_collected": collected_this_month,
-                "remaining_to_collect": expected_revenue - collected_this_month,
+                "remaining_to_collect": sum(t["remaining"] for t in tenants_unpaid),
                 "total_tenants": len(tenants),
                 "tenants_paid": len(tenants_paid),
                 "tenants_unpaid": len(tenants_unpaid),
@@ -170,6 +175,7 @@ async def get_owner_financial_summary(
             # Update overall stats
             overall_stats["expected_monthly_revenue"] += expected_revenue
             overall_stats["current_month_collected"] += collected_this_month
+            overall_stats["remaining_to_collect"] += property_data["remaining_to_collect"]
             overall_stats["total_tenants"] += len(tenants)
             overall_stats["tenants_paid"] += len(tenants_paid)
             overall_stats["tenants_unpaid"] += len(tenants_unpaid)
@@ -178,10 +184,6 @@ async def get_owner_financial_summary(
             overall_stats["occupied_units"] += len(occupied_units)
             overall_stats["vacant_units"] += len(vacant_units)
         
-        overall_stats["remaining_to_collect"] = (
-            overall_stats["expected_monthly_revenue"] - 
-            overall_stats["current_month_collected"]
-        )
         overall_stats["occupancy_rate"] = (
             (overall_stats["occupied_units"] / overall_stats["total_units"] * 100) 
             if overall_stats["total_units"] > 0 else 0
@@ -8,12 +8,15 @@ import asyncio
 from ..database import get_db
 from ..auth import get_current_active_user, require_roles
 from ..schemas.message_template import MessageTemplateCreate, MessageTemplateResponse, MessageTemplateUpdate
-from ..schemas.communication_log import CommunicationLogCreate, CommunicationLogResponse, CommunicationLogUpdate, BulkMessageRequest
+from ..schemas.communication_log import CommunicationLogCreate, CommunicationLogResponse, CommunicationLogUpdate, BulkMessageRequest, CommunicationDeliveryResponse
 from ..crud.message_template import message_template_crud
 from ..crud.communication_log import communication_log_crud
+from ..crud.communication_delivery import communication_delivery_crud
 from ..crud.tenant import tenant_crud
 from ..crud.property import property_crud
-from ..services.notification import notification_service
+from ..services.message_dispatcher import message_dispatcher, build_deliveries
+from ..services.recipient_groups import recipient_group_service
+from ..services.template_renderer import TemplateError, compile_message, get_template_plan
 from ..models.user import User
 
 router = APIRouter(prefix="/communications", tags=["Communications"])
@@ -27,6 +30,10 @@ async def create_message_template(
     db: Session = Depends(get_db)
 ):
     """Create a new message template"""
+    try:
+        compile_message(template.body).validate()
+    except TemplateError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return message_template_crud.create_template(db, template, current_user.id)
 
 @router.get("/templates", response_model=List[MessageTemplateResponse])
@@ -65,6 +72,12 @@ async def update_message_template(
     db: Session = Depends(get_db)
 ):
     """Update a message template"""
+    if template_update.body is not None:
+        try:
+            compile_message(template_update.body).validate()
+        except TemplateError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     template = message_template_crud.update_template(db, template_id, template_update)
     if not template:
         raise HTTPException(
@@ -90,73 +103,61 @@ async def delete_message_template(
 
 # ==================== BULK COMMUNICATIONS ====================
 
-@router.post("/bulk-send", response_model=Dict)
+@router.post("/bulk-send", response_model=Dict, status_code=status.HTTP_202_ACCEPTED)
 async def send_bulk_message(
     bulk_request: BulkMessageRequest,
     current_user: User = Depends(require_roles(["admin", "owner"])),
     db: Session = Depends(get_db)
 ):
-    """Send bulk messages to tenants"""
+    """
+    Send bulk messages to tenants.
+    Deliveries run in the background; poll /logs/{log_id} for sent_count,
+    failed_count and delivery_report.
+    """
     try:
+        # Get message content, compiled and validated before any recipients are loaded
+        message_content = bulk_request.custom_message
+        subject = bulk_request.custom_subject
+        plan = None
+        
+        if bulk_request.template_id:
+            template = message_template_crud.get_template_by_id(db, bulk_request.template_id)
+            if template:
+                message_content = template.body
+                subject = template.subject
+                plan = get_template_plan(template)
+        
+        if not message_content:
+            raise HTTPException(status_code=400, detail="Message content is required")
+        
+        try:
+            plan = (plan or compile_message(message_content)).validate()
+        except TemplateError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Get recipients based on criteria
-        recipients = []
+        owner_id = current_user.id if current_user.role == "owner" else None
         
-        if bulk_request.recipient_type == "all":
-            # All tenants for owner's properties
-            if current_user.role == "owner":
-                owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-                property_ids = [p.id for p in owner_properties]
-                for prop_id in property_ids:
-                    recipients.extend(tenant_crud.get_tenants_by_property(db, prop_id))
-            else:
-                recipients = tenant_crud.get_active_tenants(db)
-                
-        elif bulk_request.recipient_type == "property" and bulk_request.property_id:
-            # All tenants in a specific property
+        if bulk_request.recipient_type == "property" and bulk_request.property_id:
             property = property_crud.get_property_by_id(db, bulk_request.property_id)
             if not property:
                 raise HTTPException(status_code=404, detail="Property not found")
             
             if current_user.role == "owner" and property.owner_id != current_user.id:
                 raise HTTPException(status_code=403, detail="Access denied")
-            
-            recipients = tenant_crud.get_tenants_by_property(db, bulk_request.property_id)
-            
-        elif bulk_request.recipient_type == "status" and bulk_request.status_filter:
-            # Tenants by payment status
-            all_tenants = []
-            if current_user.role == "owner":
-                owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-                for prop in owner_properties:
-                    all_tenants.extend(tenant_crud.get_tenants_by_property(db, prop.id))
-            else:
-                all_tenants = tenant_crud.get_active_tenants(db)
-            
-            recipients = [t for t in all_tenants if t.rent_payment_status == bulk_request.status_filter]
-            
-        elif bulk_request.recipient_type == "custom" and bulk_request.custom_recipients:
-            # Specific tenants
-            for tenant_id in bulk_request.custom_recipients:
-                tenant = tenant_crud.get_tenant_by_id(db, tenant_id)
-                if tenant:
-                    # Verify access
-                    if current_user.role == "owner" and tenant.property.owner_id != current_user.id:
-                        continue
-                    recipients.append(tenant)
+        
+        recipients = recipient_group_service.get_recipients(
+            db,
+            bulk_request.recipient_type,
+            owner_id=owner_id,
+            property_id=bulk_request.property_id,
+            status_filter=bulk_request.status_filter,
+            tenant_ids=bulk_request.custom_recipients
+        )
         
         if not recipients:
             raise HTTPException(status_code=400, detail="No recipients found")
         
-        # Get message content
-        message_content = bulk_request.custom_message
-        subject = bulk_request.custom_subject
-        
-        if bulk_request.template_id:
-            template = message_template_crud.get_template_by_id(db, bulk_request.template_id)
-            if template:
-                message_content = template.body
-                subject = template.subject
-        
         # Create communication log
         log = communication_log_crud.create_log(
             db,
@@ -182,65 +183,16 @@ async def send_bulk_message(
                 "scheduled_at": bulk_request.schedule_at.isoformat()
             }
         
-        # Send messages immediately
-        sent_count = 0
-        failed_count = 0
-        delivery_details = []
-        
-        for recipient in recipients:
-            try:
-                # Replace variables in message
-                personalized_message = message_content.replace("{tenant_name}", f"{recipient.first_name} {recipient.last_name}")
-                personalized_message = personalized_message.replace("{amount}", str(recipient.monthly_rent))
-                personalized_message = personalized_message.replace("{due_date}", str(recipient.next_payment_due))
-                personalized_message = personalized_message.replace("{unit_number}", str(recipient.unit.unit_number if recipient.unit else "N/A"))
-                
-                success = False
-                
-                # Send email
-                if bulk_request.method in ["email", "both"]:
-                    email_sent = await notification_service.send_email(
-                        recipient.email,
-                        subject or "Message from Property Management",
-                        personalized_message
-                    )
-                    success = success or email_sent
-                
-                # Send SMS
-                if bulk_request.method in ["sms", "both"] and recipient.phone:
-                    sms_sent = await notification_service.send_sms(
-                        recipient.phone,
-                        personalized_message[:160]  # SMS character limit
-                    )
-                    success = success or sms_sent
-                
-                if success:
-                    sent_count += 1
-                    delivery_details.append({"tenant_id": recipient.id, "status": "sent"})
-                else:
-                    failed_count += 1
-                    delivery_details.append({"tenant_id": recipient.id, "status": "failed"})
-                    
-            except Exception as e:
-                failed_count += 1
-                delivery_details.append({"tenant_id": recipient.id, "status": "error", "error": str(e)})
+        # Personalize messages, then hand them to the background dispatcher
+        deliveries = build_deliveries(recipients, subject, plan)
         
-        # Update log with results
-        log_update = CommunicationLogUpdate(
-            status="sent",
-            sent_count=sent_count,
-            failed_count=failed_count,
-            sent_at=datetime.utcnow(),
-            delivery_report=json.dumps(delivery_details)
-        )
-        communication_log_crud.update_log(db, log.id, log_update)
+        communication_log_crud.update_log(db, log.id, CommunicationLogUpdate(status="sending"))
+        message_dispatcher.dispatch(log.id, bulk_request.method, deliveries)
         
         return {
-            "status": "completed",
+            "status": "queued",
             "log_id": log.id,
-            "total_recipients": len(recipients),
-            "sent": sent_count,
-            "failed": failed_count
+            "total_recipients": len(recipients)
         }
         
     except HTTPException:
@@ -279,50 +231,97 @@ async def get_communication_log(
         )
     return log
 
+# ==================== DELIVERIES ====================
+
+@router.get("/tenants/{tenant_id}/deliveries", response_model=List[CommunicationDeliveryResponse])
+async def get_tenant_deliveries(
+    tenant_id: int,
+    since: Optional[datetime] = None,
+    channel: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(require_roles(["admin", "owner"])),
+    db: Session = Depends(get_db)
+):
+    """Messages delivered (or attempted) to a tenant, newest first"""
+    tenant = tenant_crud.get_tenant_by_id(db, tenant_id)
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    if current_user.role == "owner" and tenant.property.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return communication_delivery_crud.get_tenant_history(db, tenant_id, since, channel, skip, limit)
+
+@router.get("/deliveries/failed", response_model=List[CommunicationDeliveryResponse])
+async def get_failed_deliveries(
+    log_id: Optional[int] = None,
+    channel: Optional[str] = None,
+    since: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(require_roles(["admin", "owner"])),
+    db: Session = Depends(get_db)
+):
+    """Failed deliveries, newest first; owners only see their own tenants"""
+    owner_id = current_user.id if current_user.role == "owner" else None
+    return communication_delivery_crud.get_failed_deliveries(db, owner_id, log_id, channel, since, skip, limit)
+
+@router.post("/logs/{log_id}/retry-failed", response_model=Dict, status_code=status.HTTP_202_ACCEPTED)
+async def retry_failed_deliveries(
+    log_id: int,
+    current_user: User = Depends(require_roles(["admin", "owner"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Resend a log's message to the recipients whose delivery failed.
+    Each channel with failures is sent as a new communication log.
+    """
+    log = communication_log_crud.get_log_by_id(db, log_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Communication log not found")
+    if current_user.role == "owner" and log.sender_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    failed = communication_delivery_crud.get_failed_tenant_ids(db, log_id)
+    if not failed:
+        raise HTTPException(status_code=400, detail="No failed deliveries to retry")
+    
+    retry_logs = []
+    for channel, tenant_ids in failed.items():
+        recipients = recipient_group_service.get_recipients(db, "custom", tenant_ids=tenant_ids)
+        if not recipients:
+            continue
+        
+        retry_log = communication_log_crud.create_log(
+            db,
+            CommunicationLogCreate(
+                recipient_ids=json.dumps([r.id for r in recipients]),
+                method=channel,
+                template_id=log.template_id,
+                subject=log.subject,
+                message_content=log.message_content
+            ),
+            current_user.id
+        )
+        communication_log_crud.update_log(db, retry_log.id, CommunicationLogUpdate(status="sending"))
+        message_dispatcher.dispatch(retry_log.id, channel, build_deliveries(recipients, log.subject, compile_message(log.message_content)))
+        retry_logs.append({"log_id": retry_log.id, "channel": channel, "recipients": len(recipients)})
+    
+    return {
+        "status": "queued",
+        "retry_of": log_id,
+        "logs": retry_logs
+    }
+
 @router.get("/recipient-groups", response_model=Dict)
 async def get_recipient_groups(
     current_user: User = Depends(require_roles(["admin", "owner"])),
     db: Session = Depends(get_db)
 ):
-    """Get available recipient groups with counts"""
+    """Get available recipient groups with counts (cached for a short time)"""
     try:
-        groups = {}
-        
-        # Get all tenants for owner
-        all_tenants = []
-        if current_user.role == "owner":
-            owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-            for prop in owner_properties:
-                all_tenants.extend(tenant_crud.get_tenants_by_property(db, prop.id))
-        else:
-            all_tenants = tenant_crud.get_active_tenants(db)
-        
-        # Group by status
-        groups["all"] = {"count": len(all_tenants), "label": "All Tenants"}
-        groups["paid"] = {
-            "count": len([t for t in all_tenants if t.rent_payment_status == "paid"]),
-            "label": "Paid Tenants"
-        }
-        groups["due"] = {
-            "count": len([t for t in all_tenants if t.rent_payment_status == "due"]),
-            "label": "Due Tenants"
-        }
-        groups["overdue"] = {
-            "count": len([t for t in all_tenants if t.rent_payment_status == "overdue"]),
-            "label": "Overdue Tenants"
-        }
-        
-        # Group by property
-        if current_user.role == "owner":
-            owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-            for prop in owner_properties:
-                prop_tenants = tenant_crud.get_tenants_by_property(db, prop.id)
-                groups[f"property_{prop.id}"] = {
-                    "count": len(prop_tenants),
-                    "label": f"{prop.name} Tenants"
-                }
-        
-        return groups
+        owner_id = current_user.id if current_user.role == "owner" else None
+        return recipient_group_service.get_group_counts(db, owner_id)
         
     except Exception as e:
         raise HTTPException(
@@ -335,69 +334,17 @@ async def process_scheduled_messages(
     current_user: User = Depends(require_roles(["admin"])),
     db: Session = Depends(get_db)
 ):
-    """Process and send scheduled messages (called by scheduler)"""
+    """
+    Dispatch due scheduled messages now.
+    The scheduled_communications job does this every minute; this endpoint
+    runs the same claim-and-dispatch pass on demand.
+    """
     try:
-        scheduled_logs = communication_log_crud.get_scheduled_logs(db)
-        
-        processed_count = 0
-        for log in scheduled_logs:
-            try:
-                # Get recipients
-                recipient_ids = json.loads(log.recipient_ids)
-                
-                sent_count = 0
-                failed_count = 0
-                delivery_details = []
-                
-                for tenant_id in recipient_ids:
-                    tenant = tenant_crud.get_tenant_by_id(db, tenant_id)
-                    if not tenant:
-                        continue
-                    
-                    success = False
-                    
-                    # Send email
-                    if log.method in ["email", "both"]:
-                        email_sent = await notification_service.send_email(
-                            tenant.email,
-                            log.subject,
-                            log.message_content
-                        )
-                        success = success or email_sent
-                    
-                    # Send SMS
-                    if log.method in ["sms", "both"] and tenant.phone:
-                        sms_sent = await notification_service.send_sms(
-                            tenant.phone,
-                            log.message_content[:160]
-                        )
-                        success = success or sms_sent
-                    
-                    if success:
-                        sent_count += 1
-                        delivery_details.append({"tenant_id": tenant_id, "status": "sent"})
-                    else:
-                        failed_count += 1
-                        delivery_details.append({"tenant_id": tenant_id, "status": "failed"})
-                
-                # Update log
-                log_update = CommunicationLogUpdate(
-                    status="sent",
-                    sent_count=sent_count,
-                    failed_count=failed_count,
-                    sent_at=datetime.utcnow(),
-                    delivery_report=json.dumps(delivery_details)
-                )
-                communication_log_crud.update_log(db, log.id, log_update)
-                processed_count += 1
-                
-            except Exception as e:
-                print(f"Error processing scheduled message {log.id}: {e}")
-                continue
-        
+        result = message_dispatcher.process_scheduled(db)
         return {
             "status": "completed",
-            "processed": processed_count
+            "processed": result["dispatched"],
+            "recipients": result["recipients"]
         }
         
     except Exception as e:
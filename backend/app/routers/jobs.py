@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Dict
+from datetime import datetime
+
+from ..database import get_db
+from ..auth import require_roles
+from ..schemas.scheduled_job import ScheduledJobResponse, ScheduledJobUpdate, JobRunResponse
+from ..services.job_scheduler import job_scheduler
+from ..models.user import User
+
+router = APIRouter(prefix="/jobs", tags=["Scheduled Jobs"])
+
+@router.get("/", response_model=List[ScheduledJobResponse])
+async def list_scheduled_jobs(
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """List scheduled background jobs with their next run and last run stats"""
+    return job_scheduler.get_jobs(db)
+
+@router.get("/{job_name}/runs", response_model=List[JobRunResponse])
+async def get_job_runs(
+    job_name: str,
+    skip: int = 0,
+    limit: int = 50,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Get run history for a job, newest first"""
+    job = job_scheduler.get_job(db, job_name)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job_scheduler.get_job_runs(db, job.id, skip, limit)
+
+@router.post("/{job_name}/trigger", response_model=Dict, status_code=status.HTTP_202_ACCEPTED)
+async def trigger_job(
+    job_name: str,
+    current_user: User = Depends(require_roles(["admin"])),
+):
+    """Queue a job to run immediately on the worker pool"""
+    if job_scheduler.is_active(job_name):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Job is already running"
+        )
+    
+    run_id = job_scheduler.trigger(job_name)
+    if run_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found or already running"
+        )
+    
+    return {
+        "message": f"Job {job_name} queued",
+        "run_id": run_id,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.put("/{job_name}", response_model=ScheduledJobResponse)
+async def update_scheduled_job(
+    job_name: str,
+    job_update: ScheduledJobUpdate,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Enable or disable a scheduled job"""
+    job = job_scheduler.set_enabled(db, job_name, job_update.is_enabled)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -13,10 +13,9 @@ from ..crud.qr_payment import qr_payment_crud
 from ..crud.unit import unit_crud
 from ..crud.property import property_crud
 from ..services.mobile_money_service import mobile_money_service
+from ..services.payment_form_cache import payment_form_cache
 from ..models.user import User
 from ..models.mobile_payment import MobilePayment
-from ..models.payment import Payment
-from ..models.enums import PaymentStatus
 
 router = APIRouter(prefix="/mobile-payment", tags=["Mobile Payment"])
 
@@ -30,58 +29,38 @@ async def mobile_payment_form(
     db: Session = Depends(get_db)
 ):
     """Display mobile payment form."""
-    # Get QR payment details
-    qr_payment = qr_payment_crud.get_qr_payment_by_id(db, qr_payment_id)
-    if not qr_payment:
+    # QR payment, unit, property, its units and the due amount in one query
+    form = payment_form_cache.load(db, qr_payment_id)
+    if not form:
         return HTMLResponse("<h1>Payment not found</h1>", status_code=404)
     
     # Check if QR code is still valid
+    qr_payment = form.qr_payment
     if qr_payment.status != "active" or qr_payment.expires_at < datetime.utcnow():
         return HTMLResponse("<h1>This payment link has expired</h1>", status_code=400)
     
-    # Get unit and property details
-    unit = unit_crud.get_unit_by_id(db, qr_payment.unit_id)
-    property = property_crud.get_property_by_id(db, unit.property_id)
-
-    # Fetch all units for this property for selection
-    units = unit_crud.get_units_by_property(db, property.id)
-
-    # Suggest amount: default to due rent for this unit if there is a pending/overdue payment
-    suggested_amount = float(qr_payment.amount)
-    try:
-        due_payment = (
-            db.query(Payment)
-            .filter(
-                Payment.unit_id == unit.id,
-                Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.OVERDUE])
-            )
-            .order_by(Payment.due_date.asc())
-            .first()
-        )
-        if due_payment:
-            suggested_amount = float(due_payment.amount)
-    except Exception:
-        pass
-    
-    # Get property owner's mobile money number
-    payee_number = None
-    if qr_payment.mobile_money_provider == "mtn_mobile_money":
-        payee_number = property.mtn_mobile_money_number
-    elif qr_payment.mobile_money_provider == "airtel_money":
-        payee_number = property.airtel_money_number
-    
-    if not payee_number:
+    if not form.payee_number:
         return HTMLResponse("<h1>Payment method not configured for this property</h1>", status_code=400)
     
-    return templates.TemplateResponse("mobile_payment_form.html", {
-        "request": request,
-        "qr_payment": qr_payment,
-        "unit": unit,
-        "property": property,
-        "payee_number": payee_number,
-        "units": units,
-        "suggested_amount": suggested_amount
-    })
+    # The version changes with any of the page's data, so revalidation is cheap
+    etag = f'"{qr_payment_id}-{form.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    html = payment_form_cache.get(qr_payment_id, form.version)
+    if html is None:
+        html = templates.get_template("mobile_payment_form.html").render({
+            "qr_payment": qr_payment,
+            "unit": form.unit,
+            "property": form.property,
+            "payee_number": form.payee_number,
+            "units": form.units,
+            "suggested_amount": form.suggested_amount
+        })
+        payment_form_cache.put(qr_payment_id, form.version, form.property.id, html)
+    
+    return HTMLResponse(html, headers=headers)
 
 @router.post("/initiate/{qr_payment_id}")
 async def initiate_mobile_payment(
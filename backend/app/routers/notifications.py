@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+
+from ..database import get_db
+from ..auth import get_current_active_user
+from ..schemas.analytics import NotificationPage, NotificationMarkRead
+from ..services.notification import notification_service
+from ..models.user import User
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+@router.get("/", response_model=NotificationPage)
+async def get_notifications(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    unread_only: bool = False,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the current user's notifications, newest first.
+    Pass next_cursor from the previous page as cursor to get the next one.
+    """
+    try:
+        items, next_cursor = notification_service.get_inbox(db, current_user.id, cursor, limit, unread_only)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "unread_count": notification_service.get_unread_count(db, current_user.id)
+    }
+
+@router.get("/unread-count", response_model=Dict)
+async def get_unread_count(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's unread notification count (cheap enough to poll)"""
+    return {"unread_count": notification_service.get_unread_count(db, current_user.id)}
+
+@router.post("/mark-read", response_model=Dict)
+async def mark_notifications_read(
+    request: NotificationMarkRead,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Mark the given notifications (or all when notification_ids is omitted) as read"""
+    updated = notification_service.mark_read(db, current_user.id, request.notification_ids)
+    return {
+        "updated": updated,
+        "unread_count": notification_service.get_unread_count(db, current_user.id)
+    }
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Dict, Optional
+
+from ..database import get_db
+from ..auth import require_roles
+from ..models.outbound_message import OutboundMessage
+from ..schemas.outbound_message import OutboundMessageResponse
+from ..services.outbox import outbox_worker
+from ..models.user import User
+
+router = APIRouter(prefix="/outbox", tags=["Outbound Messages"])
+
+@router.get("/stats", response_model=Dict)
+async def get_outbox_stats(
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Outbound message counts per channel and status, and the oldest pending message"""
+    return outbox_worker.get_status_counts(db)
+
+@router.get("/messages", response_model=List[OutboundMessageResponse])
+async def list_outbound_messages(
+    status_filter: Optional[str] = None,
+    channel: Optional[str] = None,
+    source_type: Optional[str] = None,
+    source_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """List outbound messages, newest first (status: pending, sending, sent, dead)"""
+    return outbox_worker.get_messages(db, status_filter, channel, source_type, source_id, skip, limit)
+
+@router.get("/messages/{message_id}", response_model=OutboundMessageResponse)
+async def get_outbound_message(
+    message_id: int,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Get one outbound message with its delivery state"""
+    message = db.query(OutboundMessage).filter(OutboundMessage.id == message_id).first()
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Outbound message not found"
+        )
+    return message
+
+@router.post("/messages/{message_id}/retry", response_model=OutboundMessageResponse)
+async def retry_outbound_message(
+    message_id: int,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Requeue a dead-lettered message for immediate delivery"""
+    message = db.query(OutboundMessage).filter(OutboundMessage.id == message_id).first()
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Outbound message not found"
+        )
+    if message.status not in ["dead", "pending"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot retry a message that is {message.status}"
+        )
+    return outbox_worker.retry(db, message_id)
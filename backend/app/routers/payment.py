@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
@@ -9,7 +9,9 @@ from ..schemas.payment import PaymentCreate, PaymentResponse, PaymentUpdate, Pay
 from ..crud.payment import payment_crud
 from ..crud.unit import unit_crud
 from ..crud.property import property_crud
-from ..services.notification import notification_service
+from ..services.statement_import import statement_import_service, StatementError
+from ..services.rent_invoicing import rent_invoicing_service
+from ..services.payment_reminders import payment_reminder_service
 from ..models.user import User
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
@@ -47,6 +49,83 @@ async def create_payment(
     
     return payment_crud.create_payment(db, payment)
 
+@router.post("/import-statement")
+async def import_statement(
+    file: UploadFile = File(...),
+    source: str = Form(...),
+    property_id: Optional[int] = Form(None),
+    commit: bool = Form(False),
+    current_user: User = Depends(require_roles(["admin", "owner"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Import an MTN, Airtel or bank statement (CSV or Excel).
+    Without commit, returns a preview of how each line matches tenants and
+    open payments; with commit, records the matched lines as paid.
+    """
+    if property_id:
+        property = property_crud.get_property_by_id(db, property_id)
+        if not property:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Property not found"
+            )
+        if current_user.role == "owner" and property.owner_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+    
+    content = await file.read()
+    try:
+        return statement_import_service.import_statement(
+            db,
+            content,
+            file.filename,
+            source.lower(),
+            current_user.id,
+            owner_id=current_user.id if current_user.role == "owner" else None,
+            property_id=property_id,
+            commit=commit
+        )
+    except StatementError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.post("/generate-invoices")
+async def generate_invoices(
+    period: Optional[date] = None,
+    property_id: Optional[int] = None,
+    current_user: User = Depends(require_roles(["admin", "owner"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate the pending utility payments for the month containing period
+    (default: this month). Invoices that already exist are skipped. Rent is
+    charged on the tenant ledger by the daily accrual job.
+    """
+    if property_id:
+        property = property_crud.get_property_by_id(db, property_id)
+        if not property:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Property not found"
+            )
+        if current_user.role == "owner" and property.owner_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+    
+    return rent_invoicing_service.generate(
+        db,
+        period=period,
+        owner_id=current_user.id if current_user.role == "owner" else None,
+        property_id=property_id
+    )
+
 @router.get("/", response_model=List[PaymentWithDetails])
 async def get_payments(
     unit_id: Optional[int] = None,
@@ -388,7 +467,7 @@ async def send_payment_reminders(
     current_user: User = Depends(require_roles(["admin", "owner"])),
     db: Session = Depends(get_db)
 ):
-    """Send payment reminders to tenants."""
+    """Send payment reminders to tenants with payments due; returns the job id to follow progress."""
     # Check property access
     property = property_crud.get_property_by_id(db, property_id)
     if not property:
@@ -403,24 +482,10 @@ async def send_payment_reminders(
             detail="Access denied"
         )
     
-    # Get overdue payments for the property
-    units = unit_crud.get_units_by_property(db, property_id)
-    overdue_payments = []
-    for unit in units:
-        unit_payments = payment_crud.get_payments_by_unit(db, unit.id)
-        overdue_payments.extend([p for p in unit_payments if p.status in ["pending", "overdue"]])
-    
-    # Send reminders
-    sent_count = 0
-    for payment in overdue_payments:
-        from ..crud.user import user_crud
-        tenant = user_crud.get_user_by_id(db, payment.payer_id)
-        if tenant:
-            await notification_service.send_payment_reminder(
-                db, tenant.id, float(payment.amount), 
-                payment.due_date.strftime("%Y-%m-%d"), 
-                tenant.email, tenant.phone
-            )
-            sent_count += 1
+    # One reminder per tenant with open payments due; sent in the background
+    result = payment_reminder_service.send(db, property_id, current_user.id)
     
-    return {"message": f"Reminders sent to {sent_count} tenants"}
+    return {
+        "message": f"Reminders queued for {result['total_recipients']} tenants",
+        **result
+    }
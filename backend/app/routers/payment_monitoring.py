@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from sqlalchemy.orm import Session
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from ..database import get_db
 from ..auth import get_current_active_user, require_roles
-from ..services.payment_monitor import payment_monitor
+from ..services.payment_monitor import payment_monitor, TENANT_CATEGORIES
 from ..services.payment_scheduler import payment_scheduler
 from ..models.user import User
 
@@ -14,16 +14,18 @@ router = APIRouter(prefix="/payment-monitoring", tags=["Payment Monitoring"])
 @router.post("/run-automated-monitoring", response_model=Dict)
 async def run_automated_monitoring(
     background_tasks: BackgroundTasks,
+    full: bool = False,
     current_user: User = Depends(require_roles(["admin", "owner"])),
     db: Session = Depends(get_db)
 ):
     """
     Run automated payment monitoring to update tenant payment statuses.
     This can be run manually or scheduled to run automatically.
+    Runs incrementally from the last watermark unless full=true.
     """
     try:
         # Run monitoring in background to avoid timeout
-        result = payment_monitor.run_automated_payment_monitoring()
+        result = payment_monitor.run_automated_payment_monitoring(db, full=full)
         
         return {
             "message": "Automated payment monitoring completed",
@@ -37,43 +39,87 @@ async def run_automated_monitoring(
             detail=f"Error running automated monitoring: {str(e)}"
         )
 
+@router.get("/runs", response_model=List[Dict])
+async def get_monitoring_runs(
+    limit: int = 50,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Get recent payment monitoring runs with their watermark and stats
+    """
+    try:
+        runs = payment_monitor.get_recent_runs(db, limit)
+        
+        return [
+            {
+                "id": run.id,
+                "mode": run.mode,
+                "status": run.status,
+                "watermark_from": run.watermark_from.isoformat() if run.watermark_from else None,
+                "watermark_to": run.watermark_to.isoformat() if run.watermark_to else None,
+                "overdue_updated": run.overdue_updated,
+                "due_updated": run.due_updated,
+                "pending_updated": run.pending_updated,
+                "moved_out_updated": run.moved_out_updated,
+                "status_changed": run.status_changed,
+                "total_processed": run.total_processed,
+                "duration_ms": run.duration_ms,
+                "error": run.error,
+                "started_at": run.started_at.isoformat() if run.started_at else None,
+                "finished_at": run.finished_at.isoformat() if run.finished_at else None
+            }
+            for run in runs
+        ]
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting monitoring runs: {str(e)}"
+        )
+
+def _owner_scope(current_user: User) -> Optional[int]:
+    """Owners only see tenants of their own properties"""
+    return current_user.id if current_user.role == "owner" else None
+
+def _validate_category(category: Optional[str]):
+    if category and category not in TENANT_CATEGORIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid category. Must be one of: {', '.join(TENANT_CATEGORIES)}"
+        )
+
 @router.get("/tenant-categories", response_model=Dict)
 async def get_tenant_categories(
+    category: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
     current_user: User = Depends(require_roles(["admin", "owner", "manager"])),
     db: Session = Depends(get_db)
 ):
     """
-    Get all tenants categorized by their payment status:
+    Get tenants categorized by their payment status, paginated per category:
     - overdue: Payment overdue by more than 7 days
     - due: Payment due today or within 7 days
     - pending: Payment not yet due
     - paid: Recently paid
     - moved_out: Tenant has moved out
+    Pass category to page through a single category; totals holds the full count of each.
     """
+    _validate_category(category)
     try:
-        categories = payment_monitor.get_tenant_categories()
-        
-        # Filter by owner's properties if user is owner
-        if current_user.role == "owner":
-            from ..crud.property import property_crud
-            owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-            property_ids = [p.id for p in owner_properties]
-            
-            # Filter categories to only include tenants from owner's properties
-            filtered_categories = {}
-            for status, tenants in categories.items():
-                if isinstance(tenants, list):
-                    filtered_categories[status] = [
-                        tenant for tenant in tenants 
-                        if any(tenant.get("property_name") == prop.name for prop in owner_properties)
-                    ]
-                else:
-                    filtered_categories[status] = tenants
-            
-            categories = filtered_categories
+        result = payment_monitor.get_tenant_categories(
+            db,
+            owner_id=_owner_scope(current_user),
+            status=category,
+            skip=skip,
+            limit=limit
+        )
+        if "error" in result:
+            raise Exception(result["error"])
         
         return {
-            "categories": categories,
+            **result,
             "timestamp": datetime.utcnow().isoformat()
         }
         
@@ -94,7 +140,7 @@ async def get_payment_summary(
     - Total amounts overdue, due, pending
     """
     try:
-        summary = payment_monitor.get_payment_summary()
+        summary = payment_monitor.get_payment_summary(db, owner_id=_owner_scope(current_user))
         
         return {
             "summary": summary,
@@ -109,6 +155,8 @@ async def get_payment_summary(
 
 @router.get("/overdue-tenants", response_model=List[Dict])
 async def get_overdue_tenants(
+    skip: int = 0,
+    limit: int = 100,
     current_user: User = Depends(require_roles(["admin", "owner", "manager"])),
     db: Session = Depends(get_db)
 ):
@@ -116,21 +164,13 @@ async def get_overdue_tenants(
     Get list of tenants with overdue payments
     """
     try:
-        categories = payment_monitor.get_tenant_categories()
-        
-        # Filter by owner's properties if user is owner
-        if current_user.role == "owner":
-            from ..crud.property import property_crud
-            owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-            
-            overdue_tenants = [
-                tenant for tenant in categories.get("overdue", [])
-                if any(tenant.get("property_name") == prop.name for prop in owner_properties)
-            ]
-        else:
-            overdue_tenants = categories.get("overdue", [])
+        result = payment_monitor.get_tenant_categories(
+            db, owner_id=_owner_scope(current_user), status="overdue", skip=skip, limit=limit
+        )
+        if "error" in result:
+            raise Exception(result["error"])
         
-        return overdue_tenants
+        return result["categories"]["overdue"]
         
     except Exception as e:
         raise HTTPException(
@@ -140,6 +180,8 @@ async def get_overdue_tenants(
 
 @router.get("/due-tenants", response_model=List[Dict])
 async def get_due_tenants(
+    skip: int = 0,
+    limit: int = 100,
     current_user: User = Depends(require_roles(["admin", "owner", "manager"])),
     db: Session = Depends(get_db)
 ):
@@ -147,21 +189,13 @@ async def get_due_tenants(
     Get list of tenants with payments due soon
     """
     try:
-        categories = payment_monitor.get_tenant_categories()
-        
-        # Filter by owner's properties if user is owner
-        if current_user.role == "owner":
-            from ..crud.property import property_crud
-            owner_properties = property_crud.get_properties_by_owner(db, current_user.id)
-            
-            due_tenants = [
-                tenant for tenant in categories.get("due", [])
-                if any(tenant.get("property_name") == prop.name for prop in owner_properties)
-            ]
-        else:
-            due_tenants = categories.get("due", [])
+        result = payment_monitor.get_tenant_categories(
+            db, owner_id=_owner_scope(current_user), status="due", skip=skip, limit=limit
+        )
+        if "error" in result:
+            raise Exception(result["error"])
         
-        return due_tenants
+        return result["categories"]["due"]
         
     except Exception as e:
         raise HTTPException(
@@ -232,15 +266,15 @@ async def start_payment_scheduler(
         
         if not success:
             return {
-                "message": "Failed to start scheduler - schedule module not available",
-                "error": "Schedule module not installed",
+                "message": "Failed to start scheduler - scheduler is already running",
+                "error": "Scheduler already running",
                 "timestamp": datetime.utcnow().isoformat()
             }
         
         return {
             "message": "Payment monitoring scheduler started successfully",
             "scheduled_tasks": [
-                "Daily payment check: 9:00 AM",
+                "Incremental payment check: hourly",
                 "Weekly comprehensive check: Monday 8:00 AM", 
                 "Monthly report: 1st of each month 10:00 AM"
             ],
@@ -277,6 +311,7 @@ async def stop_payment_scheduler(
 
 @router.post("/run-manual-check", response_model=Dict)
 async def run_manual_payment_check(
+    full: bool = False,
     current_user: User = Depends(require_roles(["admin", "owner"])),
 ):
     """
@@ -284,7 +319,7 @@ async def run_manual_payment_check(
     Useful for testing or immediate status updates
     """
     try:
-        result = payment_scheduler.run_manual_check()
+        result = payment_scheduler.run_manual_check(full=full)
         
         return {
             "message": "Manual payment check completed",
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -6,6 +6,9 @@ from ..database import get_db
 from ..auth import get_current_active_user, require_roles
 from ..schemas.property import PropertyCreate, PropertyResponse, PropertyUpdate
 from ..crud.property import property_crud
+from ..services.qr_code_service import qr_code_service
+from ..services.qr_image_cache import qr_image_cache
+from ..services.payment_form_cache import payment_form_cache
 from ..models.user import User
 
 router = APIRouter(prefix="/properties", tags=["Properties"])
@@ -13,11 +16,17 @@ router = APIRouter(prefix="/properties", tags=["Properties"])
 @router.post("/", response_model=PropertyResponse)
 async def create_property(
     property: PropertyCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_roles(["admin", "owner"])),
     db: Session = Depends(get_db)
 ):
     """Create a new property."""
-    return property_crud.create_property(db, property, current_user.id)
+    db_property = property_crud.create_property(db, property, current_user.id)
+    
+    # Render the property's payment QR code ahead of the first dashboard view
+    background_tasks.add_task(qr_image_cache.warm, qr_code_service.property_payment_url(db_property.id))
+    
+    return db_property
 
 @router.get("/", response_model=List[PropertyResponse])
 async def get_properties(
@@ -100,6 +109,10 @@ async def update_property(
         )
     
     updated_property = property_crud.update_property(db, property_id, property_update)
+    
+    # Payment numbers and name appear on the property's cached payment forms
+    payment_form_cache.invalidate_property(property_id)
+    
     return updated_property
 
 @router.delete("/{property_id}")
@@ -7,15 +7,11 @@ from ..models import Property, Unit
 from ..schemas.property import PropertyResponse
 from ..auth import get_current_active_user, require_roles
 from ..models.user import User
-from ..services.qr_code_service import QRCodeService
+from ..services.qr_code_service import qr_code_service
 from ..services.mobile_money_service import MobileMoneyService
-import qrcode
-import io
-import base64
 from datetime import datetime, timedelta
 
 router = APIRouter()
-qr_service = QRCodeService()
 mobile_money_service = MobileMoneyService()
 
 @router.post("/generate/{property_id}")
@@ -56,27 +52,9 @@ async def generate_property_qr(
             detail="Property has no units"
         )
     
-    # Generate payment URL for the property - use backend URL from environment
-    backend_url = "https://carryit-backend.onrender.com"
-    payment_url = f"{backend_url}/api/v1/mobile-payment/property/{property_id}"
-    
-    # Generate QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(payment_url)
-    qr.make(fit=True)
-    
-    # Create QR code image
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
+    # Payment URL for the property; its image is rendered once and cached
+    payment_url = qr_code_service.property_payment_url(property_id)
+    img_str = qr_code_service.generate_qr_code_image(payment_url)
     
     return {
         "property_id": property.id,
@@ -84,6 +62,7 @@ async def generate_property_qr(
         "property_address": property.address,
         "payment_url": payment_url,
         "qr_image": img_str,
+        "qr_image_url": qr_code_service.qr_code_image_url(payment_url),
         "units_count": len(units),
         "mtn_number": property.mtn_mobile_money_number,
         "airtel_number": property.airtel_money_number,
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from ..services.qr_image_cache import qr_image_cache
+
+router = APIRouter(prefix="/qr-images", tags=["QR Code Images"])
+
+# Image bytes never change for a digest, so clients and proxies may keep them forever
+QR_IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{digest}.png")
+async def get_qr_image(digest: str, request: Request):
+    """Serve a cached QR code image by content digest"""
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": QR_IMAGE_CACHE_CONTROL}
+    
+    path = qr_image_cache.find(digest)
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="QR image not found"
+        )
+    
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return FileResponse(path, media_type="image/png", headers=headers)
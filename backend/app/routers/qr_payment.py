@@ -18,6 +18,8 @@ from ..crud.unit import unit_crud
 from ..crud.property import property_crud
 from ..crud.user import user_crud
 from ..services.qr_code_service import qr_code_service
+from ..services.qr_expiry import qr_expiry_sweeper
+from ..services.payment_form_cache import payment_form_cache
 from ..models.user import User
 
 router = APIRouter(prefix="/qr-payments", tags=["QR Code Payments"])
@@ -93,7 +95,8 @@ async def generate_qr_payment(
     # Generate QR code data and image
     qr_result = qr_code_service.generate_mobile_money_payment_qr(payment_data)
     
-    # Update the QR code payment with the generated data
+    # Update the QR code payment with the generated data. The image URL is not
+    # stored: the cached file can be evicted, so it is computed per response.
     db_qr_payment.qr_code_data = qr_result["qr_data"]
     db.commit()
     db.refresh(db_qr_payment)
@@ -114,7 +117,8 @@ async def generate_qr_payment(
         "used_at": db_qr_payment.used_at,
         "created_at": db_qr_payment.created_at,
         "updated_at": db_qr_payment.updated_at,
-        "qr_image": qr_result["qr_image"]  # Add the QR image
+        "qr_image": qr_result["qr_image"],  # Add the QR image
+        "qr_image_url": qr_result["qr_image_url"]
     }
     
     return response_data
@@ -233,6 +237,7 @@ async def update_qr_payment(
         )
     
     updated_qr_payment = qr_payment_crud.update_qr_payment(db, qr_payment_id, qr_payment_update)
+    payment_form_cache.invalidate(qr_payment_id)
     return updated_qr_payment
 
 @router.post("/{qr_payment_id}/mark-used")
@@ -285,6 +290,7 @@ async def delete_qr_payment(
         )
     
     success = qr_payment_crud.delete_qr_payment(db, qr_payment_id)
+    payment_form_cache.invalidate(qr_payment_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -295,12 +301,19 @@ async def delete_qr_payment(
 
 @router.post("/cleanup-expired")
 async def cleanup_expired_qr_payments(
+    archive: bool = False,
     current_user: User = Depends(require_roles(["admin", "owner"])),
     db: Session = Depends(get_db)
 ):
-    """Clean up expired QR code payments."""
-    cleaned_count = qr_payment_crud.cleanup_expired_qr_payments(db)
-    return {"message": f"Cleaned up {cleaned_count} expired QR code payments"}
+    """
+    Expire overdue QR code payments now (also runs every 5 minutes).
+    With archive, finished codes past the retention window are archived too.
+    """
+    result = qr_expiry_sweeper.sweep(db, archive=archive and current_user.role == "admin")
+    return {
+        "message": f"Cleaned up {result['expired']} expired QR code payments",
+        **result
+    }
 
 @router.get("/{qr_payment_id}/qr-image")
 async def get_qr_code_image(
@@ -331,11 +344,12 @@ async def get_qr_code_image(
                 detail="Access denied"
             )
     
-    # Generate QR code image
+    # Cached QR code image (rendered once per payload)
     qr_result = qr_code_service.generate_qr_code_image(qr_payment.qr_code_data)
     
     return {
         "qr_image": qr_result,
+        "qr_image_url": qr_code_service.qr_code_image_url(qr_payment.qr_code_data),
         "payment_info": {
             "account_number": qr_payment.account_number,
             "amount": str(qr_payment.amount),
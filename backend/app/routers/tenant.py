@@ -12,6 +12,8 @@ from ..crud.tenant import tenant_crud
 from ..crud.property import property_crud
 from ..crud.unit import unit_crud
 from ..services.file_upload import file_upload_service
+from ..services.tenant_ledger import tenant_ledger_service
+from ..schemas.tenant_ledger import TenantLedgerResponse
 from ..models.user import User
 from ..models.tenant import Tenant
 
@@ -199,6 +201,39 @@ async def get_tenant_payment_history(
     
     return payment_history
 
+@router.get("/{tenant_id}/ledger", response_model=TenantLedgerResponse)
+async def get_tenant_ledger(
+    tenant_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(require_roles(["admin", "owner", "manager"])),
+    db: Session = Depends(get_db)
+):
+    """Get a tenant's balance, paid-through date and ledger lines (newest first)."""
+    tenant = tenant_crud.get_tenant_by_id(db, tenant_id)
+    if not tenant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tenant not found"
+        )
+    
+    if current_user.role == "owner" and tenant.property.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    balance = tenant_ledger_service.get_balances(db, [tenant_id])[tenant_id]
+    return {
+        "tenant_id": tenant_id,
+        "balance": balance.balance or 0,
+        "total_charged": balance.total_charged or 0,
+        "total_paid": balance.total_paid or 0,
+        "paid_through": balance.paid_through,
+        "months_ahead": tenant_ledger_service.months_ahead(balance),
+        "entries": tenant_ledger_service.get_entries(db, tenant_id, skip, limit)
+    }
+
 @router.get("/{tenant_id}", response_model=TenantWithPropertyAndUnit)
 async def get_tenant_by_id(
     tenant_id: int,
@@ -1,108 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 import json
 import hmac
 import hashlib
 
 from ..database import get_db
+from ..auth import require_roles
 from ..models.mobile_payment import MobilePayment
 from ..models.payment import Payment
 from ..models.tenant import Tenant
+from ..models.user import User
 from ..models.enums import PaymentStatus
 from ..crud.payment import payment_crud
-from ..crud.tenant import tenant_crud
-from ..services.notification import notification_service
+from ..schemas.inbound_webhook_event import InboundWebhookEventResponse, InboundWebhookReplay
+from ..services.outbox import enqueue_email
+from ..services.webhook_events import record_event, inbound_event_worker
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 
+async def _store_callback(provider: str, request: Request, db: Session) -> Dict[str, Any]:
+    """Store the raw callback and acknowledge it; the webhook worker applies it"""
+    body = await request.body()
+    try:
+        event, created = record_event(db, provider, body)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid callback body"
+        )
+    
+    if created:
+        inbound_event_worker.notify()
+    
+    return {
+        "status": "received",
+        "event_id": event.id,
+        "duplicate": not created
+    }
+
 @router.post("/mtn/callback")
 async def mtn_payment_callback(
     request: Request,
     db: Session = Depends(get_db)
 ):
     """Handle MTN Mobile Money payment callback"""
-    try:
-        # Get raw body for signature verification
-        body = await request.body()
-        data = json.loads(body)
-        
-        # Extract transaction details
-        transaction_id = data.get("financialTransactionId")
-        external_id = data.get("externalId")
-        status_from_provider = data.get("status")  # SUCCESSFUL, FAILED, PENDING
-        amount = data.get("amount")
-        currency = data.get("currency")
-        
-        # Find the mobile payment record
-        mobile_payment = db.query(MobilePayment).filter(
-            MobilePayment.external_id == external_id
-        ).first()
-        
-        if not mobile_payment:
-            return {"status": "received", "message": "Payment record not found"}
-        
-        # Update mobile payment status
-        mobile_payment.transaction_id = transaction_id
-        mobile_payment.provider_status = status_from_provider
-        mobile_payment.provider_response = json.dumps(data)
-        mobile_payment.callback_data = json.dumps(data)
-        
-        if status_from_provider == "SUCCESSFUL":
-            mobile_payment.status = PaymentStatus.PAID
-            mobile_payment.completed_at = datetime.utcnow()
-            
-            # Update related payment record if exists
-            if mobile_payment.qr_payment_id:
-                from ..crud.qr_payment import qr_payment_crud
-                qr_payment = qr_payment_crud.get_qr_payment_by_id(db, mobile_payment.qr_payment_id)
-                if qr_payment:
-                    qr_payment.payment_status = PaymentStatus.PAID
-                    qr_payment.paid_at = datetime.utcnow()
-            
-            # Update tenant payment status
-            if mobile_payment.tenant_id:
-                tenant = tenant_crud.get_tenant_by_id(db, mobile_payment.tenant_id)
-                if tenant:
-                    from datetime import timedelta, date
-                    from ..schemas.tenant import TenantUpdate
-                    
-                    # Update payment date and next due date
-                    tenant_update = TenantUpdate(
-                        last_payment_date=date.today(),
-                        next_payment_due=date.today() + timedelta(days=30 * mobile_payment.months_advance),
-                        rent_payment_status="paid"
-                    )
-                    tenant_crud.update_tenant(db, mobile_payment.tenant_id, tenant_update)
-                    
-                    # Send confirmation notification
-                    try:
-                        import asyncio
-                        asyncio.create_task(notification_service.send_email(
-                            tenant.email,
-                            "Payment Confirmed",
-                            f"Your rent payment of {currency} {amount} has been received. Thank you!"
-                        ))
-                    except:
-                        pass
-            
-        elif status_from_provider == "FAILED":
-            mobile_payment.status = PaymentStatus.FAILED
-            mobile_payment.failed_at = datetime.utcnow()
-            mobile_payment.failure_reason = data.get("reason", "Payment failed")
-        
-        db.commit()
-        
-        return {
-            "status": "processed",
-            "external_id": external_id,
-            "payment_status": mobile_payment.status
-        }
-        
-    except Exception as e:
-        print(f"Error processing MTN callback: {str(e)}")
-        return {"status": "error", "message": str(e)}
+    return await _store_callback("mtn", request, db)
 
 @router.post("/airtel/callback")
 async def airtel_payment_callback(
@@ -110,91 +54,40 @@ async def airtel_payment_callback(
     db: Session = Depends(get_db)
 ):
     """Handle Airtel Money payment callback"""
-    try:
-        # Get raw body
-        body = await request.body()
-        data = json.loads(body)
-        
-        # Extract transaction details
-        transaction_id = data.get("transaction", {}).get("id")
-        external_id = data.get("transaction", {}).get("airtel_money_id")
-        status_from_provider = data.get("transaction", {}).get("status")  # SUCCESS, FAILED, PENDING
-        amount = data.get("transaction", {}).get("amount")
-        currency = data.get("transaction", {}).get("currency")
-        
-        # Find the mobile payment record
-        mobile_payment = db.query(MobilePayment).filter(
-            MobilePayment.external_id == external_id
-        ).first()
-        
-        if not mobile_payment:
-            # Try to find by transaction_id
-            mobile_payment = db.query(MobilePayment).filter(
-                MobilePayment.transaction_id == transaction_id
-            ).first()
-        
-        if not mobile_payment:
-            return {"status": "received", "message": "Payment record not found"}
-        
-        # Update mobile payment status
-        mobile_payment.transaction_id = transaction_id
-        mobile_payment.provider_status = status_from_provider
-        mobile_payment.provider_response = json.dumps(data)
-        mobile_payment.callback_data = json.dumps(data)
-        
-        if status_from_provider == "SUCCESS":
-            mobile_payment.status = PaymentStatus.PAID
-            mobile_payment.completed_at = datetime.utcnow()
-            
-            # Update related payment record
-            if mobile_payment.qr_payment_id:
-                from ..crud.qr_payment import qr_payment_crud
-                qr_payment = qr_payment_crud.get_qr_payment_by_id(db, mobile_payment.qr_payment_id)
-                if qr_payment:
-                    qr_payment.payment_status = PaymentStatus.PAID
-                    qr_payment.paid_at = datetime.utcnow()
-            
-            # Update tenant payment status
-            if mobile_payment.tenant_id:
-                tenant = tenant_crud.get_tenant_by_id(db, mobile_payment.tenant_id)
-                if tenant:
-                    from datetime import timedelta, date
-                    from ..schemas.tenant import TenantUpdate
-                    
-                    tenant_update = TenantUpdate(
-                        last_payment_date=date.today(),
-                        next_payment_due=date.today() + timedelta(days=30 * mobile_payment.months_advance),
-                        rent_payment_status="paid"
-                    )
-                    tenant_crud.update_tenant(db, mobile_payment.tenant_id, tenant_update)
-                    
-                    # Send confirmation
-                    try:
-                        import asyncio
-                        asyncio.create_task(notification_service.send_email(
-                            tenant.email,
-                            "Payment Confirmed",
-                            f"Your rent payment of {currency} {amount} has been received. Thank you!"
-                        ))
-                    except:
-                        pass
-            
-        elif status_from_provider == "FAILED":
-            mobile_payment.status = PaymentStatus.FAILED
-            mobile_payment.failed_at = datetime.utcnow()
-            mobile_payment.failure_reason = data.get("message", "Payment failed")
-        
-        db.commit()
-        
-        return {
-            "status": "processed",
-            "transaction_id": transaction_id,
-            "payment_status": mobile_payment.status
-        }
-        
-    except Exception as e:
-        print(f"Error processing Airtel callback: {str(e)}")
-        return {"status": "error", "message": str(e)}
+    return await _store_callback("airtel", request, db)
+
+@router.get("/events/stats", response_model=Dict)
+async def get_webhook_event_stats(
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Inbound callback counts per provider and status, and the oldest unprocessed one"""
+    return inbound_event_worker.get_status_counts(db)
+
+@router.get("/events", response_model=List[InboundWebhookEventResponse])
+async def list_webhook_events(
+    status_filter: Optional[str] = None,
+    provider: Optional[str] = None,
+    external_id: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """List inbound callbacks, newest first (status: pending, processing, processed, dead)"""
+    return inbound_event_worker.get_events(db, status_filter, provider, external_id, skip, limit)
+
+@router.post("/events/replay", response_model=Dict)
+async def replay_webhook_events(
+    request: InboundWebhookReplay,
+    current_user: User = Depends(require_roles(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Requeue stored callbacks (by id, or dead ones matching the filters) for processing"""
+    requeued = inbound_event_worker.replay(
+        db, request.event_ids, request.status, request.provider, request.received_since
+    )
+    return {"requeued": requeued}
 
 @router.get("/payment-status/{external_id}")
 async def check_payment_status(
@@ -272,18 +165,17 @@ async def inspection_payment_callback(
                 inspection.status = InspectionStatus.APPROVED
                 inspection.updated_at = datetime.utcnow()
                 
-                # Send approval notification
-                try:
-                    tenant = db.query(User).filter(User.id == inspection.tenant_id).first()
-                    if tenant:
-                        import asyncio
-                        asyncio.create_task(notification_service.send_email(
-                            tenant.email,
-                            "Inspection Approved",
-                            f"Your inspection booking has been approved. An agent will contact you shortly."
-                        ))
-                except:
-                    pass
+                # Queue approval email, committed with the payment update
+                tenant = db.query(User).filter(User.id == inspection.tenant_id).first()
+                if tenant and tenant.email:
+                    enqueue_email(
+                        db,
+                        tenant.email,
+                        "Inspection Approved",
+                        "Your inspection booking has been approved. An agent will contact you shortly.",
+                        source_type="inspection_booking",
+                        source_id=inspection.id
+                    )
         
         elif status_from_provider == "FAILED":
             inspection_payment.status = PaymentStatus.FAILED
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 # Notification Schemas
@@ -23,6 +23,14 @@ class NotificationResponse(NotificationBase):
     class Config:
         from_attributes = True
 
+class NotificationPage(BaseModel):
+    items: List[NotificationResponse]
+    next_cursor: Optional[str] = None
+    unread_count: int
+
+class NotificationMarkRead(BaseModel):
+    notification_ids: Optional[List[int]] = None  # None marks all as read
+
 # Analytics Schemas
 class PropertyAnalytics(BaseModel):
     property_id: int
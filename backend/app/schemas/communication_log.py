@@ -44,3 +44,19 @@ class BulkMessageRequest(BaseModel):
     custom_message: Optional[str] = None
     schedule_at: Optional[datetime] = None
 
+
+class CommunicationDeliveryResponse(BaseModel):
+    id: int
+    log_id: int
+    tenant_id: int
+    channel: str
+    recipient: Optional[str] = None
+    status: str
+    provider_message_id: Optional[str] = None
+    provider_status: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+class InboundWebhookEventResponse(BaseModel):
+    id: int
+    provider: str
+    transaction_id: str
+    external_id: Optional[str] = None
+    provider_status: Optional[str] = None
+    payload: str
+    status: str
+    attempts: int
+    max_attempts: int
+    next_attempt_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    result: Optional[str] = None
+    received_at: datetime
+    processed_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class InboundWebhookReplay(BaseModel):
+    event_ids: Optional[List[int]] = None  # When omitted, replay every event matching the filters
+    status: Optional[str] = "dead"
+    provider: Optional[str] = None
+    received_since: Optional[datetime] = None
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class OutboundMessageResponse(BaseModel):
+    id: int
+    channel: str
+    provider: str
+    recipient: str
+    subject: Optional[str] = None
+    body: str
+    source_type: Optional[str] = None
+    source_id: Optional[int] = None
+    status: str
+    attempts: int
+    max_attempts: int
+    next_attempt_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -41,6 +41,7 @@ class PaymentResponse(PaymentBase):
     payer_id: int
     utility_id: Optional[int]
     unit_utility_id: Optional[int]
+    invoice_key: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
@@ -24,6 +24,7 @@ class QRCodePaymentResponse(BaseModel):
     qr_code_data: str
     qr_code_image_path: Optional[str]
     qr_image: Optional[str] = None  # Base64 encoded QR image
+    qr_image_url: Optional[str] = None  # Cached QR image URL, valid when returned
     status: QRCodeStatus
     expires_at: datetime
     used_at: Optional[datetime]
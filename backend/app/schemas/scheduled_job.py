@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class ScheduledJobResponse(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    cron_expression: str
+    is_enabled: bool
+    next_run_at: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    last_status: Optional[str] = None
+    last_duration_ms: Optional[int] = None
+    last_rows_processed: Optional[int] = None
+    last_error: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class ScheduledJobUpdate(BaseModel):
+    is_enabled: bool
+
+class JobRunResponse(BaseModel):
+    id: int
+    job_id: int
+    trigger: str
+    status: str
+    scheduled_for: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    rows_processed: Optional[int] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime, date
+from decimal import Decimal
+
+class TenantLedgerEntryResponse(BaseModel):
+    id: int
+    entry_type: str
+    amount: Decimal
+    balance_after: Decimal
+    entry_date: date
+    description: Optional[str] = None
+    source_type: str
+    source_id: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class TenantLedgerResponse(BaseModel):
+    tenant_id: int
+    balance: Decimal
+    total_charged: Decimal
+    total_paid: Decimal
+    paid_through: Optional[date] = None
+    months_ahead: int
+    entries: List[TenantLedgerEntryResponse]
@@ -1,7 +1,21 @@
-import requests
-from typing import Optional
+import asyncio
+import os
+import re
+from typing import Optional, List, Dict
 import urllib.parse
 
+from .http_client import provider_http_client
+
+# Recipients per multi-recipient messaging request
+SMS_BATCH_SIZE = int(os.getenv("AT_SMS_BATCH_SIZE", "500"))
+
+# Africa's Talking per-recipient status codes that mean the message was accepted
+SUCCESS_STATUS_CODES = [100, 101, 102]
+
+def _phone_key(phone: Optional[str]) -> str:
+    """Last 9 digits of a phone number, to match +256772... with 0772..."""
+    return re.sub(r"\D", "", phone or "")[-9:]
+
 class AfricasTalkingService:
     def __init__(self):
         # Africa's Talking Configuration
@@ -11,8 +25,12 @@ class AfricasTalkingService:
         self.base_url = "https://api.africastalking.com/version1/messaging"
     
     async def send_sms(self, to_phone: str, message: str, db = None) -> bool:
+        """Send SMS via Africa's Talking API without blocking the event loop."""
+        return await asyncio.to_thread(self.send_sms_blocking, to_phone, message, db)
+    
+    def send_sms_blocking(self, to_phone: str, message: str, db = None) -> bool:
         """
-        Send SMS via Africa's Talking API.
+        Send SMS via Africa's Talking API from a worker thread.
         
         Args:
             to_phone: Phone number in international format (+256...)
@@ -47,7 +65,8 @@ class AfricasTalkingService:
                 data['from'] = self.sender_id
             
             # Send SMS
-            response = requests.post(
+            response = provider_http_client.post(
+                "africas_talking",
                 self.base_url,
                 headers=headers,
                 data=data  # requests will automatically URL-encode
@@ -73,7 +92,7 @@ class AfricasTalkingService:
                     print(f"   Cost: {cost}")
                     
                     # Success if status is "Success" or statusCode is 100-102
-                    return status == 'Success' or status_code in [100, 101, 102]
+                    return status == 'Success' or status_code in SUCCESS_STATUS_CODES
                 else:
                     print(f"   ⚠️ No recipient data in response")
                     print(f"   Response: {result}")
@@ -87,6 +106,73 @@ class AfricasTalkingService:
             print(f"   ❌ Error sending SMS: {str(e)}")
             return False
     
+    def send_bulk_sms_blocking(self, to_phones: List[str], message: str) -> Dict[str, Dict]:
+        """
+        Send the same SMS to many phone numbers from a worker thread.
+        
+        Recipients are sent as comma-separated lists, SMS_BATCH_SIZE numbers
+        per request, and Africa's Talking's per-recipient statuses are mapped
+        back to the numbers as given.
+        
+        Returns:
+            Dict keyed by phone number with success, status, status_code,
+            message_id and cost (or error) for each recipient
+        """
+        results: Dict[str, Dict] = {}
+        phones = list(dict.fromkeys(phone for phone in to_phones if phone))
+        
+        for start in range(0, len(phones), SMS_BATCH_SIZE):
+            chunk = phones[start:start + SMS_BATCH_SIZE]
+            results.update(self._send_sms_chunk(chunk, message))
+        
+        sent = sum(1 for result in results.values() if result["success"])
+        print(f"📱 Bulk SMS via Africa's Talking: {sent}/{len(phones)} accepted")
+        return results
+    
+    def _send_sms_chunk(self, phones: List[str], message: str) -> Dict[str, Dict]:
+        """Send one multi-recipient messaging request"""
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'apiKey': self.api_key
+        }
+        data = {
+            'username': self.username,
+            'to': ','.join(phones),
+            'message': message,
+        }
+        if self.sender_id:
+            data['from'] = self.sender_id
+        
+        try:
+            response = provider_http_client.post("africas_talking", self.base_url, headers=headers, data=data)
+            if response.status_code not in (200, 201):
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                return {phone: {"success": False, "status": "failed", "error": error} for phone in phones}
+            recipients = response.json().get('SMSMessageData', {}).get('Recipients', [])
+        except Exception as e:
+            return {phone: {"success": False, "status": "error", "error": str(e)} for phone in phones}
+        
+        by_number = {_phone_key(recipient.get('number')): recipient for recipient in recipients}
+        
+        results = {}
+        for phone in phones:
+            recipient = by_number.get(_phone_key(phone))
+            if not recipient:
+                results[phone] = {"success": False, "status": "failed", "error": "No status returned for recipient"}
+                continue
+            
+            status = recipient.get('status')
+            status_code = recipient.get('statusCode')
+            results[phone] = {
+                "success": status == 'Success' or status_code in SUCCESS_STATUS_CODES,
+                "status": status,
+                "status_code": status_code,
+                "message_id": recipient.get('messageId'),
+                "cost": recipient.get('cost')
+            }
+        return results
+    
     def check_balance(self) -> Optional[str]:
         """Check account balance."""
         try:
@@ -99,7 +185,7 @@ class AfricasTalkingService:
                 'username': self.username
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = provider_http_client.get("africas_talking", url, headers=headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,104 @@
+"""
+Cron Expression Parsing
+Minimal five-field cron parser (minute hour day-of-month month day-of-week)
+used by the job scheduler to compute next fire times
+"""
+
+from datetime import datetime, timedelta
+from typing import Set
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+
+# (min, max) for each field
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# Give up searching after this many years (e.g. "0 0 31 2 *" never fires)
+MAX_SEARCH_YEARS = 5
+
+class CronExpression:
+    """
+    Parsed cron expression. Supports *, lists (1,15), ranges (1-5) and
+    steps (*/15, 8-18/2). Day-of-week 0 and 7 are both Sunday. As in
+    standard cron, when both day-of-month and day-of-week are restricted
+    a day matches if either field matches.
+    """
+    
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: '{expression}'")
+        
+        parsed = [self._parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {0 if d == 7 else d for d in weekdays}
+        self.days_restricted = fields[2] != "*"
+        self.weekdays_restricted = fields[4] != "*"
+    
+    def _parse_field(self, field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+                if step <= 0:
+                    raise ValueError(f"Invalid step in cron field '{field}'")
+            
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field '{field}' out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        # Python: Monday=0 ... Sunday=6, cron: Sunday=0 ... Saturday=6
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        if self.days_restricted:
+            return day_ok
+        if self.weekdays_restricted:
+            return weekday_ok
+        return True
+    
+    def next_after(self, after: datetime) -> datetime:
+        """Get the first fire time strictly after the given datetime"""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=366 * MAX_SEARCH_YEARS)
+        
+        while dt <= limit:
+            if dt.month not in self.months:
+                # Jump to the first minute of next month
+                if dt.month == 12:
+                    dt = dt.replace(year=dt.year + 1, month=1, day=1, hour=0, minute=0)
+                else:
+                    dt = dt.replace(month=dt.month + 1, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt = dt + timedelta(minutes=1)
+                continue
+            return dt
+        
+        raise ValueError(f"Cron expression '{self.expression}' has no fire time in the next {MAX_SEARCH_YEARS} years")
@@ -0,0 +1,204 @@
+"""
+Provider HTTP Client
+Shared client for outbound calls to SMS, email and mobile money providers:
+pooled keep-alive sessions per host, timeouts, retries, a circuit breaker per
+provider and latency metrics per provider endpoint
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time as time_module
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+# Consecutive failures that open a provider's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without calling the provider while its circuit is open"""
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast for reset_seconds; then one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time_module.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = "half_open"
+                return True
+            if self.state == "half_open":
+                # Only the first caller after the timeout gets the trial call
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time_module.monotonic()
+
+class ProviderHTTPClient:
+    """
+    One pooled requests.Session per host, shared by all threads.
+
+    Connection errors are retried for every method; 502/503/504 responses
+    are retried only for idempotent methods so a POST is never sent twice
+    after the provider has seen it. 5xx responses and transport errors
+    count against the provider's circuit breaker.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = HTTP_READ_TIMEOUT,
+        retries: int = HTTP_RETRIES,
+        pool_size: int = HTTP_POOL_SIZE
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.pool_size = pool_size
+        self._sessions: Dict[str, requests.Session] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._metrics: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def request(self, provider: str, method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+        """Send a request to a provider. Raises CircuitOpenError or requests exceptions."""
+        breaker = self._breaker(provider)
+        endpoint = f"{method.upper()} {urlsplit(url).path or '/'}"
+
+        if not breaker.allow():
+            self._record(provider, endpoint, None, 0.0, "circuit_open")
+            raise CircuitOpenError(f"Circuit open for {provider}, skipping {endpoint}")
+
+        session = self._session(url)
+        started = time_module.monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except Exception as e:
+            # Any failure, not only transport errors, must settle a half-open trial call
+            breaker.record_failure()
+            self._record(provider, endpoint, None, time_module.monotonic() - started, type(e).__name__)
+            raise
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        self._record(provider, endpoint, response.status_code, time_module.monotonic() - started)
+        return response
+
+    async def arequest(self, provider: str, method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+        """Send a request from async code without blocking the event loop."""
+        return await asyncio.to_thread(self.request, provider, method, url, timeout, **kwargs)
+
+    def get(self, provider: str, url: str, **kwargs) -> requests.Response:
+        return self.request(provider, "GET", url, **kwargs)
+
+    def post(self, provider: str, url: str, **kwargs) -> requests.Response:
+        return self.request(provider, "POST", url, **kwargs)
+
+    def _session(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                retry = Retry(
+                    total=self.retries,
+                    connect=self.retries,
+                    read=0,
+                    status=self.retries,
+                    status_forcelist=[502, 503, 504],
+                    backoff_factor=0.5,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount(f"{parts.scheme}://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def _breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker()
+            return self._breakers[provider]
+
+    def _record(self, provider: str, endpoint: str, status_code: Optional[int], seconds: float, error: str = None):
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            stats = self._metrics.setdefault(provider, {}).setdefault(endpoint, {
+                "calls": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "last_status": None,
+                "last_error": None
+            })
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_status"] = status_code
+            if error or (status_code is not None and status_code >= 500):
+                stats["errors"] += 1
+                stats["last_error"] = error or f"HTTP {status_code}"
+
+        if seconds > self.timeout[1] / 2:
+            logger.warning(f"Slow {provider} call {endpoint}: {elapsed_ms:.0f}ms")
+
+    def get_metrics(self) -> Dict:
+        """Latency and error counts per provider endpoint, plus circuit states"""
+        with self._lock:
+            return {
+                provider: {
+                    "circuit": self._breakers[provider].state if provider in self._breakers else "closed",
+                    "endpoints": {
+                        endpoint: {
+                            **stats,
+                            "avg_ms": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0,
+                            "total_ms": round(stats["total_ms"], 1),
+                            "max_ms": round(stats["max_ms"], 1)
+                        }
+                        for endpoint, stats in endpoints.items()
+                    }
+                }
+                for provider, endpoints in self._metrics.items()
+            }
+
+# Global instance
+provider_http_client = ProviderHTTPClient()
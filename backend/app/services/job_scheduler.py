@@ -0,0 +1,318 @@
+"""
+Persistent Job Scheduler
+Runs registered background jobs on cron schedules stored in scheduled_jobs,
+records every execution in job_runs and catches up on missed runs after restarts
+"""
+
+import json
+import logging
+import os
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.scheduled_job import ScheduledJob, JobRun
+from .cron import CronExpression
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Upper bound on how long the scheduler loop sleeps between checks
+JOB_POLL_SECONDS = int(os.getenv("JOB_POLL_SECONDS", "30"))
+
+class RegisteredJob:
+    """In-memory job definition: the code that runs and its schedule"""
+    
+    def __init__(self, name: str, cron: CronExpression, func: Callable[[Session], Optional[Dict]], description: Optional[str] = None):
+        self.name = name
+        self.cron = cron
+        self.func = func
+        self.description = description
+
+class JobScheduler:
+    """
+    Cron scheduler backed by the scheduled_jobs/job_runs tables.
+    
+    Jobs are plain callables taking a database session and returning a
+    summary dict; a "rows_processed" key in the summary is recorded on the
+    run. Each run executes on a bounded thread pool with its own session,
+    so a slow job never delays the others, and a job never overlaps itself.
+    """
+    
+    def __init__(self, max_workers: int = JOB_WORKERS, poll_seconds: int = JOB_POLL_SECONDS):
+        self.max_workers = max_workers
+        self.poll_seconds = poll_seconds
+        self.is_running = False
+        self._jobs: Dict[str, RegisteredJob] = {}
+        self._active: set = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._started_at: Optional[datetime] = None
+    
+    def register(self, name: str, cron_expression: str, func: Callable[[Session], Optional[Dict]], description: str = None):
+        """Register (or replace) a job definition"""
+        self._jobs[name] = RegisteredJob(
+            name=name,
+            cron=CronExpression(cron_expression),
+            func=func,
+            description=description
+        )
+    
+    def start(self) -> bool:
+        """Sync job definitions to the database and start the scheduler loop"""
+        if self.is_running:
+            logger.warning("Job scheduler is already running")
+            return False
+        
+        self._started_at = datetime.utcnow()
+        self._sync_jobs()
+        self._ensure_executor()
+        
+        self._stop_event.clear()
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run_loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+        
+        logger.info(f"Job scheduler started with {len(self._jobs)} jobs and {self.max_workers} workers")
+        return True
+    
+    def stop(self):
+        """Stop the scheduler loop; running jobs are allowed to finish"""
+        self.is_running = False
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Job scheduler stopped")
+    
+    def trigger(self, name: str) -> Optional[int]:
+        """Run a job immediately. Returns the job run id, or None if unknown or already running."""
+        if name not in self._jobs:
+            return None
+        
+        db = SessionLocal()
+        try:
+            job = self._get_or_create_job(db, self._jobs[name])
+            db.commit()
+            return self._submit(db, job, trigger="manual")
+        finally:
+            db.close()
+    
+    def _ensure_executor(self):
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job-worker")
+    
+    def _get_or_create_job(self, db: Session, registered: RegisteredJob) -> ScheduledJob:
+        job = db.query(ScheduledJob).filter(ScheduledJob.name == registered.name).first()
+        if not job:
+            job = ScheduledJob(
+                name=registered.name,
+                description=registered.description,
+                cron_expression=registered.cron.expression,
+                next_run_at=registered.cron.next_after(datetime.utcnow())
+            )
+            db.add(job)
+            db.flush()
+        return job
+    
+    def _sync_jobs(self):
+        """
+        Upsert registered jobs. Jobs whose schedule changed get a fresh
+        next_run_at; jobs whose next_run_at passed while the app was down
+        keep it, so the loop runs them once as a catch-up.
+        """
+        db = SessionLocal()
+        try:
+            for registered in self._jobs.values():
+                job = self._get_or_create_job(db, registered)
+                if job.cron_expression != registered.cron.expression:
+                    job.cron_expression = registered.cron.expression
+                    job.next_run_at = registered.cron.next_after(datetime.utcnow())
+                if registered.description:
+                    job.description = registered.description
+                if job.next_run_at is None:
+                    job.next_run_at = registered.cron.next_after(datetime.utcnow())
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error syncing scheduled jobs: {str(e)}")
+        finally:
+            db.close()
+    
+    def _run_loop(self):
+        """Main scheduler loop: dispatch due jobs, then sleep until the next one"""
+        while not self._stop_event.is_set():
+            wait_seconds = self.poll_seconds
+            try:
+                wait_seconds = self._tick()
+            except Exception as e:
+                logger.error(f"Error in job scheduler loop: {str(e)}")
+            self._stop_event.wait(max(1, min(wait_seconds, self.poll_seconds)))
+    
+    def _tick(self) -> float:
+        """Claim and submit every due job. Returns seconds until the next due job."""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            due_jobs = db.query(ScheduledJob).filter(
+                ScheduledJob.is_enabled == True,
+                ScheduledJob.next_run_at <= now,
+                ScheduledJob.name.in_(list(self._jobs.keys()))
+            ).all()
+            
+            for job in due_jobs:
+                if job.name in self._active:
+                    # Still running: leave it due so the missed fire is coalesced
+                    continue
+                
+                scheduled_for = job.next_run_at
+                next_run = self._jobs[job.name].cron.next_after(now)
+                
+                # Claim the fire time so other app instances skip it
+                claimed = db.query(ScheduledJob).filter(
+                    ScheduledJob.id == job.id,
+                    ScheduledJob.next_run_at == scheduled_for
+                ).update({ScheduledJob.next_run_at: next_run}, synchronize_session=False)
+                db.commit()
+                
+                if claimed:
+                    trigger = "catch_up" if scheduled_for < self._started_at else "schedule"
+                    self._submit(db, job, trigger=trigger, scheduled_for=scheduled_for)
+            
+            next_due = db.query(ScheduledJob.next_run_at).filter(
+                ScheduledJob.is_enabled == True,
+                ScheduledJob.name.in_(list(self._jobs.keys()))
+            ).order_by(ScheduledJob.next_run_at.asc()).first()
+            
+            if next_due and next_due[0]:
+                seconds = (next_due[0] - datetime.utcnow()).total_seconds()
+                # A due job that is still running is re-checked on the normal poll
+                if seconds > 0:
+                    return seconds
+            return self.poll_seconds
+        finally:
+            db.close()
+    
+    def _submit(self, db: Session, job: ScheduledJob, trigger: str, scheduled_for: datetime = None) -> Optional[int]:
+        """Record a queued run and hand it to the worker pool"""
+        with self._lock:
+            if job.name in self._active:
+                return None
+            self._active.add(job.name)
+        
+        try:
+            run = JobRun(job_id=job.id, trigger=trigger, status="queued", scheduled_for=scheduled_for)
+            db.add(run)
+            db.commit()
+            
+            self._ensure_executor()
+            self._executor.submit(self._execute, job.name, job.id, run.id)
+            return run.id
+        except Exception:
+            with self._lock:
+                self._active.discard(job.name)
+            raise
+    
+    def _execute(self, name: str, job_id: int, run_id: int):
+        """Run one job in its own session and record the outcome"""
+        db = SessionLocal()
+        started_at = datetime.utcnow()
+        started = time_module.monotonic()
+        status = "completed"
+        result: Dict = {}
+        error = None
+        
+        try:
+            db.query(JobRun).filter(JobRun.id == run_id).update(
+                {JobRun.status: "running", JobRun.started_at: started_at},
+                synchronize_session=False
+            )
+            db.commit()
+            
+            logger.info(f"Running job {name} (run {run_id})")
+            result = self._jobs[name].func(db) or {}
+            if result.get("error"):
+                status = "failed"
+                error = str(result["error"])
+        except Exception as e:
+            db.rollback()
+            status = "failed"
+            error = str(e)
+            logger.error(f"Job {name} failed: {error}")
+        
+        try:
+            finished_at = datetime.utcnow()
+            duration_ms = int((time_module.monotonic() - started) * 1000)
+            rows_processed = result.get("rows_processed")
+            
+            db.query(JobRun).filter(JobRun.id == run_id).update(
+                {
+                    JobRun.status: status,
+                    JobRun.finished_at: finished_at,
+                    JobRun.duration_ms: duration_ms,
+                    JobRun.rows_processed: rows_processed,
+                    JobRun.result: json.dumps(result, default=str),
+                    JobRun.error: error
+                },
+                synchronize_session=False
+            )
+            db.query(ScheduledJob).filter(ScheduledJob.id == job_id).update(
+                {
+                    ScheduledJob.last_run_at: started_at,
+                    ScheduledJob.last_status: status,
+                    ScheduledJob.last_duration_ms: duration_ms,
+                    ScheduledJob.last_rows_processed: rows_processed,
+                    ScheduledJob.last_error: error
+                },
+                synchronize_session=False
+            )
+            db.commit()
+            logger.info(f"Job {name} {status} in {duration_ms}ms")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error recording run {run_id} of job {name}: {str(e)}")
+        finally:
+            db.close()
+            with self._lock:
+                self._active.discard(name)
+    
+    def get_jobs(self, db: Session) -> List[ScheduledJob]:
+        """Get all persisted jobs"""
+        return db.query(ScheduledJob).order_by(ScheduledJob.name).all()
+    
+    def get_job(self, db: Session, name: str) -> Optional[ScheduledJob]:
+        return db.query(ScheduledJob).filter(ScheduledJob.name == name).first()
+    
+    def get_job_runs(self, db: Session, job_id: int, skip: int = 0, limit: int = 50) -> List[JobRun]:
+        return db.query(JobRun).filter(
+            JobRun.job_id == job_id
+        ).order_by(JobRun.id.desc()).offset(skip).limit(limit).all()
+    
+    def is_active(self, name: str) -> bool:
+        return name in self._active
+    
+    def set_enabled(self, db: Session, name: str, is_enabled: bool) -> Optional[ScheduledJob]:
+        """Enable or disable a job; re-enabling schedules it from now instead of catching up"""
+        job = self.get_job(db, name)
+        if not job:
+            return None
+        
+        job.is_enabled = is_enabled
+        if is_enabled and name in self._jobs:
+            job.next_run_at = self._jobs[name].cron.next_after(datetime.utcnow())
+        db.commit()
+        db.refresh(job)
+        return job
+
+# Global scheduler instance
+job_scheduler = JobScheduler()
@@ -0,0 +1,452 @@
+"""
+Bulk Message Dispatcher
+Delivers bulk email/SMS in the background with bounded concurrency and
+records progress on the communication log as batches finish
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.communication_log import CommunicationLog
+from ..models.communication_delivery import CommunicationDelivery
+from .notification import notification_service
+from .recipient_groups import recipient_group_service
+from .template_renderer import RenderPlan, compile_message, recipient_values
+
+logger = logging.getLogger(__name__)
+
+# Concurrent provider calls across all dispatches
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "16"))
+# Recipients delivered between two progress updates of the log
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "500"))
+
+# Scheduled logs claimed per run and how long a claim lasts
+SCHEDULED_BATCH_SIZE = int(os.getenv("SCHEDULED_BATCH_SIZE", "50"))
+SCHEDULED_CLAIM_SECONDS = int(os.getenv("SCHEDULED_CLAIM_SECONDS", "600"))
+# A sending log's lease, renewed after every batch; an expired lease means its process died
+SENDING_LEASE_SECONDS = int(os.getenv("SENDING_LEASE_SECONDS", "600"))
+# Stalled sends are requeued this many times in total before the log is marked failed
+SENDING_MAX_ATTEMPTS = int(os.getenv("SENDING_MAX_ATTEMPTS", "3"))
+
+DEFAULT_SUBJECT = "Message from Property Management"
+SMS_MAX_LENGTH = 160
+
+def build_deliveries(
+    recipients: Iterable, subject: str, plan: RenderPlan,
+    values_for: Callable[[object], Dict[str, str]] = recipient_values
+) -> List[Dict]:
+    """
+    Render a compiled message for each recipient row. SMS text is fitted to
+    SMS_MAX_SEGMENTS without cutting a placeholder value; emails also keep
+    the template and its substitutions for SendGrid batching. values_for
+    maps a row to its template values (tenant columns by default).
+    """
+    deliveries = []
+    for recipient in recipients:
+        values = values_for(recipient)
+        deliveries.append({
+            "tenant_id": recipient.id,
+            "email": recipient.email,
+            "phone": recipient.phone,
+            "subject": subject,
+            "message": plan.render(values),
+            "sms_message": plan.render_sms(values),
+            "template": plan.text,
+            "substitutions": plan.substitutions(values)
+        })
+    return deliveries
+
+class MessageDispatcher:
+    """
+    Fans deliveries out over a shared worker pool.
+
+    A delivery is a dict with tenant_id, email, phone and the personalized
+    message (and optional subject). Each dispatch is coordinated by its own
+    thread which submits batches to the pool and writes sent_count,
+    failed_count and delivery_report after every batch, and bulk inserts
+    one communication_deliveries row per recipient and channel.
+
+    Deliveries may also carry the unrendered "template" and its
+    "substitutions"; those emails are sent as SendGrid batches.
+    
+    While sending, the log holds a lease in claim_expires_at that is renewed
+    after every batch. If the process dies mid-send the lease runs out and
+    recover_stalled() requeues the log for its undelivered recipients (or
+    marks it failed after SENDING_MAX_ATTEMPTS).
+    """
+    
+    def __init__(self, max_workers: int = DISPATCH_WORKERS, batch_size: int = DISPATCH_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="message-dispatch")
+    
+    def dispatch(self, log_id: int, method: str, deliveries: List[Dict]) -> threading.Thread:
+        """Start delivering in the background and return immediately"""
+        self._update_log(
+            log_id,
+            status="sending",
+            claim_expires_at=self._lease(),
+            dispatch_attempts=func.coalesce(CommunicationLog.dispatch_attempts, 0) + 1
+        )
+        coordinator = threading.Thread(
+            target=self.run,
+            args=(log_id, method, deliveries),
+            name=f"dispatch-log-{log_id}",
+            daemon=True
+        )
+        coordinator.start()
+        return coordinator
+    
+    def run(self, log_id: int, method: str, deliveries: List[Dict]) -> Dict:
+        """Deliver all messages for a log, blocking until done"""
+        # A requeued log continues from the progress recorded before it stalled
+        sent_count, failed_count, delivery_details = self._load_progress(log_id)
+        
+        self._update_log(log_id, status="sending", claim_expires_at=self._lease())
+        
+        for start in range(0, len(deliveries), self.batch_size):
+            batch = deliveries[start:start + self.batch_size]
+            results = self._deliver_batch(method, batch)
+            
+            for result in results:
+                if result["status"] == "sent":
+                    sent_count += 1
+                else:
+                    failed_count += 1
+            delivery_details.extend(results)
+            self._record_deliveries(log_id, batch, results)
+            
+            self._update_log(
+                log_id,
+                sent_count=sent_count,
+                failed_count=failed_count,
+                delivery_report=json.dumps(delivery_details),
+                claim_expires_at=self._lease()
+            )
+        
+        status = "sent" if sent_count or not failed_count else "failed"
+        self._update_log(log_id, status=status, sent_at=datetime.utcnow(), claim_expires_at=None)
+        logger.info(f"Communication log {log_id}: {sent_count} sent, {failed_count} failed")
+        
+        return {"sent": sent_count, "failed": failed_count}
+    
+    def _deliver_batch(self, method: str, batch: List[Dict]) -> List[Dict]:
+        """
+        Deliver one batch. Templated emails sharing a subject and body are sent
+        as SendGrid personalization batches, other emails one call each; SMS are
+        grouped by identical text and sent as multi-recipient requests.
+        Returns one result per delivery, in order.
+        """
+        email_futures = {}
+        email_groups: Dict[tuple, List[int]] = defaultdict(list)
+        if method in ["email", "both"]:
+            for index, delivery in enumerate(batch):
+                if not delivery.get("email"):
+                    continue
+                subject = delivery.get("subject") or DEFAULT_SUBJECT
+                if delivery.get("template") and delivery.get("substitutions") is not None:
+                    email_groups[(subject, delivery["template"])].append(index)
+                else:
+                    email_futures[index] = self._executor.submit(
+                        notification_service.send_email_blocking,
+                        delivery["email"],
+                        subject,
+                        delivery["message"]
+                    )
+        email_batch_futures = {
+            key: self._executor.submit(
+                notification_service.send_batch_email_blocking,
+                [
+                    {"email": batch[index]["email"], "substitutions": batch[index]["substitutions"]}
+                    for index in indexes
+                ],
+                key[0],
+                key[1]
+            )
+            for key, indexes in email_groups.items()
+        }
+        
+        sms_groups: Dict[str, List[int]] = defaultdict(list)
+        if method in ["sms", "both"]:
+            for index, delivery in enumerate(batch):
+                if delivery.get("phone"):
+                    sms_groups[self.sms_text(delivery)].append(index)
+        sms_futures = {
+            text: self._executor.submit(
+                notification_service.send_bulk_sms_blocking,
+                [batch[index]["phone"] for index in indexes],
+                text
+            )
+            for text, indexes in sms_groups.items()
+        }
+        
+        results = [{"tenant_id": delivery["tenant_id"], "status": "failed"} for delivery in batch]
+        
+        for index, future in email_futures.items():
+            try:
+                results[index]["email_sent"] = bool(future.result())
+            except Exception as e:
+                results[index]["email_sent"] = False
+                results[index]["email_error"] = str(e)
+        
+        for key, future in email_batch_futures.items():
+            indexes = email_groups[key]
+            try:
+                chunk_results = future.result()
+            except Exception as e:
+                chunk_results = [{"emails": indexes, "success": False, "error": str(e)}]
+            
+            # Chunks cover the group's recipients in order
+            position = 0
+            for chunk_result in chunk_results:
+                for index in indexes[position:position + len(chunk_result["emails"])]:
+                    results[index]["email_sent"] = bool(chunk_result["success"])
+                    if chunk_result.get("status_code"):
+                        results[index]["email_status_code"] = chunk_result["status_code"]
+                    if chunk_result.get("error"):
+                        results[index]["email_error"] = chunk_result["error"]
+                position += len(chunk_result["emails"])
+        
+        for text, future in sms_futures.items():
+            try:
+                sms_results = future.result()
+            except Exception as e:
+                sms_results = {}
+                for index in sms_groups[text]:
+                    results[index]["sms_error"] = str(e)
+            
+            for index in sms_groups[text]:
+                sms_result = sms_results.get(batch[index]["phone"], {})
+                results[index]["sms_sent"] = bool(sms_result.get("success"))
+                if sms_result.get("status"):
+                    results[index]["sms_status"] = sms_result["status"]
+                if sms_result.get("message_id"):
+                    results[index]["sms_message_id"] = sms_result["message_id"]
+                if sms_result.get("error"):
+                    results[index]["sms_error"] = sms_result["error"]
+        
+        for result in results:
+            errors = [
+                f"{channel}: {result[f'{channel}_error']}"
+                for channel in ("email", "sms") if result.get(f"{channel}_error")
+            ]
+            if result.get("email_sent") or result.get("sms_sent"):
+                result["status"] = "sent"
+            elif errors:
+                result["status"] = "error"
+            if errors:
+                result["error"] = "; ".join(errors)
+        
+        return results
+    
+    @staticmethod
+    def sms_text(delivery: Dict) -> str:
+        """SMS body for a delivery"""
+        return delivery.get("sms_message") or delivery["message"][:SMS_MAX_LENGTH]
+    
+    def process_scheduled(self, db: Session) -> Dict:
+        """
+        Claim due scheduled logs and start sending them.
+        
+        A log is claimed with a conditional UPDATE that sets claimed_by and a
+        lease in claim_expires_at, so two workers never send the same log; a
+        claim whose worker died before dispatching expires and is retried.
+        Sends that stalled after dispatch are requeued first (recover_stalled).
+        Recipient rows for all claimed logs are loaded with chunked IN queries;
+        recipients a log already has deliveries for are skipped.
+        """
+        recovered = self.recover_stalled(db)
+        now = datetime.utcnow()
+        worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        
+        due_ids = [row[0] for row in db.query(CommunicationLog.id).filter(
+            CommunicationLog.status == "scheduled",
+            CommunicationLog.scheduled_at <= now,
+            or_(CommunicationLog.claim_expires_at == None, CommunicationLog.claim_expires_at < now)
+        ).order_by(CommunicationLog.scheduled_at.asc()).limit(SCHEDULED_BATCH_SIZE).all()]
+        
+        if not due_ids:
+            return {"claimed": 0, "dispatched": 0, "recipients": 0, "rows_processed": 0, **recovered}
+        
+        db.query(CommunicationLog).filter(
+            CommunicationLog.id.in_(due_ids),
+            CommunicationLog.status == "scheduled",
+            or_(CommunicationLog.claim_expires_at == None, CommunicationLog.claim_expires_at < now)
+        ).update(
+            {
+                CommunicationLog.claimed_by: worker_id,
+                CommunicationLog.claim_expires_at: now + timedelta(seconds=SCHEDULED_CLAIM_SECONDS)
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        
+        logs = db.query(CommunicationLog).filter(
+            CommunicationLog.id.in_(due_ids),
+            CommunicationLog.claimed_by == worker_id
+        ).all()
+        
+        recipient_ids_by_log = {}
+        for log in logs:
+            try:
+                recipient_ids_by_log[log.id] = [int(tenant_id) for tenant_id in json.loads(log.recipient_ids or "[]")]
+            except (ValueError, TypeError) as e:
+                logger.error(f"Scheduled log {log.id} has invalid recipient_ids: {str(e)}")
+                recipient_ids_by_log[log.id] = []
+        
+        tenants = recipient_group_service.get_recipients_by_ids(
+            db, [tid for ids in recipient_ids_by_log.values() for tid in ids]
+        )
+        
+        # Recipients of a requeued log that were already attempted
+        delivered = set(db.query(CommunicationDelivery.log_id, CommunicationDelivery.tenant_id).filter(
+            CommunicationDelivery.log_id.in_(list(recipient_ids_by_log))
+        ).distinct().all())
+        
+        dispatched = 0
+        recipient_count = 0
+        for log in logs:
+            recipients = [
+                tenants[tid] for tid in recipient_ids_by_log[log.id]
+                if tid in tenants and (log.id, tid) not in delivered
+            ]
+            deliveries = build_deliveries(recipients, log.subject, compile_message(log.message_content))
+            
+            # Leaving "scheduled" ends the claim; the sending lease takes over
+            log.status = "sending"
+            log.claim_expires_at = self._lease()
+            db.commit()
+            
+            self.dispatch(log.id, log.method, deliveries)
+            dispatched += 1
+            recipient_count += len(deliveries)
+        
+        logger.info(f"Scheduled messages: {dispatched} logs dispatched to {recipient_count} recipients")
+        return {
+            "claimed": len(logs),
+            "dispatched": dispatched,
+            "recipients": recipient_count,
+            "rows_processed": dispatched,
+            **recovered
+        }
+    
+    def recover_stalled(self, db: Session) -> Dict:
+        """
+        Requeue sending logs whose lease expired (their process died mid-send);
+        logs that already used SENDING_MAX_ATTEMPTS are marked failed instead.
+        Both are conditional UPDATEs, so a live sender renewing its lease wins.
+        """
+        now = datetime.utcnow()
+        stalled = and_(
+            CommunicationLog.status == "sending",
+            or_(
+                CommunicationLog.claim_expires_at < now,
+                # Logs set to sending before leases existed
+                and_(
+                    CommunicationLog.claim_expires_at == None,
+                    CommunicationLog.created_at < now - timedelta(seconds=SENDING_LEASE_SECONDS)
+                )
+            )
+        )
+        attempts = func.coalesce(CommunicationLog.dispatch_attempts, 0)
+        
+        failed = db.query(CommunicationLog).filter(stalled, attempts >= SENDING_MAX_ATTEMPTS).update(
+            {CommunicationLog.status: "failed", CommunicationLog.claim_expires_at: None},
+            synchronize_session=False
+        )
+        requeued = db.query(CommunicationLog).filter(stalled, attempts < SENDING_MAX_ATTEMPTS).update(
+            {
+                CommunicationLog.status: "scheduled",
+                CommunicationLog.scheduled_at: now,
+                CommunicationLog.claimed_by: None,
+                CommunicationLog.claim_expires_at: None
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        
+        if failed or requeued:
+            logger.warning(f"Stalled communication logs: {requeued} requeued, {failed} marked failed")
+        return {"stalled_requeued": requeued, "stalled_failed": failed}
+    
+    def _record_deliveries(self, log_id: int, batch: List[Dict], results: List[Dict]):
+        """Bulk insert one communication_deliveries row per recipient and channel attempted"""
+        now = datetime.utcnow()
+        rows = []
+        for delivery, result in zip(batch, results):
+            for channel, address_key in (("email", "email"), ("sms", "phone")):
+                if f"{channel}_sent" not in result and not result.get(f"{channel}_error"):
+                    continue
+                sent = bool(result.get(f"{channel}_sent"))
+                rows.append({
+                    "log_id": log_id,
+                    "tenant_id": delivery["tenant_id"],
+                    "channel": channel,
+                    "recipient": delivery.get(address_key),
+                    "status": "sent" if sent else ("error" if result.get(f"{channel}_error") else "failed"),
+                    "provider_message_id": result.get(f"{channel}_message_id"),
+                    "provider_status": str(result.get(f"{channel}_status") or result.get(f"{channel}_status_code") or "") or None,
+                    "error": result.get(f"{channel}_error"),
+                    "created_at": now,
+                    "sent_at": now if sent else None
+                })
+        
+        if not rows:
+            return
+        
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(CommunicationDelivery, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error recording deliveries for communication log {log_id}: {str(e)}")
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _lease() -> datetime:
+        return datetime.utcnow() + timedelta(seconds=SENDING_LEASE_SECONDS)
+    
+    def _load_progress(self, log_id: int) -> tuple:
+        """Sent and failed counts and delivery report already recorded on the log"""
+        db = SessionLocal()
+        try:
+            log = db.query(CommunicationLog).filter(CommunicationLog.id == log_id).first()
+            if not log:
+                return 0, 0, []
+            try:
+                details = json.loads(log.delivery_report or "[]")
+            except (ValueError, TypeError):
+                details = []
+            return log.sent_count or 0, log.failed_count or 0, details
+        finally:
+            db.close()
+    
+    def _update_log(self, log_id: int, **fields):
+        """Write progress to the communication log in a short-lived session"""
+        db = SessionLocal()
+        try:
+            db.query(CommunicationLog).filter(CommunicationLog.id == log_id).update(
+                fields, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error updating communication log {log_id}: {str(e)}")
+        finally:
+            db.close()
+
+# Global instance
+message_dispatcher = MessageDispatcher()
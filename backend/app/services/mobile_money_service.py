@@ -1,19 +1,25 @@
-import requests
 import json
+import os
+import uuid
 from typing import Optional, Dict
 from sqlalchemy.orm import Session
 from ..crud import settings as settings_crud
 from datetime import datetime
 import logging
 
+from .http_client import provider_http_client
+
 logger = logging.getLogger(__name__)
 
 class MobileMoneyService:
     """Service for handling mobile money payments (MTN and Airtel)."""
     
     def __init__(self):
-        self.mtn_api_url = "https://api.mtn.com/mobile-money"  # Example URL
-        self.airtel_api_url = "https://api.airtel.com/money"  # Example URL
+        self.mtn_api_url = os.getenv("MTN_MOMO_API_URL", "https://api.mtn.com/mobile-money")  # Example URL
+        self.airtel_api_url = os.getenv("AIRTEL_MONEY_API_URL", "https://api.airtel.com/money")  # Example URL
+        # Provider calls are simulated until API keys are configured
+        self.mtn_api_key = os.getenv("MTN_MOMO_API_KEY")
+        self.airtel_api_key = os.getenv("AIRTEL_MONEY_API_KEY")
     
     def get_payment_number(self, db: Session, provider: str) -> Optional[str]:
         """Get the configured payment number for a provider from settings."""
@@ -112,42 +118,49 @@ class MobileMoneyService:
         """
         Process MTN Mobile Money payment.
         
-        In production, this would call the actual MTN Mobile Money API.
-        For now, it simulates the payment process.
+        Calls the MTN Mobile Money API over the shared provider client when
+        MTN_MOMO_API_KEY is configured; otherwise simulates the payment process.
         """
         try:
-            # SIMULATION MODE (Remove in production)
-            # In production, you would make an actual API call to MTN
-            """
-            response = requests.post(
-                f"{self.mtn_api_url}/v1/requesttopay",
-                headers={
-                    "Authorization": f"Bearer {mtn_api_key}",
-                    "X-Target-Environment": "live",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "amount": payment_data["amount"],
-                    "currency": payment_data["currency"],
-                    "externalId": payment_data["reference"],
-                    "payer": {
-                        "partyIdType": "MSISDN",
-                        "partyId": payment_data["customer_phone"]
+            if self.mtn_api_key:
+                reference_id = str(uuid.uuid4())
+                response = await provider_http_client.arequest(
+                    "mtn",
+                    "POST",
+                    f"{self.mtn_api_url}/v1/requesttopay",
+                    headers={
+                        "Authorization": f"Bearer {self.mtn_api_key}",
+                        "X-Reference-Id": reference_id,
+                        "X-Target-Environment": "live",
+                        "Content-Type": "application/json"
                     },
-                    "payerMessage": payment_data["description"],
-                    "payeeNote": payment_data["description"]
-                }
-            )
-            
-            if response.status_code == 202:
+                    json={
+                        "amount": str(payment_data["amount"]),
+                        "currency": payment_data["currency"],
+                        "externalId": payment_data["reference"],
+                        "payer": {
+                            "partyIdType": "MSISDN",
+                            "partyId": payment_data["customer_phone"]
+                        },
+                        "payerMessage": payment_data["description"],
+                        "payeeNote": payment_data["description"]
+                    }
+                )
+                
+                if response.status_code == 202:
+                    return {
+                        "success": True,
+                        "transaction_id": reference_id,
+                        "status": "PENDING",
+                        "message": "Payment request sent to customer",
+                        "provider": "MTN Mobile Money",
+                        "merchant_number": payment_data['merchant_phone']
+                    }
                 return {
-                    "success": True,
-                    "transaction_id": response.headers.get("X-Reference-Id"),
-                    "status": "PENDING",
-                    "message": "Payment request sent to customer",
-                    "provider": "MTN Mobile Money"
+                    "success": False,
+                    "error": f"HTTP {response.status_code}: {response.text[:200]}",
+                    "message": "MTN Mobile Money payment failed"
                 }
-            """
             
             # SIMULATION RESPONSE
             return {
@@ -172,33 +185,48 @@ class MobileMoneyService:
         """
         Process Airtel Money payment.
         
-        In production, this would call the actual Airtel Money API.
-        For now, it simulates the payment process.
+        Calls the Airtel Money API over the shared provider client when
+        AIRTEL_MONEY_API_KEY is configured; otherwise simulates the payment process.
         """
         try:
-            # SIMULATION MODE (Remove in production)
-            # In production, you would make an actual API call to Airtel
-            """
-            response = requests.post(
-                f"{self.airtel_api_url}/v1/payments",
-                headers={
-                    "Authorization": f"Bearer {airtel_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "amount": payment_data["amount"],
-                    "currency": payment_data["currency"],
-                    "reference": payment_data["reference"],
-                    "subscriber": {
-                        "msisdn": payment_data["customer_phone"]
+            if self.airtel_api_key:
+                response = await provider_http_client.arequest(
+                    "airtel",
+                    "POST",
+                    f"{self.airtel_api_url}/v1/payments",
+                    headers={
+                        "Authorization": f"Bearer {self.airtel_api_key}",
+                        "Content-Type": "application/json"
                     },
-                    "transaction": {
-                        "type": "B2C",
-                        "description": payment_data["description"]
+                    json={
+                        "amount": payment_data["amount"],
+                        "currency": payment_data["currency"],
+                        "reference": payment_data["reference"],
+                        "subscriber": {
+                            "msisdn": payment_data["customer_phone"]
+                        },
+                        "transaction": {
+                            "id": payment_data["reference"],
+                            "type": "B2C",
+                            "description": payment_data["description"]
+                        }
                     }
+                )
+                
+                if response.status_code in (200, 201, 202):
+                    return {
+                        "success": True,
+                        "transaction_id": payment_data["reference"],
+                        "status": "PENDING",
+                        "message": "Payment request sent to customer",
+                        "provider": "Airtel Money",
+                        "merchant_number": payment_data['merchant_phone']
+                    }
+                return {
+                    "success": False,
+                    "error": f"HTTP {response.status_code}: {response.text[:200]}",
+                    "message": "Airtel Money payment failed"
                 }
-            )
-            """
             
             # SIMULATION RESPONSE
             return {
@@ -226,13 +254,48 @@ class MobileMoneyService:
     ) -> Dict:
         """Check the status of a mobile money payment."""
         try:
-            # In production, query the payment provider's API
-            # For now, return a simulated response
+            if provider.lower() in ['mtn', 'mtn_mobile_money'] and self.mtn_api_key:
+                response = await provider_http_client.arequest(
+                    "mtn",
+                    "GET",
+                    f"{self.mtn_api_url}/v1/requesttopay/{transaction_id}",
+                    headers={
+                        "Authorization": f"Bearer {self.mtn_api_key}",
+                        "X-Target-Environment": "live"
+                    }
+                )
+                response.raise_for_status()
+                provider_status = response.json().get("status", "PENDING")
+                return {
+                    "transaction_id": transaction_id,
+                    "status": {"SUCCESSFUL": "COMPLETED"}.get(provider_status, provider_status),
+                    "provider": provider,
+                    "message": f"MTN status: {provider_status}"
+                }
+            
+            if provider.lower() in ['airtel', 'airtel_money'] and self.airtel_api_key:
+                response = await provider_http_client.arequest(
+                    "airtel",
+                    "GET",
+                    f"{self.airtel_api_url}/standard/v1/payments/{transaction_id}",
+                    headers={"Authorization": f"Bearer {self.airtel_api_key}"}
+                )
+                response.raise_for_status()
+                provider_status = response.json().get("data", {}).get("transaction", {}).get("status", "TIP")
+                return {
+                    "transaction_id": transaction_id,
+                    "status": {"TS": "COMPLETED", "TF": "FAILED"}.get(provider_status, "PENDING"),
+                    "provider": provider,
+                    "message": f"Airtel status: {provider_status}"
+                }
+            
+            # Not configured: return a simulated response
             return {
                 "transaction_id": transaction_id,
                 "status": "COMPLETED",  # or PENDING, FAILED
                 "provider": provider,
-                "message": "Payment completed successfully"
+                "message": "Payment completed successfully",
+                "simulation": True
             }
         except Exception as e:
             return {
@@ -1,30 +1,42 @@
 import os
-from typing import List, Optional
+import asyncio
+from typing import List, Optional, Dict
 from datetime import datetime, timedelta
+from sqlalchemy import func, or_, and_
 from sqlalchemy.orm import Session
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from sendgrid.helpers.mail import Mail, Personalization, To, Substitution
 import redis
 from dotenv import load_dotenv
 from .africas_talking import africas_talking_service
+from .http_client import provider_http_client
 
 load_dotenv()
 
 # Configuration
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+# Override to point at a local stub server when testing
+SENDGRID_API_HOST = os.getenv("SENDGRID_API_HOST", "https://api.sendgrid.com")
+# SendGrid accepts at most 1,000 personalizations per request
+SENDGRID_BATCH_SIZE = min(int(os.getenv("SENDGRID_BATCH_SIZE", "1000")), 1000)
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@yourdomain.com")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Cached unread counts expire so any drift from concurrent writers heals
+UNREAD_COUNT_TTL_SECONDS = int(os.getenv("UNREAD_COUNT_TTL_SECONDS", "86400"))
 
 class NotificationService:
     def __init__(self):
-        self.sendgrid_client = SendGridAPIClient(api_key=SENDGRID_API_KEY) if SENDGRID_API_KEY else None
+        self.sendgrid_api_key = SENDGRID_API_KEY
         self.redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
         # Use Africa's Talking for SMS
         self.sms_service = africas_talking_service
     
     async def send_email(self, to_email: str, subject: str, content: str, html_content: str = None) -> bool:
-        """Send email notification."""
-        if not self.sendgrid_client:
+        """Send email notification without blocking the event loop."""
+        return await asyncio.to_thread(self.send_email_blocking, to_email, subject, content, html_content)
+    
+    def send_email_blocking(self, to_email: str, subject: str, content: str, html_content: str = None) -> bool:
+        """Send email notification from a worker thread."""
+        if not self.sendgrid_api_key:
             print("SendGrid not configured, skipping email")
             return False
         
@@ -36,33 +48,244 @@ class NotificationService:
                 plain_text_content=content,
                 html_content=html_content
             )
-            response = self.sendgrid_client.send(message)
+            response = self._send_mail(message)
             return response.status_code == 202
         except Exception as e:
             print(f"Error sending email: {e}")
             return False
     
+    def _send_mail(self, message: Mail):
+        """POST a built Mail to SendGrid over the shared pooled client."""
+        return provider_http_client.post(
+            "sendgrid",
+            f"{SENDGRID_API_HOST}/v3/mail/send",
+            headers={
+                "Authorization": f"Bearer {self.sendgrid_api_key}",
+                "Content-Type": "application/json"
+            },
+            json=message.get()
+        )
+    
+    def send_batch_email_blocking(self, recipients: List[Dict], subject: str, content: str, html_content: str = None) -> List[Dict]:
+        """
+        Send one templated email to many recipients using SendGrid personalizations.
+        
+        Each recipient is {"email": ..., "substitutions": {"{tenant_name}": ..., ...}};
+        SendGrid replaces the keys in the subject and body per recipient. Recipients
+        are sent SENDGRID_BATCH_SIZE per request. Returns one result per request:
+        chunk index, emails, success, status_code and error.
+        """
+        results = []
+        if not recipients:
+            return results
+        
+        if not self.sendgrid_api_key:
+            print("SendGrid not configured, skipping email")
+            return [{
+                "chunk": 0,
+                "emails": [recipient["email"] for recipient in recipients],
+                "success": False,
+                "status_code": None,
+                "error": "SendGrid not configured"
+            }]
+        
+        for start in range(0, len(recipients), SENDGRID_BATCH_SIZE):
+            chunk = recipients[start:start + SENDGRID_BATCH_SIZE]
+            result = {
+                "chunk": start // SENDGRID_BATCH_SIZE,
+                "emails": [recipient["email"] for recipient in chunk],
+                "success": False,
+                "status_code": None
+            }
+            
+            try:
+                message = Mail(
+                    from_email=FROM_EMAIL,
+                    subject=subject,
+                    plain_text_content=content,
+                    html_content=html_content
+                )
+                for recipient in chunk:
+                    personalization = Personalization()
+                    personalization.add_to(To(recipient["email"]))
+                    for key, value in (recipient.get("substitutions") or {}).items():
+                        personalization.add_substitution(Substitution(key, str(value)))
+                    message.add_personalization(personalization)
+                
+                response = self._send_mail(message)
+                result["status_code"] = response.status_code
+                result["success"] = response.status_code == 202
+                if not result["success"]:
+                    result["error"] = f"SendGrid returned {response.status_code}"
+            except Exception as e:
+                print(f"Error sending batch email chunk {result['chunk']}: {e}")
+                result["error"] = str(e)
+            
+            results.append(result)
+        
+        sent = sum(len(result["emails"]) for result in results if result["success"])
+        print(f"Batch email: {sent}/{len(recipients)} recipients accepted in {len(results)} request(s)")
+        return results
+    
+    async def send_batch_email(self, recipients: List[Dict], subject: str, content: str, html_content: str = None) -> List[Dict]:
+        """Send a templated batch email without blocking the event loop."""
+        return await asyncio.to_thread(self.send_batch_email_blocking, recipients, subject, content, html_content)
+    
     async def send_sms(self, to_phone: str, message: str, db: Session = None) -> bool:
         """Send SMS notification via Africa's Talking."""
         # Use Africa's Talking service for all SMS
         return await self.sms_service.send_sms(to_phone, message, db)
     
+    def send_sms_blocking(self, to_phone: str, message: str, db: Session = None) -> bool:
+        """Send SMS notification from a worker thread."""
+        return self.sms_service.send_sms_blocking(to_phone, message, db)
+    
+    def send_bulk_sms_blocking(self, to_phones: List[str], message: str) -> Dict[str, Dict]:
+        """Send the same SMS to many numbers in batched requests; returns per-number results."""
+        return self.sms_service.send_bulk_sms_blocking(to_phones, message)
+    
     async def create_notification(self, db: Session, user_id: int, title: str, message: str, notification_type: str) -> bool:
         """Create in-app notification."""
+        return self.create_notifications(db, [{
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "notification_type": notification_type
+        }]) == 1
+    
+    def create_notifications(self, db: Session, notifications: List[Dict]) -> int:
+        """
+        Insert many in-app notifications in one bulk insert and commit.
+        Each item has user_id, title, message and notification_type.
+        Cached unread counters of the recipients are bumped.
+        """
+        if not notifications:
+            return 0
+        
         try:
             from ..models.notification import Notification
-            notification = Notification(
-                user_id=user_id,
-                title=title,
-                message=message,
-                notification_type=notification_type
-            )
-            db.add(notification)
+            now = datetime.utcnow()
+            rows = [{**notification, "is_read": False, "created_at": now} for notification in notifications]
+            db.bulk_insert_mappings(Notification, rows)
             db.commit()
-            return True
         except Exception as e:
-            print(f"Error creating notification: {e}")
-            return False
+            db.rollback()
+            print(f"Error creating notifications: {e}")
+            return 0
+        
+        per_user: Dict[int, int] = {}
+        for row in rows:
+            per_user[row["user_id"]] = per_user.get(row["user_id"], 0) + 1
+        self._adjust_unread_counts(per_user)
+        return len(rows)
+    
+    def get_unread_count(self, db: Session, user_id: int) -> int:
+        """Unread notification count from Redis, falling back to (and re-seeding from) the database."""
+        key = self._unread_key(user_id)
+        if self.redis_client:
+            try:
+                cached = self.redis_client.get(key)
+                if cached is not None:
+                    return max(int(cached), 0)
+            except Exception as e:
+                print(f"Redis unavailable for unread count: {e}")
+        
+        from ..models.notification import Notification
+        count = db.query(func.count(Notification.id)).filter(
+            Notification.user_id == user_id,
+            Notification.is_read == False
+        ).scalar() or 0
+        
+        if self.redis_client:
+            try:
+                self.redis_client.set(key, count, ex=UNREAD_COUNT_TTL_SECONDS)
+            except Exception:
+                pass
+        return count
+    
+    def get_inbox(self, db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 20, unread_only: bool = False):
+        """
+        One page of a user's notifications, newest first, using keyset pagination
+        on (created_at, id). Returns (notifications, next_cursor).
+        """
+        from ..models.notification import Notification
+        query = db.query(Notification).filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.is_read == False)
+        
+        if cursor:
+            created_at, notification_id = self.parse_cursor(cursor)
+            query = query.filter(or_(
+                Notification.created_at < created_at,
+                and_(Notification.created_at == created_at, Notification.id < notification_id)
+            ))
+        
+        notifications = query.order_by(
+            Notification.created_at.desc(), Notification.id.desc()
+        ).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            last = notifications[-1]
+            next_cursor = f"{last.created_at.isoformat()}_{last.id}"
+        return notifications, next_cursor
+    
+    @staticmethod
+    def parse_cursor(cursor: str):
+        """Split an inbox cursor into (created_at, id); raises ValueError if malformed."""
+        created_at, notification_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(notification_id)
+    
+    def mark_read(self, db: Session, user_id: int, notification_ids: Optional[List[int]] = None) -> int:
+        """Mark some (or all) of a user's unread notifications read in one UPDATE."""
+        from ..models.notification import Notification
+        query = db.query(Notification).filter(
+            Notification.user_id == user_id,
+            Notification.is_read == False
+        )
+        if notification_ids is not None:
+            query = query.filter(Notification.id.in_(notification_ids))
+        
+        updated = query.update({Notification.is_read: True}, synchronize_session=False)
+        db.commit()
+        
+        if notification_ids is None:
+            self._reset_unread_count(user_id)
+        elif updated:
+            self._adjust_unread_counts({user_id: -updated})
+        return updated
+    
+    @staticmethod
+    def _unread_key(user_id: int) -> str:
+        return f"notifications:unread:{user_id}"
+    
+    def _adjust_unread_counts(self, deltas: Dict[int, int]):
+        """Apply deltas to counters that are already cached; missing ones are seeded on next read."""
+        if not self.redis_client or not deltas:
+            return
+        try:
+            keys = [self._unread_key(user_id) for user_id in deltas]
+            cached = self.redis_client.mget(keys)
+            pipeline = self.redis_client.pipeline()
+            for key, current, delta in zip(keys, cached, deltas.values()):
+                if current is None:
+                    continue
+                if int(current) + delta < 0:
+                    pipeline.delete(key)
+                else:
+                    pipeline.incrby(key, delta)
+            pipeline.execute()
+        except Exception as e:
+            print(f"Redis unavailable, unread counters not updated: {e}")
+    
+    def _reset_unread_count(self, user_id: int):
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.set(self._unread_key(user_id), 0, ex=UNREAD_COUNT_TTL_SECONDS)
+        except Exception as e:
+            print(f"Redis unavailable, unread counter not reset: {e}")
     
     async def send_payment_reminder(self, db: Session, tenant_id: int, payment_amount: float, due_date: str, tenant_email: str, tenant_phone: str = None) -> bool:
         """Send payment reminder to tenant."""
@@ -218,7 +441,7 @@ class NotificationService:
             active_leases = lease_crud.get_active_leases(db)
             property_leases = [lease for lease in active_leases if lease.unit.property_id == property_id]
             
-            sent_count = 0
+            notified_ids = []
             for lease in property_leases:
                 tenant = user_crud.get_user_by_id(db, lease.tenant_id)
                 if tenant and tenant.is_active:
@@ -229,12 +452,15 @@ class NotificationService:
                     if tenant.phone:
                         await self.send_sms(tenant.phone, message)
                     
-                    # Create in-app notification
-                    await self.create_notification(db, tenant.id, title, message, notification_type)
-                    
-                    sent_count += 1
+                    notified_ids.append(tenant.id)
+            
+            # Create in-app notifications in one bulk insert
+            self.create_notifications(db, [
+                {"user_id": user_id, "title": title, "message": message, "notification_type": notification_type}
+                for user_id in notified_ids
+            ])
             
-            return sent_count
+            return len(notified_ids)
         except Exception as e:
             print(f"Error sending bulk notifications: {e}")
             return 0
@@ -0,0 +1,316 @@
+"""
+Outbound Message Outbox
+SMS and email are written to outbound_messages in the same transaction as the
+change that triggers them, then delivered by a background worker with
+retries, per-provider rate limits and dead-lettering
+"""
+
+import logging
+import os
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.outbound_message import OutboundMessage
+from .africas_talking import africas_talking_service
+from .notification import notification_service
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+# Retry delays: base * 2^(attempts - 1), capped
+OUTBOX_BACKOFF_BASE_SECONDS = int(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "30"))
+OUTBOX_BACKOFF_MAX_SECONDS = int(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+# A claimed message whose worker died becomes due again after this long
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+
+# Sends per second and burst size per provider
+PROVIDER_RATE_LIMITS = {
+    "africas_talking": (
+        float(os.getenv("AT_RATE_PER_SECOND", "10")),
+        int(os.getenv("AT_RATE_BURST", "20"))
+    ),
+    "sendgrid": (
+        float(os.getenv("SENDGRID_RATE_PER_SECOND", "50")),
+        int(os.getenv("SENDGRID_RATE_BURST", "100"))
+    ),
+}
+
+CHANNEL_PROVIDERS = {
+    "sms": "africas_talking",
+    "email": "sendgrid",
+}
+
+def enqueue_sms(db: Session, to_phone: str, message: str, source_type: str = None, source_id: int = None) -> OutboundMessage:
+    """Add an SMS to the outbox; it is sent once the caller's transaction commits"""
+    return _enqueue(db, "sms", to_phone, message, source_type=source_type, source_id=source_id)
+
+def enqueue_email(db: Session, to_email: str, subject: str, content: str, html_content: str = None, source_type: str = None, source_id: int = None) -> OutboundMessage:
+    """Add an email to the outbox; it is sent once the caller's transaction commits"""
+    return _enqueue(
+        db, "email", to_email, content,
+        subject=subject, html_body=html_content, source_type=source_type, source_id=source_id
+    )
+
+def _enqueue(db: Session, channel: str, recipient: str, body: str, **fields) -> OutboundMessage:
+    message = OutboundMessage(
+        channel=channel,
+        provider=CHANNEL_PROVIDERS[channel],
+        recipient=recipient,
+        body=body,
+        status="pending",
+        attempts=0,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        next_attempt_at=datetime.utcnow(),
+        **fields
+    )
+    db.add(message)
+    return message
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, up to capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time_module.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event: threading.Event = None) -> bool:
+        """Block until a token is available. Returns False if stop_event is set first."""
+        while True:
+            with self._lock:
+                now = time_module.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_seconds = (1 - self._tokens) / self.rate
+
+            if stop_event:
+                if stop_event.wait(wait_seconds):
+                    return False
+            else:
+                time_module.sleep(wait_seconds)
+
+class OutboxWorker:
+    """
+    Drains outbound_messages in the background.
+
+    Due messages are claimed with a conditional UPDATE and a lease, so
+    several app instances can drain the same table. Each send waits for
+    its provider's token bucket. Failures are retried with exponential
+    backoff; after max_attempts the message is dead-lettered.
+    """
+
+    def __init__(self, max_workers: int = OUTBOX_WORKERS, batch_size: int = OUTBOX_BATCH_SIZE, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.is_running = False
+        self.buckets = {
+            provider: TokenBucket(rate, burst)
+            for provider, (rate, burst) in PROVIDER_RATE_LIMITS.items()
+        }
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> bool:
+        if self.is_running:
+            logger.warning("Outbox worker is already running")
+            return False
+
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="outbox-send")
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run_loop, name="outbox-worker", daemon=True)
+        self._thread.start()
+        logger.info(f"Outbox worker started with {self.max_workers} senders")
+        return True
+
+    def stop(self):
+        self.is_running = False
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Outbox worker stopped")
+
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            claimed = 0
+            try:
+                claimed = self.drain_once()
+            except Exception as e:
+                logger.error(f"Error draining outbox: {str(e)}")
+            # Keep going while there is a backlog, otherwise poll
+            if claimed < self.batch_size:
+                self._stop_event.wait(self.poll_seconds)
+
+    def drain_once(self) -> int:
+        """Claim one batch of due messages and send them. Returns the number claimed."""
+        message_ids = self._claim_batch()
+        if message_ids:
+            list(self._executor.map(self._deliver, message_ids))
+        return len(message_ids)
+
+    def _claim_batch(self) -> List[int]:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            due = db.query(OutboundMessage.id).filter(
+                or_(
+                    and_(OutboundMessage.status == "pending", OutboundMessage.next_attempt_at <= now),
+                    and_(OutboundMessage.status == "sending", OutboundMessage.locked_until < now)
+                )
+            ).order_by(OutboundMessage.next_attempt_at.asc()).limit(self.batch_size).all()
+
+            claimed = []
+            lease = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+            for (message_id,) in due:
+                updated = db.query(OutboundMessage).filter(
+                    OutboundMessage.id == message_id,
+                    or_(
+                        OutboundMessage.status == "pending",
+                        and_(OutboundMessage.status == "sending", OutboundMessage.locked_until < now)
+                    )
+                ).update(
+                    {OutboundMessage.status: "sending", OutboundMessage.locked_until: lease},
+                    synchronize_session=False
+                )
+                if updated:
+                    claimed.append(message_id)
+            db.commit()
+            return claimed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _deliver(self, message_id: int):
+        """Send one claimed message and record the outcome"""
+        db = SessionLocal()
+        try:
+            message = db.query(OutboundMessage).filter(OutboundMessage.id == message_id).first()
+            if not message:
+                return
+
+            bucket = self.buckets.get(message.provider)
+            if bucket and not bucket.acquire(self._stop_event):
+                # Shutting down: hand the message back untouched
+                message.status = "pending"
+                message.locked_until = None
+                db.commit()
+                return
+
+            error = None
+            try:
+                if message.channel == "sms":
+                    sent = africas_talking_service.send_sms_blocking(message.recipient, message.body)
+                else:
+                    sent = notification_service.send_email_blocking(
+                        message.recipient, message.subject, message.body, message.html_body
+                    )
+                if not sent:
+                    error = f"{message.provider} did not accept the message"
+            except Exception as e:
+                error = str(e)
+
+            message.attempts = (message.attempts or 0) + 1
+            message.locked_until = None
+            if error is None:
+                message.status = "sent"
+                message.sent_at = datetime.utcnow()
+                message.last_error = None
+            else:
+                message.last_error = error
+                if message.attempts >= (message.max_attempts or OUTBOX_MAX_ATTEMPTS):
+                    message.status = "dead"
+                    logger.warning(f"Outbound message {message.id} dead-lettered after {message.attempts} attempts: {error}")
+                else:
+                    message.status = "pending"
+                    message.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff_seconds(message.attempts))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error delivering outbound message {message_id}: {str(e)}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def backoff_seconds(attempts: int) -> int:
+        return min(OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX_SECONDS)
+
+    def get_status_counts(self, db: Session) -> Dict:
+        """Message counts per channel and status"""
+        rows = db.query(
+            OutboundMessage.channel, OutboundMessage.status, func.count(OutboundMessage.id)
+        ).group_by(OutboundMessage.channel, OutboundMessage.status).all()
+
+        counts: Dict = {}
+        for channel, message_status, count in rows:
+            counts.setdefault(channel, {})[message_status] = count
+
+        oldest_pending = db.query(func.min(OutboundMessage.next_attempt_at)).filter(
+            OutboundMessage.status == "pending"
+        ).scalar()
+
+        return {
+            "counts": counts,
+            "oldest_pending_at": oldest_pending.isoformat() if oldest_pending else None,
+            "worker_running": self.is_running
+        }
+
+    def get_messages(
+        self,
+        db: Session,
+        status_filter: Optional[str] = None,
+        channel: Optional[str] = None,
+        source_type: Optional[str] = None,
+        source_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[OutboundMessage]:
+        query = db.query(OutboundMessage)
+        if status_filter:
+            query = query.filter(OutboundMessage.status == status_filter)
+        if channel:
+            query = query.filter(OutboundMessage.channel == channel)
+        if source_type:
+            query = query.filter(OutboundMessage.source_type == source_type)
+        if source_id is not None:
+            query = query.filter(OutboundMessage.source_id == source_id)
+        return query.order_by(OutboundMessage.id.desc()).offset(skip).limit(limit).all()
+
+    def retry(self, db: Session, message_id: int) -> Optional[OutboundMessage]:
+        """Requeue a dead (or pending) message for immediate delivery with a fresh attempt budget"""
+        message = db.query(OutboundMessage).filter(OutboundMessage.id == message_id).first()
+        if not message:
+            return None
+
+        message.status = "pending"
+        message.attempts = 0
+        message.next_attempt_at = datetime.utcnow()
+        message.locked_until = None
+        db.commit()
+        db.refresh(message)
+        return message
+
+# Global instance
+outbox_worker = OutboxWorker()
@@ -0,0 +1,151 @@
+"""
+Mobile Payment Form Cache
+Loads everything the public mobile payment form shows with one joined query
+and caches the rendered page per QR payment and data version
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+
+from ..models.enums import PaymentStatus
+from ..models.payment import Payment
+from ..models.property import Property
+from ..models.qr_payment import QRCodePayment
+from ..models.unit import Unit
+
+PAYMENT_FORM_CACHE_SIZE = int(os.getenv("PAYMENT_FORM_CACHE_SIZE", "1024"))
+
+DUE_STATUSES = [PaymentStatus.PENDING, PaymentStatus.OVERDUE]
+
+class PaymentFormCache:
+    """
+    load() returns the form's data: the QR payment, its unit and property,
+    the property's units for the unit picker and the earliest due payment
+    of the unit as the suggested amount. Its version is a hash of all of
+    it, so any change to those rows (including the payment numbers) yields
+    a new cache key; invalidate() and invalidate_property() drop stale
+    pages right away when the QR payment or property is edited.
+    """
+
+    def __init__(self, max_items: int = PAYMENT_FORM_CACHE_SIZE):
+        self.max_items = max_items
+        self._pages: "OrderedDict[Tuple[int, str], Tuple[int, str]]" = OrderedDict()  # -> (property_id, html)
+        self._lock = threading.Lock()
+
+    def load(self, db: Session, qr_payment_id: int) -> Optional[SimpleNamespace]:
+        """Form data from one query (one row per unit of the property), or None if not found"""
+        sibling = aliased(Unit)
+        due_amount = select(Payment.amount).where(
+            Payment.unit_id == QRCodePayment.unit_id,
+            Payment.status.in_(DUE_STATUSES)
+        ).order_by(Payment.due_date.asc()).limit(1).correlate(QRCodePayment).scalar_subquery()
+
+        rows = db.query(
+            QRCodePayment.id,
+            QRCodePayment.amount,
+            QRCodePayment.mobile_money_provider,
+            QRCodePayment.status,
+            QRCodePayment.expires_at,
+            QRCodePayment.updated_at,
+            Unit.id.label("unit_id"),
+            Unit.unit_number,
+            Property.id.label("property_id"),
+            Property.name.label("property_name"),
+            Property.mtn_mobile_money_number,
+            Property.airtel_money_number,
+            Property.updated_at.label("property_updated_at"),
+            sibling.id.label("sibling_id"),
+            sibling.unit_number.label("sibling_unit_number"),
+            due_amount.label("due_amount")
+        ).join(
+            Unit, Unit.id == QRCodePayment.unit_id
+        ).join(
+            Property, Property.id == Unit.property_id
+        ).outerjoin(
+            sibling, sibling.property_id == Property.id
+        ).filter(
+            QRCodePayment.id == qr_payment_id
+        ).order_by(sibling.id).all()
+
+        if not rows:
+            return None
+
+        first = rows[0]
+        provider = _enum_value(first.mobile_money_provider)
+        if provider == "mtn_mobile_money":
+            payee_number = first.mtn_mobile_money_number
+        elif provider == "airtel_money":
+            payee_number = first.airtel_money_number
+        else:
+            payee_number = None
+
+        units = [
+            SimpleNamespace(id=row.sibling_id, unit_number=row.sibling_unit_number)
+            for row in rows if row.sibling_id is not None
+        ]
+        version_source = "|".join(str(value) for value in (
+            first.amount, provider, first.updated_at, first.unit_id, first.unit_number,
+            first.property_name, payee_number, first.property_updated_at, first.due_amount,
+            [(unit.id, unit.unit_number) for unit in units]
+        ))
+
+        return SimpleNamespace(
+            qr_payment=SimpleNamespace(
+                id=first.id,
+                amount=first.amount,
+                mobile_money_provider=provider,
+                status=_enum_value(first.status),
+                expires_at=first.expires_at
+            ),
+            unit=SimpleNamespace(id=first.unit_id, unit_number=first.unit_number),
+            property=SimpleNamespace(id=first.property_id, name=first.property_name),
+            units=units,
+            payee_number=payee_number,
+            suggested_amount=float(first.due_amount if first.due_amount is not None else first.amount),
+            version=hashlib.sha1(version_source.encode("utf-8")).hexdigest()[:16]
+        )
+
+    def get(self, qr_payment_id: int, version: str) -> Optional[str]:
+        key = (qr_payment_id, version)
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is None:
+                return None
+            self._pages.move_to_end(key)
+            return cached[1]
+
+    def put(self, qr_payment_id: int, version: str, property_id: int, html: str):
+        with self._lock:
+            # Only the current version of a form is worth keeping
+            for key in [key for key in self._pages if key[0] == qr_payment_id]:
+                del self._pages[key]
+            self._pages[(qr_payment_id, version)] = (property_id, html)
+            while len(self._pages) > self.max_items:
+                self._pages.popitem(last=False)
+
+    def invalidate(self, qr_payment_id: int):
+        """Drop cached pages of one QR payment"""
+        with self._lock:
+            for key in [key for key in self._pages if key[0] == qr_payment_id]:
+                del self._pages[key]
+
+    def invalidate_property(self, property_id: int):
+        """Drop cached pages of every QR payment of a property (e.g. payment numbers changed)"""
+        with self._lock:
+            for key in [key for key, (cached_property_id, _) in self._pages.items() if cached_property_id == property_id]:
+                del self._pages[key]
+
+def _enum_value(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.value if hasattr(value, "value") else str(value)
+
+# Global instance
+payment_form_cache = PaymentFormCache()
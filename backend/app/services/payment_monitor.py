@@ -3,72 +3,228 @@ Automated Payment Status Monitoring Service
 Handles automatic categorization of tenants based on payment status and due dates
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, case, func, select
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, date, timedelta
 from typing import List, Dict, Optional
 import logging
 
-from ..database import SessionLocal
+from ..database import get_session
 from ..models.tenant import Tenant
+from ..models.unit import Unit
+from ..models.property import Property
+from ..models.payment_monitor_run import PaymentMonitorRun
 from ..models.enums import UnitStatus
-from ..crud.tenant import tenant_crud
-from ..crud.unit import unit_crud
+from .recipient_groups import recipient_group_service
+from .sharded_executor import sharded_executor
 
 logger = logging.getLogger(__name__)
 
+# Payment status categories shown on the monitoring dashboard
+TENANT_CATEGORIES = ["overdue", "due", "pending", "moved_out", "paid"]
+
 class PaymentMonitorService:
     """Service to automatically monitor and update tenant payment statuses"""
     
-    def __init__(self):
-        self.db = SessionLocal()
-    
-    def __del__(self):
-        if hasattr(self, 'db'):
-            self.db.close()
-    
-    def run_automated_payment_monitoring(self) -> Dict:
+    def run_automated_payment_monitoring(self, db: Optional[Session] = None, full: bool = False) -> Dict:
         """
         Main function to run automated payment monitoring
+        Recomputes rent_payment_status with a few set-based UPDATE statements,
+        sharded by property so shards run in parallel, each in its own
+        transaction.
+        
+        Incremental runs only evaluate tenants whose next_payment_due crossed
+        the due (0 day) or overdue (7 day) threshold since the watermark of
+        the last successful run. A full run evaluates every active tenant and
+        is used when no watermark exists yet or when full=True.
         Returns summary of all status updates made
         """
-        try:
-            logger.info("Starting automated payment monitoring...")
-            
-            summary = {
-                "overdue_updated": 0,
-                "due_updated": 0,
-                "pending_updated": 0,
-                "moved_out_updated": 0,
-                "total_processed": 0,
-                "errors": []
-            }
+        with get_session(db) as session:
+            started = datetime.utcnow()
+            today = date.today()
             
-            # Get all active tenants
-            active_tenants = tenant_crud.get_active_tenants(self.db)
-            summary["total_processed"] = len(active_tenants)
+            last_run = None if full else self.get_last_successful_run(session)
+            watermark = last_run.watermark_to if last_run else None
+            run = PaymentMonitorRun(
+                mode="incremental" if watermark else "full",
+                watermark_from=watermark,
+                watermark_to=today,
+                started_at=started
+            )
             
-            for tenant in active_tenants:
-                try:
-                    # Update tenant status based on current date and payment info
-                    status_update = self._determine_tenant_payment_status(tenant)
-                    
-                    if status_update:
-                        self._update_tenant_status(tenant, status_update)
-                        summary[f"{status_update}_updated"] += 1
-                        
-                        logger.info(f"Updated tenant {tenant.id} ({tenant.first_name} {tenant.last_name}) to {status_update}")
+            try:
+                logger.info(f"Starting automated payment monitoring ({run.mode}, watermark={watermark})...")
                 
-                except Exception as e:
-                    error_msg = f"Error processing tenant {tenant.id}: {str(e)}"
-                    logger.error(error_msg)
-                    summary["errors"].append(error_msg)
-            
-            logger.info(f"Payment monitoring completed. Summary: {summary}")
-            return summary
-            
-        except Exception as e:
-            logger.error(f"Error in automated payment monitoring: {str(e)}")
-            return {"error": str(e)}
+                summary = {
+                    "mode": run.mode,
+                    "watermark_from": watermark.isoformat() if watermark else None,
+                    "watermark_to": today.isoformat(),
+                    "overdue_updated": 0,
+                    "due_updated": 0,
+                    "pending_updated": 0,
+                    "moved_out_updated": 0,
+                    "total_processed": 0,
+                    "status_changed": 0,
+                    "errors": []
+                }
+                
+                shard_result = sharded_executor.run(
+                    lambda shard_db, property_ids: self._monitor_shard(shard_db, property_ids, today, watermark),
+                    job_name="payment monitoring"
+                )
+                for key in ("overdue_updated", "due_updated", "pending_updated", "moved_out_updated", "status_changed"):
+                    summary[key] = shard_result.get(key, 0)
+                summary["errors"] = shard_result["errors"]
+                summary["shards"] = shard_result["shards"]
+                
+                summary["total_processed"] = (
+                    summary["overdue_updated"] + summary["due_updated"] +
+                    summary["pending_updated"] + summary["moved_out_updated"]
+                )
+                
+                # A run with failed shards does not advance the watermark, so the
+                # next run re-evaluates the same window for the failed properties
+                self._finish_run(run, summary)
+                run.status = "failed" if shard_result["failed_shards"] else "completed"
+                run.error = "; ".join(summary["errors"]) or None
+                session.add(run)
+                session.commit()
+                if summary["status_changed"]:
+                    recipient_group_service.invalidate()
+                
+                summary["run_id"] = run.id
+                logger.info(f"Payment monitoring completed. Summary: {summary}")
+                return summary
+                
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error in automated payment monitoring: {str(e)}")
+                try:
+                    run.status = "failed"
+                    run.error = str(e)
+                    self._finish_run(run, {})
+                    session.add(run)
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                return {"error": str(e)}
+    
+    def _monitor_shard(self, db: Session, property_ids: List[int], today: date, watermark: Optional[date]) -> Dict:
+        """Recompute payment statuses for the tenants of a shard of properties"""
+        result = {
+            "overdue_updated": 0,
+            "due_updated": 0,
+            "pending_updated": 0,
+            "moved_out_updated": 0,
+            "status_changed": 0
+        }
+        in_shard = Tenant.property_id.in_(property_ids)
+        
+        moved_out = and_(
+            in_shard,
+            Tenant.is_active == True,
+            Tenant.move_out_date != None,
+            Tenant.move_out_date <= today
+        )
+        
+        # Release units of tenants who have moved out
+        moved_out_unit_ids = select(Tenant.unit_id).where(moved_out).scalar_subquery()
+        db.query(Unit).filter(Unit.id.in_(moved_out_unit_ids)).update(
+            {Unit.status: UnitStatus.AVAILABLE, Unit.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        
+        # Deactivate moved out tenants
+        result["moved_out_updated"] = db.query(Tenant).filter(moved_out).update(
+            {
+                Tenant.rent_payment_status: "moved_out",
+                Tenant.is_active: False,
+                Tenant.updated_at: datetime.utcnow()
+            },
+            synchronize_session=False
+        )
+        
+        # Active tenants that could change status in this run
+        candidates = [in_shard, Tenant.is_active == True]
+        if watermark:
+            candidates.append(self._transition_window(watermark, today))
+        
+        # Count candidate tenants per derived status
+        status_case = self._status_case(today)
+        counts = db.query(status_case, func.count(Tenant.id)).filter(
+            *candidates
+        ).group_by(status_case).all()
+        for status, count in counts:
+            result[f"{status}_updated"] = count
+        
+        # Write the derived status only where it differs from the stored one
+        result["status_changed"] = db.query(Tenant).filter(
+            *candidates,
+            or_(Tenant.rent_payment_status == None, Tenant.rent_payment_status != status_case)
+        ).update(
+            {Tenant.rent_payment_status: status_case, Tenant.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        
+        return result
+    
+    def _finish_run(self, run: PaymentMonitorRun, summary: Dict):
+        """Copy summary stats and timing onto a run record"""
+        for field in ("overdue_updated", "due_updated", "pending_updated",
+                      "moved_out_updated", "status_changed", "total_processed"):
+            setattr(run, field, summary.get(field, 0))
+        run.finished_at = datetime.utcnow()
+        run.duration_ms = int((run.finished_at - run.started_at).total_seconds() * 1000)
+    
+    def _transition_window(self, watermark: date, today: date):
+        """
+        Filter for tenants whose due date crossed a status threshold after
+        the watermark:
+        - pending -> due: next_payment_due in (watermark, today]
+        - due -> overdue: next_payment_due in [watermark - 7, today - 7)
+        """
+        return or_(
+            and_(Tenant.next_payment_due > watermark, Tenant.next_payment_due <= today),
+            and_(
+                Tenant.next_payment_due >= watermark - timedelta(days=7),
+                Tenant.next_payment_due < today - timedelta(days=7)
+            )
+        )
+    
+    def get_last_successful_run(self, db: Session) -> Optional[PaymentMonitorRun]:
+        """Get the most recent completed monitoring run (the current watermark)"""
+        return db.query(PaymentMonitorRun).filter(
+            PaymentMonitorRun.status == "completed"
+        ).order_by(PaymentMonitorRun.watermark_to.desc(), PaymentMonitorRun.id.desc()).first()
+    
+    def get_recent_runs(self, db: Session, limit: int = 50) -> List[PaymentMonitorRun]:
+        """Get recent monitoring runs with their stats"""
+        return db.query(PaymentMonitorRun).order_by(
+            PaymentMonitorRun.started_at.desc()
+        ).limit(limit).all()
+    
+    def _status_whens(self, today: date) -> List:
+        """CASE branches deriving due/overdue/pending from next_payment_due"""
+        return [
+            (Tenant.next_payment_due == None, "pending"),
+            (Tenant.next_payment_due < today - timedelta(days=7), "overdue"),
+            (Tenant.next_payment_due <= today, "due")
+        ]
+    
+    def _status_case(self, today: date):
+        """
+        SQL equivalent of _determine_tenant_payment_status for active tenants
+        whose move out date has not passed
+        """
+        return case(*self._status_whens(today), else_="pending")
+    
+    def _derived_status_case(self, today: date):
+        """SQL equivalent of _determine_tenant_payment_status for any active tenant"""
+        return case(
+            (and_(Tenant.move_out_date != None, Tenant.move_out_date <= today), "moved_out"),
+            *self._status_whens(today),
+            else_="pending"
+        )
     
     def _determine_tenant_payment_status(self, tenant: Tenant) -> Optional[str]:
         """
@@ -105,91 +261,132 @@ class PaymentMonitorService:
             # Payment not yet due
             return "pending"
     
-    def _update_tenant_status(self, tenant: Tenant, new_status: str):
-        """Update tenant's payment status and related data"""
-        from ..schemas.tenant import TenantUpdate
-        
-        update_data = TenantUpdate(rent_payment_status=new_status)
-        
-        # If marking as moved out, also update unit status
-        if new_status == "moved_out":
-            update_data.move_out_date = date.today()
-            update_data.is_active = False
-            
-            # Update unit status to available
-            from ..schemas.unit import UnitUpdate
-            unit_update = UnitUpdate(status=UnitStatus.AVAILABLE)
-            unit_crud.update_unit(self.db, tenant.unit_id, unit_update)
-        
-        # Update tenant
-        tenant_crud.update_tenant(self.db, tenant.id, update_data)
+    def _scoped_tenants(self, query, owner_id: Optional[int] = None, property_ids: Optional[List[int]] = None):
+        """Limit a tenant query to active tenants of an owner and/or a set of properties"""
+        query = query.filter(Tenant.is_active == True)
+        if owner_id is not None:
+            query = query.join(Property, Tenant.property_id == Property.id).filter(Property.owner_id == owner_id)
+        if property_ids is not None:
+            query = query.filter(Tenant.property_id.in_(property_ids))
+        return query
     
-    def get_tenant_categories(self) -> Dict[str, List[Dict]]:
+    def get_tenant_categories(
+        self,
+        db: Optional[Session] = None,
+        property_ids: Optional[List[int]] = None,
+        owner_id: Optional[int] = None,
+        status: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> Dict:
         """
-        Get all tenants categorized by their payment status
-        Returns organized data for dashboard display
+        Get tenants categorized by their payment status, one page per category
+        Optionally limited to an owner, a set of properties or a single category
+        Returns {"categories": {status: [tenant, ...]}, "totals": {status: count}}
         """
         try:
-            active_tenants = tenant_crud.get_active_tenants(self.db)
-            
-            categories = {
-                "overdue": [],
-                "due": [],
-                "pending": [],
-                "moved_out": [],
-                "paid": []
-            }
-            
-            today = date.today()
-            
-            for tenant in active_tenants:
-                tenant_info = {
-                    "id": tenant.id,
-                    "name": f"{tenant.first_name} {tenant.last_name}",
-                    "email": tenant.email,
-                    "phone": tenant.phone,
-                    "unit_number": tenant.unit.unit_number if tenant.unit else "N/A",
-                    "property_name": tenant.property.name if tenant.property else "N/A",
-                    "monthly_rent": float(tenant.monthly_rent),
-                    "last_payment_date": tenant.last_payment_date.isoformat() if tenant.last_payment_date else None,
-                    "next_payment_due": tenant.next_payment_due.isoformat() if tenant.next_payment_due else None,
-                    "current_status": tenant.rent_payment_status,
-                    "days_overdue": None
-                }
+            with get_session(db) as session:
+                today = date.today()
+                status_case = self._derived_status_case(today)
+                statuses = [status] if status else TENANT_CATEGORIES
                 
-                # Calculate days overdue if applicable
-                if tenant.next_payment_due:
-                    days_overdue = (today - tenant.next_payment_due).days
-                    tenant_info["days_overdue"] = days_overdue if days_overdue > 0 else 0
+                totals = {category: 0 for category in statuses}
+                rows = self._scoped_tenants(
+                    session.query(status_case, func.count(Tenant.id)), owner_id, property_ids
+                ).group_by(status_case).all()
+                for category, count in rows:
+                    if category in totals:
+                        totals[category] = count
                 
-                # Categorize tenant
-                status = self._determine_tenant_payment_status(tenant)
-                categories[status].append(tenant_info)
-            
-            return categories
+                categories = {}
+                for category in statuses:
+                    if not totals[category]:
+                        categories[category] = []
+                        continue
+                    
+                    tenants = self._scoped_tenants(
+                        session.query(Tenant).options(
+                            joinedload(Tenant.property),
+                            joinedload(Tenant.unit)
+                        ),
+                        owner_id,
+                        property_ids
+                    ).filter(
+                        status_case == category
+                    ).order_by(Tenant.next_payment_due.asc(), Tenant.id.asc()).offset(skip).limit(limit).all()
+                    
+                    categories[category] = [self._tenant_info(tenant, today) for tenant in tenants]
+                
+                return {"categories": categories, "totals": totals, "skip": skip, "limit": limit}
             
         except Exception as e:
             logger.error(f"Error categorizing tenants: {str(e)}")
             return {"error": str(e)}
     
-    def get_payment_summary(self) -> Dict:
-        """Get summary statistics for payment monitoring"""
+    def _tenant_info(self, tenant: Tenant, today: date) -> Dict:
+        """Dashboard representation of a tenant with eager-loaded unit and property"""
+        tenant_info = {
+            "id": tenant.id,
+            "name": f"{tenant.first_name} {tenant.last_name}",
+            "email": tenant.email,
+            "phone": tenant.phone,
+            "unit_number": tenant.unit.unit_number if tenant.unit else "N/A",
+            "property_id": tenant.property_id,
+            "property_name": tenant.property.name if tenant.property else "N/A",
+            "monthly_rent": float(tenant.monthly_rent),
+            "last_payment_date": tenant.last_payment_date.isoformat() if tenant.last_payment_date else None,
+            "next_payment_due": tenant.next_payment_due.isoformat() if tenant.next_payment_due else None,
+            "current_status": tenant.rent_payment_status,
+            "days_overdue": None
+        }
+        
+        # Calculate days overdue if applicable
+        if tenant.next_payment_due:
+            days_overdue = (today - tenant.next_payment_due).days
+            tenant_info["days_overdue"] = days_overdue if days_overdue > 0 else 0
+        
+        return tenant_info
+    
+    def get_payment_summary(
+        self,
+        db: Optional[Session] = None,
+        owner_id: Optional[int] = None,
+        property_ids: Optional[List[int]] = None
+    ) -> Dict:
+        """
+        Get summary statistics for payment monitoring
+        Counts and rent totals per derived status come from one grouped query
+        """
         try:
-            categories = self.get_tenant_categories()
+            with get_session(db) as session:
+                status_case = self._derived_status_case(date.today())
+                rows = self._scoped_tenants(
+                    session.query(
+                        status_case,
+                        func.count(Tenant.id),
+                        func.coalesce(func.sum(Tenant.monthly_rent), 0)
+                    ),
+                    owner_id,
+                    property_ids
+                ).group_by(status_case).all()
             
-            summary = {
-                "total_tenants": sum(len(tenants) for tenants in categories.values()),
-                "overdue_count": len(categories.get("overdue", [])),
-                "due_count": len(categories.get("due", [])),
-                "pending_count": len(categories.get("pending", [])),
-                "paid_count": len(categories.get("paid", [])),
-                "moved_out_count": len(categories.get("moved_out", [])),
-                "total_overdue_amount": sum(t["monthly_rent"] for t in categories.get("overdue", [])),
-                "total_due_amount": sum(t["monthly_rent"] for t in categories.get("due", [])),
-                "total_pending_amount": sum(t["monthly_rent"] for t in categories.get("pending", []))
-            }
+            counts = {category: 0 for category in TENANT_CATEGORIES}
+            amounts = {category: 0.0 for category in TENANT_CATEGORIES}
+            for category, count, rent_total in rows:
+                counts[category] = count
+                amounts[category] = float(rent_total)
             
-            return summary
+            return {
+                "total_tenants": sum(counts.values()),
+                "overdue_count": counts["overdue"],
+                "due_count": counts["due"],
+                "pending_count": counts["pending"],
+                "paid_count": counts["paid"],
+                "moved_out_count": counts["moved_out"],
+                "total_overdue_amount": amounts["overdue"],
+                "total_due_amount": amounts["due"],
+                "total_pending_amount": amounts["pending"]
+            }
             
         except Exception as e:
             logger.error(f"Error getting payment summary: {str(e)}")
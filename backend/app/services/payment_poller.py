@@ -0,0 +1,166 @@
+"""
+Pending Payment Poller
+Asks the mobile money providers for the status of payments still PENDING
+after their callback should have arrived, and applies the answers through
+the same path as the webhook worker
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..models.enums import PaymentStatus
+from ..models.mobile_payment import MobilePayment
+from .mobile_money_service import mobile_money_service
+from .webhook_events import apply_mobile_payment_update
+
+logger = logging.getLogger(__name__)
+
+# Give the callback this long before polling
+POLL_MIN_AGE_SECONDS = int(os.getenv("PAYMENT_POLL_MIN_AGE_SECONDS", "60"))
+# Stop polling payments older than this; they stay PENDING for manual review
+POLL_MAX_AGE_HOURS = int(os.getenv("PAYMENT_POLL_MAX_AGE_HOURS", "72"))
+POLL_BATCH_SIZE = int(os.getenv("PAYMENT_POLL_BATCH_SIZE", "100"))
+POLL_MAX_BATCHES = int(os.getenv("PAYMENT_POLL_MAX_BATCHES", "10"))
+# Provider status calls in flight at once
+POLL_CONCURRENCY = int(os.getenv("PAYMENT_POLL_CONCURRENCY", "8"))
+# A claimed payment whose run died is polled again after this long
+POLL_CLAIM_SECONDS = int(os.getenv("PAYMENT_POLL_CLAIM_SECONDS", "300"))
+
+# (payment age up to, seconds between checks): young payments are checked
+# often, old ones rarely
+POLL_INTERVALS = [
+    (timedelta(minutes=10), 60),
+    (timedelta(hours=1), 300),
+    (timedelta(hours=6), 900),
+    (timedelta(hours=24), 3600),
+]
+POLL_INTERVAL_MAX_SECONDS = 6 * 3600
+
+def check_interval(age: timedelta) -> int:
+    """Seconds until the next status check for a payment of this age"""
+    for max_age, seconds in POLL_INTERVALS:
+        if age <= max_age:
+            return seconds
+    return POLL_INTERVAL_MAX_SECONDS
+
+class PendingPaymentPoller:
+    """
+    Polls provider status for pending mobile payments.
+
+    Each run claims due payments in batches by pushing next_status_check_at
+    forward (a conditional UPDATE, so instances never poll the same row),
+    checks them concurrently up to POLL_CONCURRENCY, applies settled
+    statuses and schedules the next check by payment age.
+    """
+
+    def __init__(self, batch_size: int = POLL_BATCH_SIZE, concurrency: int = POLL_CONCURRENCY):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def poll(self, db: Session) -> Dict:
+        """Poll all due pending payments. Returns counts for the job run."""
+        summary = {"checked": 0, "paid": 0, "failed": 0, "pending": 0, "already_final": 0, "errors": 0, "skipped": 0}
+
+        for _ in range(POLL_MAX_BATCHES):
+            payments = self._claim_batch(db)
+            if not payments:
+                break
+
+            results = asyncio.run(self._check_statuses(payments))
+            self._apply_results(db, payments, results, summary)
+
+            if len(payments) < self.batch_size:
+                break
+
+        summary["rows_processed"] = summary["checked"]
+        return summary
+
+    def _claim_batch(self, db: Session) -> List[MobilePayment]:
+        now = datetime.utcnow()
+        claim_until = now + timedelta(seconds=POLL_CLAIM_SECONDS)
+
+        due_ids = [row[0] for row in db.query(MobilePayment.id).filter(
+            MobilePayment.status == PaymentStatus.PENDING,
+            MobilePayment.initiated_at <= now - timedelta(seconds=POLL_MIN_AGE_SECONDS),
+            MobilePayment.initiated_at >= now - timedelta(hours=POLL_MAX_AGE_HOURS),
+            or_(MobilePayment.next_status_check_at == None, MobilePayment.next_status_check_at <= now)
+        ).order_by(MobilePayment.initiated_at.desc()).limit(self.batch_size).all()]
+
+        if not due_ids:
+            return []
+
+        db.query(MobilePayment).filter(
+            MobilePayment.id.in_(due_ids),
+            MobilePayment.status == PaymentStatus.PENDING,
+            or_(MobilePayment.next_status_check_at == None, MobilePayment.next_status_check_at <= now)
+        ).update(
+            {MobilePayment.next_status_check_at: claim_until},
+            synchronize_session=False
+        )
+        db.commit()
+
+        return db.query(MobilePayment).filter(
+            MobilePayment.id.in_(due_ids),
+            MobilePayment.next_status_check_at == claim_until
+        ).all()
+
+    async def _check_statuses(self, payments: List[MobilePayment]) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(transaction_id: str, provider: str) -> Dict:
+            async with semaphore:
+                try:
+                    return await mobile_money_service.check_payment_status(transaction_id, provider)
+                except Exception as e:
+                    return {"error": str(e)}
+
+        return await asyncio.gather(*[
+            check(
+                payment.transaction_id or payment.external_id,
+                payment.provider.value if hasattr(payment.provider, "value") else str(payment.provider)
+            )
+            for payment in payments
+        ])
+
+    def _apply_results(self, db: Session, payments: List[MobilePayment], results: List[Dict], summary: Dict):
+        now = datetime.utcnow()
+        for payment, result in zip(payments, results):
+            summary["checked"] += 1
+
+            if result.get("simulation"):
+                # No provider configured: a simulated answer must not settle real payments
+                summary["skipped"] += 1
+            elif result.get("error"):
+                summary["errors"] += 1
+                logger.warning(f"Status check failed for mobile payment {payment.id}: {result['error']}")
+            else:
+                try:
+                    with db.begin_nested():
+                        # Re-read under a row lock: a callback may have settled it meanwhile
+                        db.refresh(payment, with_for_update=True)
+                        outcome = apply_mobile_payment_update(
+                            db,
+                            payment,
+                            result.get("status"),
+                            failure_reason=result.get("message")
+                        )
+                    summary[outcome] += 1
+                except Exception as e:
+                    summary["errors"] += 1
+                    logger.error(f"Error applying status for mobile payment {payment.id}: {str(e)}")
+
+            payment.status_checked_at = now
+            payment.next_status_check_at = now + timedelta(
+                seconds=check_interval(now - (payment.initiated_at or now))
+            )
+
+        db.commit()
+
+# Global instance
+pending_payment_poller = PendingPaymentPoller()
@@ -3,203 +3,384 @@ Payment Reconciliation Service
 Automatically matches mobile payments to rent records and detects discrepancies
 """
 
-from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Dict, Optional, Tuple
+from collections import defaultdict
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 import logging
+import re
 
-from ..database import SessionLocal
+from ..database import get_session
 from ..models.mobile_payment import MobilePayment
 from ..models.payment import Payment
 from ..models.tenant import Tenant
+from ..models.unit import Unit
 from ..models.enums import PaymentStatus
 from ..crud.payment import payment_crud
-from ..crud.tenant import tenant_crud
+from .sharded_executor import sharded_executor
+from .tenant_ledger import tenant_ledger_service
 
 logger = logging.getLogger(__name__)
 
+# Confidence added per signal a payment shares with a tenant
+MATCH_WEIGHTS = {
+    "phone": 0.5,
+    "unit": 0.3,
+    "amount_exact": 0.2,
+    "amount_close": 0.1,
+}
+# Matches below this (phone plus an amount within 10%), or without an amount
+# signal, are reported for review, not applied
+AUTO_MATCH_MIN_CONFIDENCE = 0.6
+AUTO_MATCH_WRITE_BATCH_SIZE = 1000
+
 class PaymentReconciliationService:
     """Service to reconcile mobile payments with expected rent payments"""
     
-    def __init__(self):
-        self.db = SessionLocal()
-    
-    def __del__(self):
-        if hasattr(self, 'db'):
-            self.db.close()
-    
     def reconcile_payments(self, db: Optional[Session] = None, property_id: Optional[int] = None, month: Optional[int] = None, year: Optional[int] = None) -> Dict:
         """
         Reconcile all payments for a period
+        Properties are reconciled in parallel shards unless property_id is given
         Returns summary of matched, unmatched, and discrepancies
         """
         try:
-            # Use provided db or instance db
-            session = db if db else self.db
-            
             if not month:
                 month = date.today().month
             if not year:
                 year = date.today().year
             
-            month_date = date(year, month, 1)
-            month_start = month_date
-            if month_date.month == 12:
-                month_end = date(month_date.year + 1, 1, 1) - timedelta(days=1)
+            month_start = date(year, month, 1)
+            if month == 12:
+                next_month_start = date(year + 1, 1, 1)
             else:
-                month_end = date(month_date.year, month_date.month + 1, 1) - timedelta(days=1)
+                next_month_start = date(year, month + 1, 1)
+            month_end = next_month_start - timedelta(days=1)
             
-            # Get all mobile payments for the period
-            mobile_payments = session.query(MobilePayment).filter(
-                MobilePayment.initiated_at >= month_start,
-                MobilePayment.initiated_at <= month_end,
-                MobilePayment.status == PaymentStatus.PAID
-            ).all()
+            def reconcile_shard(shard_db: Session, property_ids: List[int]) -> Dict:
+                return self._reconcile_properties(shard_db, property_ids, month_start, next_month_start)
             
-            # Get all expected rent payments (from tenants)
-            tenants = tenant_crud.get_active_tenants(session)
             if property_id:
-                tenants = [t for t in tenants if t.property_id == property_id]
+                with get_session(db) as session:
+                    result = reconcile_shard(session, [property_id])
+                result["errors"] = []
+            else:
+                result = sharded_executor.run(reconcile_shard, job_name="payment reconciliation")
+                result.pop("shards", None)
+                result.pop("failed_shards", None)
             
             summary = {
                 "period": f"{month_start} to {month_end}",
-                "total_mobile_payments": len(mobile_payments),
-                "total_expected_payments": len(tenants),
+                "total_mobile_payments": 0,
+                "total_expected_payments": 0,
                 "matched": 0,
                 "unmatched_mobile": 0,
                 "unmatched_expected": 0,
                 "amount_discrepancies": 0,
                 "total_received": 0,
                 "total_expected": 0,
-                "discrepancy_details": []
+                "discrepancy_details": [],
+                "unpaid_tenants": [],
+                "unmatched_payments": []
             }
+            sharded_executor.merge_results(summary, result)
             
-            # Calculate expected amount
-            summary["total_expected"] = sum(float(t.monthly_rent) for t in tenants)
-            summary["total_received"] = sum(float(mp.amount) for mp in mobile_payments)
-            
-            # Match mobile payments to tenants
-            matched_tenant_ids = set()
-            unmatched_mobile = []
-            
-            for mp in mobile_payments:
-                if mp.tenant_id:
-                    matched_tenant_ids.add(mp.tenant_id)
-                    summary["matched"] += 1
-                    
-                    # Check amount match
-                    tenant = tenant_crud.get_tenant_by_id(session, mp.tenant_id)
-                    if tenant:
-                        expected_amount = float(tenant.monthly_rent) * mp.months_advance
-                        paid_amount = float(mp.amount)
-                        
-                        if abs(expected_amount - paid_amount) > 1:  # Allow 1 unit variance
-                            summary["amount_discrepancies"] += 1
-                            summary["discrepancy_details"].append({
-                                "tenant_id": mp.tenant_id,
-                                "tenant_name": f"{tenant.first_name} {tenant.last_name}",
-                                "expected": expected_amount,
-                                "paid": paid_amount,
-                                "difference": paid_amount - expected_amount,
-                                "mobile_payment_id": mp.id
-                            })
-                else:
-                    unmatched_mobile.append(mp)
-                    summary["unmatched_mobile"] += 1
-            
-            # Find tenants who haven't paid
-            unmatched_tenants = [t for t in tenants if t.id not in matched_tenant_ids]
-            summary["unmatched_expected"] = len(unmatched_tenants)
-            
-            # Add unmatched tenant details
-            summary["unpaid_tenants"] = [
-                {
-                    "tenant_id": t.id,
-                    "tenant_name": f"{t.first_name} {t.last_name}",
-                    "unit_number": t.unit.unit_number if t.unit else "N/A",
-                    "expected_amount": float(t.monthly_rent),
-                    "payment_status": t.rent_payment_status,
-                    "due_date": str(t.next_payment_due) if t.next_payment_due else "N/A"
-                }
-                for t in unmatched_tenants
-            ]
-            
-            # Add unmatched mobile payment details
-            summary["unmatched_payments"] = [
-                {
-                    "mobile_payment_id": mp.id,
-                    "amount": float(mp.amount),
-                    "phone_number": mp.payer_phone_number,
-                    "transaction_id": mp.transaction_id,
-                    "date": mp.initiated_at.isoformat()
-                }
-                for mp in unmatched_mobile
-            ]
-            
-            logger.info(f"Reconciliation completed: {summary}")
+            logger.info(
+                f"Reconciliation completed for {summary['period']}: "
+                f"{summary['matched']} matched, {summary['unmatched_mobile']} unmatched payments, "
+                f"{summary['unmatched_expected']} unpaid tenants"
+            )
             return summary
             
         except Exception as e:
             logger.error(f"Error in payment reconciliation: {str(e)}")
             return {"error": str(e)}
     
-    def auto_match_payments(self, property_id: Optional[int] = None) -> Dict:
+    def _reconcile_properties(self, db: Session, property_ids: List[int], month_start: date, next_month_start: date) -> Dict:
+        """Reconcile the mobile payments and active tenants of a set of properties"""
+        # Get all mobile payments for the period on units of these properties
+        mobile_payments = db.query(MobilePayment).join(
+            Unit, MobilePayment.unit_id == Unit.id
+        ).filter(
+            Unit.property_id.in_(property_ids),
+            MobilePayment.initiated_at >= month_start,
+            MobilePayment.initiated_at < next_month_start,
+            MobilePayment.status == PaymentStatus.PAID
+        ).all()
+        
+        # Get all expected rent payments (from tenants)
+        tenants = db.query(Tenant).options(joinedload(Tenant.unit)).filter(
+            Tenant.property_id.in_(property_ids),
+            Tenant.is_active == True
+        ).all()
+        tenants_by_id = {t.id: t for t in tenants}
+        
+        summary = {
+            "total_mobile_payments": len(mobile_payments),
+            "total_expected_payments": len(tenants),
+            "matched": 0,
+            "unmatched_mobile": 0,
+            "unmatched_expected": 0,
+            "amount_discrepancies": 0,
+            "total_received": sum(float(mp.amount) for mp in mobile_payments),
+            "total_expected": sum(float(t.monthly_rent) for t in tenants),
+            "discrepancy_details": []
+        }
+        
+        # Tenants of payments made by tenants who are no longer active
+        missing_ids = {mp.tenant_id for mp in mobile_payments if mp.tenant_id and mp.tenant_id not in tenants_by_id}
+        if missing_ids:
+            for tenant in db.query(Tenant).filter(Tenant.id.in_(missing_ids)).all():
+                tenants_by_id[tenant.id] = tenant
+        
+        # Match mobile payments to tenants
+        matched_tenant_ids = set()
+        unmatched_mobile = []
+        
+        for mp in mobile_payments:
+            if mp.tenant_id:
+                matched_tenant_ids.add(mp.tenant_id)
+                summary["matched"] += 1
+                
+                # Check amount match
+                tenant = tenants_by_id.get(mp.tenant_id)
+                if tenant:
+                    expected_amount = float(tenant.monthly_rent) * (mp.months_advance or 1)
+                    paid_amount = float(mp.amount)
+                    
+                    if abs(expected_amount - paid_amount) > 1:  # Allow 1 unit variance
+                        summary["amount_discrepancies"] += 1
+                        summary["discrepancy_details"].append({
+                            "tenant_id": mp.tenant_id,
+                            "tenant_name": f"{tenant.first_name} {tenant.last_name}",
+                            "expected": expected_amount,
+                            "paid": paid_amount,
+                            "difference": paid_amount - expected_amount,
+                            "mobile_payment_id": mp.id
+                        })
+            else:
+                unmatched_mobile.append(mp)
+                summary["unmatched_mobile"] += 1
+        
+        # Find tenants who haven't paid
+        unmatched_tenants = [t for t in tenants if t.id not in matched_tenant_ids]
+        summary["unmatched_expected"] = len(unmatched_tenants)
+        
+        # Add unmatched tenant details
+        summary["unpaid_tenants"] = [
+            {
+                "tenant_id": t.id,
+                "tenant_name": f"{t.first_name} {t.last_name}",
+                "unit_number": t.unit.unit_number if t.unit else "N/A",
+                "expected_amount": float(t.monthly_rent),
+                "payment_status": t.rent_payment_status,
+                "due_date": str(t.next_payment_due) if t.next_payment_due else "N/A"
+            }
+            for t in unmatched_tenants
+        ]
+        
+        # Add unmatched mobile payment details
+        summary["unmatched_payments"] = [
+            {
+                "mobile_payment_id": mp.id,
+                "amount": float(mp.amount),
+                "phone_number": mp.payer_phone_number,
+                "transaction_id": mp.transaction_id,
+                "date": mp.initiated_at.isoformat()
+            }
+            for mp in unmatched_mobile
+        ]
+        
+        return summary
+    
+    def auto_match_payments(self, property_id: Optional[int] = None, db: Optional[Session] = None) -> Dict:
         """
         Automatically match unmatched mobile payments to tenants
         based on amount and phone number
         """
+        with get_session(db) as session:
+            return self._auto_match_payments(session, property_id)
+    
+    def _auto_match_payments(self, db: Session, property_id: Optional[int] = None) -> Dict:
         try:
-            # Get unmatched mobile payments
-            unmatched_payments = self.db.query(MobilePayment).filter(
+            # Unmatched payments and candidate tenants as plain column rows
+            payment_query = db.query(
+                MobilePayment.id,
+                MobilePayment.unit_id,
+                MobilePayment.amount,
+                MobilePayment.payer_phone_number,
+                MobilePayment.months_advance,
+                MobilePayment.completed_at
+            ).filter(
                 MobilePayment.status == PaymentStatus.PAID,
                 MobilePayment.tenant_id == None
-            ).all()
+            )
+            tenant_query = db.query(
+                Tenant.id, Tenant.phone, Tenant.unit_id, Tenant.monthly_rent
+            ).filter(Tenant.is_active == True)
             
-            matched_count = 0
-            tenants = tenant_crud.get_active_tenants(self.db)
             if property_id:
-                tenants = [t for t in tenants if t.property_id == property_id]
+                payment_query = payment_query.join(Unit, MobilePayment.unit_id == Unit.id).filter(
+                    Unit.property_id == property_id
+                )
+                tenant_query = tenant_query.filter(Tenant.property_id == property_id)
+            
+            unmatched_payments = payment_query.order_by(MobilePayment.id).all()
+            index = TenantMatchIndex(tenant_query.all())
+            
+            payment_updates = []
+            latest_by_tenant: Dict[int, object] = {}
+            needs_review = []
             
             for mp in unmatched_payments:
-                # Try to match by phone number
-                matching_tenant = None
-                for tenant in tenants:
-                    if tenant.phone == mp.payer_phone_number:
-                        # Check if amount matches (with some variance)
-                        expected = float(tenant.monthly_rent)
-                        paid = float(mp.amount)
-                        
-                        if abs(expected - paid) < expected * 0.1:  # 10% variance allowed
-                            matching_tenant = tenant
-                            break
+                tenant_id, confidence, ambiguous = index.best_match(mp)
+                if tenant_id is None:
+                    continue
                 
-                if matching_tenant:
-                    # Update mobile payment with tenant_id
-                    mp.tenant_id = matching_tenant.id
-                    
-                    # Update tenant payment status
-                    from ..schemas.tenant import TenantUpdate
-                    tenant_update = TenantUpdate(
-                        last_payment_date=mp.completed_at.date() if mp.completed_at else date.today(),
-                        next_payment_due=date.today() + timedelta(days=30 * mp.months_advance),
-                        rent_payment_status="paid"
-                    )
-                    tenant_crud.update_tenant(self.db, matching_tenant.id, tenant_update)
-                    
-                    matched_count += 1
-                    logger.info(f"Auto-matched payment {mp.id} to tenant {matching_tenant.id}")
+                # Phone and unit alone never settle rent: the amount must fit too
+                amount_matched = index.amount_signal(tenant_id, mp) is not None
+                if confidence < AUTO_MATCH_MIN_CONFIDENCE or ambiguous or not amount_matched:
+                    needs_review.append({
+                        "mobile_payment_id": mp.id,
+                        "tenant_id": tenant_id,
+                        "confidence": confidence,
+                        "ambiguous": ambiguous,
+                        "amount_matched": amount_matched
+                    })
+                    continue
+                
+                payment_updates.append({"id": mp.id, "tenant_id": tenant_id, "confidence": confidence})
+                # The latest matched payment sets the tenant's last payment date
+                latest = latest_by_tenant.get(tenant_id)
+                if latest is None or (mp.completed_at or datetime.min) >= (latest.completed_at or datetime.min):
+                    latest_by_tenant[tenant_id] = mp
+            
+            tenant_ids = sorted(latest_by_tenant)
+            # Build missing ledgers from the state before these payments were attributed
+            tenant_ledger_service.get_balances(db, tenant_ids)
+            
+            for start in range(0, len(payment_updates), AUTO_MATCH_WRITE_BATCH_SIZE):
+                chunk = payment_updates[start:start + AUTO_MATCH_WRITE_BATCH_SIZE]
+                db.bulk_update_mappings(MobilePayment, [
+                    {"id": update["id"], "tenant_id": update["tenant_id"]} for update in chunk
+                ])
+                # Apply each match the way a callback is applied: post it, then sync the tenant
+                for mobile_payment in db.query(MobilePayment).filter(
+                    MobilePayment.id.in_([update["id"] for update in chunk])
+                ).order_by(MobilePayment.id).all():
+                    tenant_ledger_service.post_mobile_payment(db, mobile_payment)
+            
+            for start in range(0, len(tenant_ids), AUTO_MATCH_WRITE_BATCH_SIZE):
+                chunk = tenant_ids[start:start + AUTO_MATCH_WRITE_BATCH_SIZE]
+                for tenant in db.query(Tenant).filter(Tenant.id.in_(chunk)).all():
+                    latest = latest_by_tenant[tenant.id]
+                    tenant.last_payment_date = latest.completed_at.date() if latest.completed_at else date.today()
+                    tenant.updated_at = datetime.utcnow()
+                    # Tenants without rent terms fall back to 30 days per month paid
+                    if not tenant_ledger_service.sync_tenant(db, tenant):
+                        tenant.next_payment_due = date.today() + timedelta(days=30 * (latest.months_advance or 1))
+                        tenant.rent_payment_status = "paid"
+            db.commit()
             
-            self.db.commit()
+            logger.info(
+                f"Auto-matched {len(payment_updates)} of {len(unmatched_payments)} unmatched payments "
+                f"({len(needs_review)} need review)"
+            )
             
             return {
-                "matched": matched_count,
-                "total_unmatched": len(unmatched_payments)
+                "matched": len(payment_updates),
+                "total_unmatched": len(unmatched_payments),
+                "tenants_updated": len(tenant_ids),
+                "matches": [
+                    {"mobile_payment_id": update["id"], "tenant_id": update["tenant_id"], "confidence": update["confidence"]}
+                    for update in payment_updates
+                ],
+                "needs_review": needs_review
             }
             
         except Exception as e:
+            db.rollback()
             logger.error(f"Error in auto-match: {str(e)}")
             return {"error": str(e)}
 
+class TenantMatchIndex:
+    """
+    In-memory hash indexes of tenants by normalized phone, unit and expected
+    rent, so each payment is matched with a few dictionary lookups instead
+    of a scan over all tenants.
+    
+    A candidate scores MATCH_WEIGHTS for each signal it shares with the
+    payment (phone, unit, amount within 1 or within 10% of rent times
+    months paid); the best candidate wins, and a tie is reported as
+    ambiguous. Only matches with an amount signal are applied automatically.
+    """
+    
+    def __init__(self, tenants):
+        self.rent_by_tenant: Dict[int, float] = {}
+        self.by_phone: Dict[str, List[int]] = defaultdict(list)
+        self.by_unit: Dict[int, List[int]] = defaultdict(list)
+        self.by_amount: Dict[int, List[int]] = defaultdict(list)
+        self.phone_by_tenant: Dict[int, str] = {}
+        self.unit_by_tenant: Dict[int, int] = {}
+        
+        for tenant_id, phone, unit_id, monthly_rent in tenants:
+            rent = float(monthly_rent or 0)
+            self.rent_by_tenant[tenant_id] = rent
+            phone_key = normalize_phone(phone)
+            if phone_key:
+                self.by_phone[phone_key].append(tenant_id)
+                self.phone_by_tenant[tenant_id] = phone_key
+            if unit_id:
+                self.by_unit[unit_id].append(tenant_id)
+                self.unit_by_tenant[tenant_id] = unit_id
+            self.by_amount[round(rent)].append(tenant_id)
+    
+    def best_match(self, payment) -> Tuple[Optional[int], float, bool]:
+        """(tenant_id, confidence, ambiguous) for a payment row, or (None, 0.0, False)"""
+        phone_key = normalize_phone(payment.payer_phone_number)
+        months = payment.months_advance or 1
+        paid = float(payment.amount)
+        
+        candidates = set(self.by_phone.get(phone_key, [])) if phone_key else set()
+        candidates.update(self.by_unit.get(payment.unit_id, []))
+        if not candidates:
+            # Amount alone is weak evidence; only a unique rent is worth reviewing
+            same_rent = self.by_amount.get(round(paid / months), [])
+            if len(same_rent) == 1:
+                candidates.update(same_rent)
+        
+        best_id, best_score, tied = None, 0.0, False
+        for tenant_id in candidates:
+            score = 0.0
+            if phone_key and self.phone_by_tenant.get(tenant_id) == phone_key:
+                score += MATCH_WEIGHTS["phone"]
+            if self.unit_by_tenant.get(tenant_id) == payment.unit_id:
+                score += MATCH_WEIGHTS["unit"]
+            amount_signal = self.amount_signal(tenant_id, payment)
+            if amount_signal:
+                score += MATCH_WEIGHTS[amount_signal]
+            
+            score = round(score, 2)
+            if score > best_score:
+                best_id, best_score, tied = tenant_id, score, False
+            elif score == best_score and score > 0:
+                tied = True
+        
+        return best_id, best_score, tied
+    
+    def amount_signal(self, tenant_id: int, payment) -> Optional[str]:
+        """"amount_exact" or "amount_close" if the payment fits the tenant's rent times months paid"""
+        expected = self.rent_by_tenant[tenant_id] * (payment.months_advance or 1)
+        paid = float(payment.amount)
+        if abs(expected - paid) <= 1:
+            return "amount_exact"
+        if abs(expected - paid) < expected * 0.1:
+            return "amount_close"
+        return None
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """Last 9 digits of a phone number, so +256 772..., 256772... and 0772... match"""
+    return re.sub(r"\D", "", phone or "")[-9:]
+
 payment_reconciliation_service = PaymentReconciliationService()
 
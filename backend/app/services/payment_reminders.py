@@ -0,0 +1,163 @@
+"""
+Payment Reminders
+Selects tenants with open rent payments due, one reminder per tenant, and
+sends them as a bulk communication job (batched email/SMS in the background
+plus one bulk insert of in-app notifications)
+"""
+
+import json
+import logging
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..crud.communication_log import communication_log_crud
+from ..models.enums import PaymentStatus
+from ..models.payment import Payment
+from ..models.tenant import Tenant
+from ..models.unit import Unit
+from ..models.user import User
+from ..schemas.communication_log import CommunicationLogCreate, CommunicationLogUpdate
+from .message_dispatcher import message_dispatcher, build_deliveries
+from .notification import notification_service
+from .template_renderer import compile_message
+from .tenant_ledger import tenant_ledger_service
+
+logger = logging.getLogger(__name__)
+
+# Also remind payments falling due within this many days
+REMINDER_LEAD_DAYS = int(os.getenv("REMINDER_LEAD_DAYS", "3"))
+REMINDER_METHOD = os.getenv("REMINDER_METHOD", "both")
+
+OPEN_STATUSES = [PaymentStatus.PENDING, PaymentStatus.OVERDUE, PaymentStatus.PARTIAL]
+
+REMINDER_SUBJECT = "Rent Payment Reminder"
+REMINDER_MESSAGE = (
+    "Dear {tenant_name},\n\n"
+    "This is a reminder that your rent payment of ${amount} for unit {unit_number} "
+    "is due on {due_date}.\n\n"
+    "Please ensure payment is made on time to avoid any late fees.\n\n"
+    "Best regards,\nProperty Management Team"
+)
+
+class PaymentReminderService:
+    """
+    One grouped query returns each tenant with open payments due by the
+    cutoff, their contact details, unit, tenant login (matched by email) and
+    the earliest due date. The amount is the tenant's ledger balance, so
+    tenants whose balance is settled are skipped even if stale PENDING rows
+    remain. The reminders go out as a communication log, whose id is the
+    job id; progress is on /communications/logs/{id}.
+    """
+
+    def get_due_reminders(self, db: Session, property_id: int, as_of: Optional[date] = None) -> List[Dict]:
+        """Reminders for a property's tenants, one per tenant"""
+        cutoff = (as_of or date.today()) + timedelta(days=REMINDER_LEAD_DAYS)
+
+        rows = db.query(
+            Tenant.id,
+            Tenant.first_name,
+            Tenant.last_name,
+            Tenant.email,
+            Tenant.phone,
+            Unit.unit_number,
+            User.id.label("user_id"),
+            func.sum(Payment.amount).label("open_amount"),
+            func.min(Payment.due_date).label("due_date")
+        ).join(
+            Tenant, Tenant.id == Payment.tenant_id
+        ).outerjoin(
+            Unit, Unit.id == Tenant.unit_id
+        ).outerjoin(
+            User, User.email == Tenant.email
+        ).filter(
+            Payment.status.in_(OPEN_STATUSES),
+            Payment.due_date <= cutoff,
+            Tenant.property_id == property_id,
+            Tenant.is_active == True
+        ).group_by(
+            Tenant.id, Tenant.first_name, Tenant.last_name, Tenant.email, Tenant.phone,
+            Unit.unit_number, User.id
+        ).order_by(Tenant.id).all()
+
+        balances = tenant_ledger_service.get_balances(db, [row.id for row in rows])
+
+        reminders = []
+        for row in rows:
+            balance = balances.get(row.id)
+            amount = Decimal(str(balance.balance or 0)) if balance else Decimal(str(row.open_amount or 0))
+            if amount <= 0:
+                continue
+            reminders.append({
+                "tenant_id": row.id,
+                "user_id": row.user_id,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "email": row.email,
+                "phone": row.phone,
+                "unit_number": row.unit_number,
+                "amount": amount,
+                "due_date": row.due_date
+            })
+        return reminders
+
+    def send(self, db: Session, property_id: int, sender_id: int, method: str = REMINDER_METHOD) -> Dict:
+        """Queue reminders for a property's tenants and return the job (log) id"""
+        reminders = self.get_due_reminders(db, property_id)
+        if not reminders:
+            return {"status": "empty", "job_id": None, "total_recipients": 0}
+
+        log = communication_log_crud.create_log(
+            db,
+            CommunicationLogCreate(
+                recipient_ids=json.dumps([reminder["tenant_id"] for reminder in reminders]),
+                method=method,
+                subject=REMINDER_SUBJECT,
+                message_content=REMINDER_MESSAGE
+            ),
+            sender_id
+        )
+
+        notification_service.create_notifications(db, [
+            {
+                "user_id": reminder["user_id"],
+                "title": "Payment Reminder",
+                "message": f"Rent payment of ${self.format_amount(reminder['amount'])} is due on {reminder['due_date']}",
+                "notification_type": "payment_due"
+            }
+            for reminder in reminders if reminder["user_id"]
+        ])
+
+        deliveries = build_deliveries(
+            # build_deliveries reads recipient rows by attribute, keyed by id
+            [SimpleNamespace(id=reminder["tenant_id"], **reminder) for reminder in reminders],
+            REMINDER_SUBJECT,
+            compile_message(REMINDER_MESSAGE),
+            values_for=self.template_values
+        )
+        communication_log_crud.update_log(db, log.id, CommunicationLogUpdate(status="sending"))
+        message_dispatcher.dispatch(log.id, method, deliveries)
+
+        logger.info(f"Payment reminders for property {property_id}: job {log.id}, {len(reminders)} tenants")
+        return {"status": "queued", "job_id": log.id, "total_recipients": len(reminders)}
+
+    @classmethod
+    def template_values(cls, row: SimpleNamespace) -> Dict[str, str]:
+        return {
+            "tenant_name": f"{row.first_name} {row.last_name}",
+            "amount": cls.format_amount(row.amount),
+            "due_date": str(row.due_date),
+            "unit_number": str(row.unit_number if row.unit_number is not None else "N/A")
+        }
+
+    @staticmethod
+    def format_amount(amount) -> str:
+        return f"{Decimal(str(amount)):,.2f}"
+
+# Global instance
+payment_reminder_service = PaymentReminderService()
@@ -1,24 +1,17 @@
 """
 Scheduled Tasks for Automated Payment Monitoring
-Runs background tasks to automatically update tenant payment statuses
+Registers the payment monitoring jobs with the persistent job scheduler
 """
 
-import asyncio
 import logging
-from datetime import datetime, time
+from datetime import datetime
 from typing import Dict, List
-import time as time_module
-from threading import Thread
 
-# Make schedule import optional to prevent startup errors
-try:
-    import schedule
-    SCHEDULE_AVAILABLE = True
-except ImportError:
-    SCHEDULE_AVAILABLE = False
-    schedule = None
+from sqlalchemy.orm import Session
 
 from ..services.payment_monitor import payment_monitor
+from ..services.job_scheduler import job_scheduler
+from ..services.sharded_executor import sharded_executor
 
 logger = logging.getLogger(__name__)
 
@@ -27,80 +20,124 @@ class PaymentMonitoringScheduler:
     
     def __init__(self):
         self.is_running = False
-        self.scheduler_thread = None
     
     def start_scheduler(self):
         """Start the automated monitoring scheduler"""
-        if not SCHEDULE_AVAILABLE:
-            logger.error("Schedule module not available. Cannot start scheduler.")
-            return False
-            
         if self.is_running:
             logger.warning("Scheduler is already running")
             return False
         
-        self.is_running = True
-        
         # Schedule tasks
         self._schedule_tasks()
         
-        # Start scheduler in background thread
-        self.scheduler_thread = Thread(target=self._run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        if not job_scheduler.start():
+            return False
         
+        self.is_running = True
         logger.info("Payment monitoring scheduler started")
         return True
     
     def stop_scheduler(self):
         """Stop the automated monitoring scheduler"""
         self.is_running = False
-        if self.scheduler_thread:
-            self.scheduler_thread.join(timeout=5)
+        job_scheduler.stop()
         logger.info("Payment monitoring scheduler stopped")
     
     def _schedule_tasks(self):
-        """Schedule all automated monitoring tasks"""
-        if not SCHEDULE_AVAILABLE:
-            logger.error("Schedule module not available. Cannot schedule tasks.")
-            return
-        
-        # Daily payment status check at 9:00 AM
-        schedule.every().day.at("09:00").do(self._run_daily_payment_check)
+        """Register all automated monitoring tasks (cron expressions are in UTC)"""
+        # Incremental payment status check every hour
+        job_scheduler.register(
+            "payment_status_check", "0 * * * *", self._run_daily_payment_check,
+            "Incremental tenant payment status check"
+        )
         
         # Weekly comprehensive check on Mondays at 8:00 AM
-        schedule.every().monday.at("08:00").do(self._run_weekly_comprehensive_check)
+        job_scheduler.register(
+            "weekly_payment_check", "0 8 * * 1", self._run_weekly_comprehensive_check,
+            "Weekly payment summary and full status sweep"
+        )
+        
+        # Monthly report generation on the 1st of each month at 10:00 AM
+        job_scheduler.register(
+            "monthly_payment_report", "0 10 1 * *", self._run_monthly_report,
+            "Monthly payment report"
+        )
         
-        # Monthly report generation - runs every 30 days
-        schedule.every(30).days.at("10:00").do(self._run_monthly_report)
+        # Scheduled bulk communications, every minute
+        job_scheduler.register(
+            "scheduled_communications", "* * * * *", self._run_scheduled_communications,
+            "Dispatch due scheduled bulk messages"
+        )
+        
+        # Provider status polling for pending mobile payments, every minute
+        job_scheduler.register(
+            "pending_payment_poll", "* * * * *", self._run_pending_payment_poll,
+            "Check provider status of pending mobile payments"
+        )
+        
+        # Rent charges on the tenant ledger, daily (each tenant is charged on their move-in day)
+        job_scheduler.register(
+            "tenant_rent_accrual", "15 0 * * *", self._run_tenant_rent_accrual,
+            "Post due monthly rent charges to tenant ledgers"
+        )
+        
+        # Expected utility payments for the month, on the 1st at 00:30
+        job_scheduler.register(
+            "monthly_rent_invoicing", "30 0 1 * *", self._run_monthly_rent_invoicing,
+            "Generate pending utility invoices for all active tenants"
+        )
+        
+        # QR payment expiry (and archiving when enabled), every 5 minutes
+        job_scheduler.register(
+            "qr_payment_expiry", "*/5 * * * *", self._run_qr_payment_expiry,
+            "Expire overdue QR code payments and archive old finished ones"
+        )
         
         logger.info("Scheduled tasks configured:")
-        logger.info("- Daily payment check: 9:00 AM")
+        logger.info("- Incremental payment check: hourly")
         logger.info("- Weekly comprehensive check: Monday 8:00 AM")
-        logger.info("- Monthly report: Every 30 days at 10:00 AM")
+        logger.info("- Monthly report: 1st of each month 10:00 AM")
+        logger.info("- Scheduled communications: every minute")
+        logger.info("- Pending mobile payment status poll: every minute")
+        logger.info("- Tenant rent accrual: daily 00:15")
+        logger.info("- Monthly rent invoicing: 1st of each month 00:30")
+        logger.info("- QR payment expiry sweep: every 5 minutes")
     
-    def _run_scheduler(self):
-        """Main scheduler loop"""
-        if not SCHEDULE_AVAILABLE:
-            logger.error("Schedule module not available. Cannot run scheduler.")
-            return
-            
-        while self.is_running:
-            try:
-                schedule.run_pending()
-                time_module.sleep(60)  # Check every minute
-            except Exception as e:
-                logger.error(f"Error in scheduler loop: {str(e)}")
-                time_module.sleep(60)
-    
-    def _run_daily_payment_check(self):
-        """Run daily payment status check"""
+    def _run_scheduled_communications(self, db: Session) -> Dict:
+        """Claim due scheduled communication logs and hand them to the message dispatcher"""
+        from .message_dispatcher import message_dispatcher
+        return message_dispatcher.process_scheduled(db)
+    
+    def _run_pending_payment_poll(self, db: Session) -> Dict:
+        """Poll providers for mobile payments whose callback has not arrived"""
+        from .payment_poller import pending_payment_poller
+        return pending_payment_poller.poll(db)
+    
+    def _run_tenant_rent_accrual(self, db: Session) -> Dict:
+        """Charge each active tenant's current rent period on their ledger"""
+        from .tenant_ledger import tenant_ledger_service
+        return tenant_ledger_service.accrue_rent(db)
+    
+    def _run_monthly_rent_invoicing(self, db: Session) -> Dict:
+        """Create this month's pending utility payments (safe to re-run)"""
+        from .rent_invoicing import rent_invoicing_service
+        return rent_invoicing_service.generate(db)
+    
+    def _run_qr_payment_expiry(self, db: Session) -> Dict:
+        """Expire QR code payments past expires_at in one UPDATE"""
+        from .qr_expiry import qr_expiry_sweeper
+        return qr_expiry_sweeper.sweep(db)
+    
+    def _run_daily_payment_check(self, db: Session, full: bool = False) -> Dict:
+        """Run payment status check (incremental from the last watermark unless full)"""
         try:
-            logger.info("Running daily payment status check...")
+            logger.info("Running payment status check...")
             
-            result = payment_monitor.run_automated_payment_monitoring()
+            result = payment_monitor.run_automated_payment_monitoring(db, full=full)
+            result["rows_processed"] = result.get("total_processed", 0)
             
             # Log summary
-            logger.info(f"Daily check completed:")
+            logger.info(f"Payment check completed ({result.get('mode', 'unknown')}):")
             logger.info(f"- Overdue updated: {result.get('overdue_updated', 0)}")
             logger.info(f"- Due updated: {result.get('due_updated', 0)}")
             logger.info(f"- Pending updated: {result.get('pending_updated', 0)}")
@@ -110,16 +147,19 @@ class PaymentMonitoringScheduler:
             if result.get('errors'):
                 logger.warning(f"Errors encountered: {result['errors']}")
             
+            return result
+            
         except Exception as e:
             logger.error(f"Error in daily payment check: {str(e)}")
+            return {"error": str(e)}
     
-    def _run_weekly_comprehensive_check(self):
+    def _run_weekly_comprehensive_check(self, db: Session) -> Dict:
         """Run weekly comprehensive check"""
         try:
             logger.info("Running weekly comprehensive payment check...")
             
             # Get detailed summary
-            summary = payment_monitor.get_payment_summary()
+            summary = payment_monitor.get_payment_summary(db)
             
             logger.info(f"Weekly comprehensive check completed:")
             logger.info(f"- Total tenants: {summary.get('total_tenants', 0)}")
@@ -129,27 +169,38 @@ class PaymentMonitoringScheduler:
             logger.info(f"- Paid: {summary.get('paid_count', 0)}")
             logger.info(f"- Moved out: {summary.get('moved_out_count', 0)}")
             
-            # Run automated monitoring
-            self._run_daily_payment_check()
+            # Run a full sweep to pick up tenants edited outside the due date window
+            result = self._run_daily_payment_check(db, full=True)
+            
+            return {
+                "summary": summary,
+                "monitoring": result,
+                "rows_processed": result.get("rows_processed", 0)
+            }
             
         except Exception as e:
             logger.error(f"Error in weekly comprehensive check: {str(e)}")
+            return {"error": str(e)}
     
-    def _run_monthly_report(self):
+    def _run_monthly_report(self, db: Session) -> Dict:
         """Run monthly report generation"""
         try:
             logger.info("Generating monthly payment report...")
             
-            # Get comprehensive data
-            categories = payment_monitor.get_tenant_categories()
-            summary = payment_monitor.get_payment_summary()
+            # Aggregate the summary in parallel property shards
+            summary = sharded_executor.run(
+                self._summarize_shard,
+                job_name="monthly payment report"
+            )
+            errors = summary.pop("errors", [])
+            summary.pop("shards", None)
+            failed_shards = summary.pop("failed_shards", 0)
             
             # Generate report data
             report = {
                 "month": datetime.now().strftime("%B %Y"),
                 "generated_at": datetime.now().isoformat(),
                 "summary": summary,
-                "categories": categories,
                 "recommendations": self._generate_recommendations(summary)
             }
             
@@ -158,8 +209,26 @@ class PaymentMonitoringScheduler:
             logger.info(f"- Total revenue potential: ${summary.get('total_overdue_amount', 0) + summary.get('total_due_amount', 0) + summary.get('total_pending_amount', 0):.2f}")
             logger.info(f"- Collection rate: {self._calculate_collection_rate(summary):.1f}%")
             
+            result = {
+                "month": report["month"],
+                "summary": summary,
+                "recommendations": report["recommendations"],
+                "rows_processed": summary.get("total_tenants", 0)
+            }
+            if failed_shards:
+                result["error"] = f"{failed_shards} shards failed: {'; '.join(errors)}"
+            return result
+            
         except Exception as e:
             logger.error(f"Error generating monthly report: {str(e)}")
+            return {"error": str(e)}
+    
+    def _summarize_shard(self, db: Session, property_ids: List[int]) -> Dict:
+        """Payment summary for one shard of properties"""
+        summary = payment_monitor.get_payment_summary(db, property_ids=property_ids)
+        if "error" in summary:
+            raise RuntimeError(summary["error"])
+        return summary
     
     def _generate_recommendations(self, summary: Dict) -> List[str]:
         """Generate recommendations based on payment summary"""
@@ -198,11 +267,11 @@ class PaymentMonitoringScheduler:
         
         return (paid_count / total_tenants) * 100
     
-    def run_manual_check(self) -> Dict:
+    def run_manual_check(self, full: bool = False) -> Dict:
         """Run manual payment check (for testing or immediate execution)"""
         try:
             logger.info("Running manual payment check...")
-            result = payment_monitor.run_automated_payment_monitoring()
+            result = payment_monitor.run_automated_payment_monitoring(full=full)
             logger.info(f"Manual check completed: {result}")
             return result
         except Exception as e:
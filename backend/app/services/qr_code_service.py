@@ -1,25 +1,20 @@
-import qrcode
-import io
-import base64
-import os
 from typing import Dict, Any
 from datetime import datetime
 from ..models.enums import PaymentMethod
+from .qr_image_cache import qr_image_cache
+
+BACKEND_URL = "https://carryit-backend.onrender.com"
 
 class QRCodeService:
-    def __init__(self):
-        self.qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
+    def property_payment_url(self, property_id: int) -> str:
+        """URL encoded in a property's QR code (the public payment page)."""
+        return f"{BACKEND_URL}/api/v1/mobile-payment/property/{property_id}"
 
     def generate_qr_code_data(self, payment_data: Dict[str, Any]) -> str:
         """Generate QR code data string for mobile money payment."""
         # Generate a web URL that opens the mobile payment form
         # Use BACKEND_URL for API endpoints, FRONTEND_URL for frontend pages
-        backend_url = "https://carryit-backend.onrender.com"
+        backend_url = BACKEND_URL
         qr_payment_id = payment_data.get("qr_payment_id")
         
         if qr_payment_id:
@@ -46,20 +41,12 @@ class QRCodeService:
         return qr_string
 
     def generate_qr_code_image(self, qr_data: str) -> str:
-        """Generate QR code image and return as base64 string."""
-        self.qr.clear()
-        self.qr.add_data(qr_data)
-        self.qr.make(fit=True)
-        
-        # Create QR code image
-        img = self.qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        return img_str
+        """QR code image as a base64 PNG (rendered once per payload, then cached)."""
+        return qr_image_cache.image_base64(qr_data)
+
+    def qr_code_image_url(self, qr_data: str) -> str:
+        """Static, cacheable URL of the QR code image for this payload."""
+        return qr_image_cache.url(qr_image_cache.get_or_render(qr_data))
 
     def generate_mobile_money_payment_qr(self, payment_data: Dict[str, Any]) -> Dict[str, str]:
         """Generate complete QR code for mobile money payment."""
@@ -69,6 +56,7 @@ class QRCodeService:
         return {
             "qr_data": qr_data,
             "qr_image": qr_image,
+            "qr_image_url": self.qr_code_image_url(qr_data),
             "payment_info": {
                 "account_number": payment_data["account_number"],
                 "amount": payment_data["amount"],
@@ -0,0 +1,100 @@
+"""
+QR Payment Expiry
+Scheduled sweep that expires active QR code payments past expires_at with
+one set-based UPDATE and optionally moves old finished codes into the
+archive table, so qr_code_payments holds mostly live codes
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import DateTime, exists, insert, literal, select
+from sqlalchemy.orm import Session
+
+from ..crud.qr_payment import qr_payment_crud
+from ..models.enums import QRCodeStatus
+from ..models.mobile_payment import MobilePayment
+from ..models.qr_payment import QRCodePayment, QRCodePaymentArchive
+
+logger = logging.getLogger(__name__)
+
+QR_ARCHIVE_ENABLED = os.getenv("QR_ARCHIVE_ENABLED", "false").lower() == "true"
+# Finished codes (used, expired, cancelled) older than this are archived
+QR_ARCHIVE_RETENTION_DAYS = int(os.getenv("QR_ARCHIVE_RETENTION_DAYS", "90"))
+# Rows moved per archive transaction
+QR_ARCHIVE_BATCH_SIZE = int(os.getenv("QR_ARCHIVE_BATCH_SIZE", "1000"))
+
+FINISHED_STATUSES = [QRCodeStatus.USED, QRCodeStatus.EXPIRED, QRCodeStatus.CANCELLED]
+
+ARCHIVED_COLUMNS = [
+    "id", "unit_id", "tenant_id", "payer_id", "amount", "account_number",
+    "mobile_money_provider", "qr_code_data", "qr_code_image_path", "status",
+    "expires_at", "used_at", "created_at", "updated_at",
+]
+
+class QRExpirySweeper:
+    """
+    Expiry is a single UPDATE served by the (status, expires_at) index.
+
+    Archiving copies a batch of finished codes past the retention window
+    with INSERT ... SELECT and deletes them in the same transaction. Codes
+    that mobile payments still reference stay in place, since
+    mobile_payments.qr_payment_id must keep pointing at a live row.
+    """
+
+    def __init__(
+        self,
+        archive_enabled: bool = QR_ARCHIVE_ENABLED,
+        retention_days: int = QR_ARCHIVE_RETENTION_DAYS,
+        batch_size: int = QR_ARCHIVE_BATCH_SIZE
+    ):
+        self.archive_enabled = archive_enabled
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    def sweep(self, db: Session, archive: Optional[bool] = None) -> Dict:
+        """Expire overdue codes, then archive old finished ones if enabled. Returns job metrics."""
+        expired = qr_payment_crud.cleanup_expired_qr_payments(db)
+
+        archived = 0
+        if self.archive_enabled if archive is None else archive:
+            archived = self.archive(db)
+
+        if expired or archived:
+            logger.info(f"QR payment sweep: {expired} expired, {archived} archived")
+        return {"expired": expired, "archived": archived, "rows_processed": expired + archived}
+
+    def archive(self, db: Session) -> int:
+        """Move finished codes older than the retention window into the archive table"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        archived = 0
+
+        while True:
+            ids = [row[0] for row in db.query(QRCodePayment.id).filter(
+                QRCodePayment.status.in_(FINISHED_STATUSES),
+                QRCodePayment.expires_at <= cutoff,
+                ~exists().where(MobilePayment.qr_payment_id == QRCodePayment.id)
+            ).order_by(QRCodePayment.id).limit(self.batch_size).all()]
+            if not ids:
+                break
+
+            source_columns = [getattr(QRCodePayment, column) for column in ARCHIVED_COLUMNS]
+            db.execute(
+                insert(QRCodePaymentArchive).from_select(
+                    ARCHIVED_COLUMNS + ["archived_at"],
+                    select(*source_columns, literal(datetime.utcnow(), DateTime)).where(QRCodePayment.id.in_(ids))
+                )
+            )
+            db.query(QRCodePayment).filter(QRCodePayment.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            archived += len(ids)
+
+            if len(ids) < self.batch_size:
+                break
+
+        return archived
+
+# Global instance
+qr_expiry_sweeper = QRExpirySweeper()
@@ -0,0 +1,198 @@
+"""
+QR Image Cache
+Content-addressed store of rendered QR code PNGs: an image is keyed by a
+hash of its payload and render options, rendered once, kept on disk under a
+size cap (least recently used images are evicted first) and served from a
+static URL
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time as time_module
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import qrcode
+
+logger = logging.getLogger(__name__)
+
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR", "qr_cache")
+QR_CACHE_MAX_BYTES = int(os.getenv("QR_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Base64 strings kept in memory for the JSON endpoints that embed the image
+QR_CACHE_MEMORY_ITEMS = int(os.getenv("QR_CACHE_MEMORY_ITEMS", "256"))
+# A hit refreshes the file's mtime (its LRU position) at most this often
+QR_CACHE_TOUCH_SECONDS = 3600
+
+QR_IMAGE_URL_PREFIX = "/api/v1/qr-images"
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+DEFAULT_OPTIONS = {
+    "error_correction": "L",
+    "box_size": 10,
+    "border": 4,
+    "fill_color": "black",
+    "back_color": "white",
+}
+
+ERROR_CORRECTION_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+def image_digest(payload: str, options: Dict) -> str:
+    """Cache key: hash of the payload and the render options"""
+    key = json.dumps({"payload": payload, "options": options}, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+
+class QRImageCache:
+    """
+    Images live in cache_dir as <digest>.png. Writes go to a temp file and are
+    renamed into place, so concurrent renders of one image are harmless. The
+    total size is tracked in memory (scanned from disk on first use); when it
+    exceeds max_bytes the files with the oldest mtime are removed. Since a
+    digest always maps to the same bytes, its URL can be cached forever.
+    """
+
+    def __init__(self, cache_dir: str = QR_CACHE_DIR, max_bytes: int = QR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+
+    def get_or_render(self, payload: str, **options) -> str:
+        """Digest of the image for this payload, rendering and storing it if needed"""
+        options = {**DEFAULT_OPTIONS, **options}
+        digest = image_digest(payload, options)
+        path = self.path(digest)
+
+        try:
+            stat = os.stat(path)
+            if time_module.time() - stat.st_mtime > QR_CACHE_TOUCH_SECONDS:
+                os.utime(path, None)
+            return digest
+        except FileNotFoundError:
+            pass
+
+        png = self.render(payload, options)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(png)
+        os.replace(temp_path, path)
+
+        self._add_bytes(len(png))
+        return digest
+
+    def image_base64(self, payload: str, **options) -> str:
+        """Base64 PNG for APIs that embed the image (rendered at most once per digest)"""
+        digest = self.get_or_render(payload, **options)
+        with self._lock:
+            cached = self._memory.get(digest)
+            if cached is not None:
+                self._memory.move_to_end(digest)
+                return cached
+
+        try:
+            with open(self.path(digest), "rb") as f:
+                encoded = base64.b64encode(f.read()).decode()
+        except FileNotFoundError:
+            # Evicted in between: render straight from the payload
+            encoded = base64.b64encode(self.render(payload, {**DEFAULT_OPTIONS, **options})).decode()
+
+        with self._lock:
+            self._memory[digest] = encoded
+            while len(self._memory) > QR_CACHE_MEMORY_ITEMS:
+                self._memory.popitem(last=False)
+        return encoded
+
+    def url(self, digest: str) -> str:
+        return f"{QR_IMAGE_URL_PREFIX}/{digest}.png"
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def find(self, digest: str) -> Optional[str]:
+        """Path of a stored image, or None for unknown or malformed digests"""
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        path = self.path(digest)
+        return path if os.path.isfile(path) else None
+
+    def warm(self, payload: str, **options):
+        """Render ahead of the first view; failures are only logged"""
+        try:
+            self.get_or_render(payload, **options)
+        except Exception as e:
+            logger.warning(f"Could not pre-generate QR image: {str(e)}")
+
+    @staticmethod
+    def render(payload: str, options: Dict) -> bytes:
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=ERROR_CORRECTION_LEVELS[options["error_correction"]],
+            box_size=options["box_size"],
+            border=options["border"],
+        )
+        qr.add_data(payload)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color=options["fill_color"], back_color=options["back_color"])
+
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def _add_bytes(self, size: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += size
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _scan_size(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".png"))
+        except FileNotFoundError:
+            return 0
+
+    def _evict(self):
+        """Remove least recently used images until the store is back under 90% of the cap"""
+        with self._lock:
+            try:
+                entries = sorted(
+                    (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                    for entry in os.scandir(self.cache_dir) if entry.name.endswith(".png")
+                )
+            except FileNotFoundError:
+                return
+
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except FileNotFoundError:
+                    total -= size
+            self._total_bytes = total
+
+        if removed:
+            logger.info(f"QR image cache: evicted {removed} images, {total} bytes kept")
+
+# Global instance
+qr_image_cache = QRImageCache()
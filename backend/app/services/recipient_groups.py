@@ -0,0 +1,167 @@
+"""
+Recipient Groups
+SQL filters for bulk message recipients and cached per-owner group counts
+for the communications UI
+"""
+
+import os
+import threading
+import time as time_module
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, Query
+
+from ..models.property import Property
+from ..models.tenant import Tenant
+from ..models.unit import Unit
+
+RECIPIENT_GROUPS_CACHE_SECONDS = int(os.getenv("RECIPIENT_GROUPS_CACHE_SECONDS", "60"))
+# Tenant ids per IN query for custom recipient lists
+RECIPIENT_ID_CHUNK_SIZE = 500
+
+STATUS_GROUPS = [
+    ("paid", "Paid Tenants"),
+    ("due", "Due Tenants"),
+    ("overdue", "Overdue Tenants"),
+]
+
+class RecipientGroupService:
+    """
+    Owners see tenants of their own properties; admins see active tenants.
+    The same scope is used for the group counts and when expanding a group
+    into recipients at send time, so the counts match what gets sent.
+    """
+
+    def __init__(self, cache_seconds: int = RECIPIENT_GROUPS_CACHE_SECONDS):
+        self.cache_seconds = cache_seconds
+        self._cache: Dict[Optional[int], tuple] = {}
+        self._lock = threading.Lock()
+
+    def _scoped(self, query: Query, owner_id: Optional[int], active_only: bool = True) -> Query:
+        if owner_id is not None:
+            owner_properties = select(Property.id).where(Property.owner_id == owner_id)
+            return query.filter(Tenant.property_id.in_(owner_properties))
+        if active_only:
+            return query.filter(Tenant.is_active == True)
+        return query
+
+    def get_recipients(
+        self,
+        db: Session,
+        recipient_type: str,
+        owner_id: Optional[int] = None,
+        property_id: Optional[int] = None,
+        status_filter: Optional[str] = None,
+        tenant_ids: Optional[List[int]] = None
+    ) -> List[Row]:
+        """
+        Expand a recipient group (all, property, status, custom) into recipient
+        rows: tenant id, name, contact details, rent, due date and unit number
+        from one joined query, ready for template rendering.
+        """
+        query = self._rows_query(db)
+
+        if recipient_type == "all":
+            return self._scoped(query, owner_id).order_by(Tenant.id).all()
+
+        if recipient_type == "property" and property_id:
+            return self._scoped(query, owner_id, active_only=False).filter(
+                Tenant.property_id == property_id
+            ).order_by(Tenant.id).all()
+
+        if recipient_type == "status" and status_filter:
+            return self._scoped(query, owner_id).filter(
+                Tenant.rent_payment_status == status_filter
+            ).order_by(Tenant.id).all()
+
+        if recipient_type == "custom" and tenant_ids:
+            ids = sorted(set(tenant_ids))
+            recipients = []
+            for start in range(0, len(ids), RECIPIENT_ID_CHUNK_SIZE):
+                recipients.extend(
+                    self._scoped(query, owner_id, active_only=False).filter(
+                        Tenant.id.in_(ids[start:start + RECIPIENT_ID_CHUNK_SIZE])
+                    ).all()
+                )
+            return recipients
+
+        return []
+
+    def get_recipients_by_ids(self, db: Session, tenant_ids: List[int]) -> Dict[int, Row]:
+        """Recipient rows for known tenant ids (no owner scoping), keyed by id"""
+        return {row.id: row for row in self.get_recipients(db, "custom", tenant_ids=tenant_ids)}
+
+    @staticmethod
+    def _rows_query(db: Session) -> Query:
+        return db.query(
+            Tenant.id,
+            Tenant.first_name,
+            Tenant.last_name,
+            Tenant.email,
+            Tenant.phone,
+            Tenant.monthly_rent,
+            Tenant.next_payment_due,
+            Unit.unit_number
+        ).outerjoin(Unit, Unit.id == Tenant.unit_id)
+
+    def get_group_counts(self, db: Session, owner_id: Optional[int] = None) -> Dict:
+        """Group counts (all, per payment status, per owner property), cached briefly"""
+        now = time_module.monotonic()
+        with self._lock:
+            cached = self._cache.get(owner_id)
+            if cached and now - cached[0] < self.cache_seconds:
+                return cached[1]
+
+        groups = self._count_groups(db, owner_id)
+
+        with self._lock:
+            self._cache[owner_id] = (now, groups)
+        return groups
+
+    def _count_groups(self, db: Session, owner_id: Optional[int]) -> Dict:
+        status_counts: Dict[str, int] = {}
+        property_groups: Dict[str, Dict] = {}
+
+        if owner_id is not None:
+            # One grouped query over the owner's properties, including empty ones
+            rows = db.query(
+                Property.id, Property.name, Tenant.rent_payment_status, func.count(Tenant.id)
+            ).outerjoin(
+                Tenant, Tenant.property_id == Property.id
+            ).filter(
+                Property.owner_id == owner_id
+            ).group_by(
+                Property.id, Property.name, Tenant.rent_payment_status
+            ).order_by(Property.id).all()
+
+            for property_id, property_name, payment_status, count in rows:
+                group = property_groups.setdefault(
+                    f"property_{property_id}", {"count": 0, "label": f"{property_name} Tenants"}
+                )
+                group["count"] += count
+                if count:
+                    status_counts[payment_status] = status_counts.get(payment_status, 0) + count
+        else:
+            rows = self._scoped(
+                db.query(Tenant.rent_payment_status, func.count(Tenant.id)), None
+            ).group_by(Tenant.rent_payment_status).all()
+            status_counts = {payment_status: count for payment_status, count in rows}
+
+        groups = {"all": {"count": sum(status_counts.values()), "label": "All Tenants"}}
+        for payment_status, label in STATUS_GROUPS:
+            groups[payment_status] = {"count": status_counts.get(payment_status, 0), "label": label}
+        groups.update(property_groups)
+        return groups
+
+    def invalidate(self, owner_id: Optional[int] = None):
+        """Drop cached counts for one owner (or all when owner_id is None)"""
+        with self._lock:
+            if owner_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(owner_id, None)
+
+# Global instance
+recipient_group_service = RecipientGroupService()
@@ -0,0 +1,230 @@
+"""
+Rent Invoicing
+Monthly generation of the expected (PENDING) utility payments for every
+active tenant, inserted in batches and keyed per tenant and period so
+re-running a month adds nothing twice. Rent itself is charged by the tenant
+ledger's accrual job and settled through the ledger balance, so no rent rows
+are generated (they would stay open, since no payment path closes them).
+"""
+
+import calendar
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.enums import PaymentStatus, PaymentType
+from ..models.payment import Payment
+from ..models.property import Property
+from ..models.tenant import Tenant
+from ..models.unit_utility import UnitUtility
+from ..models.utility import Utility
+from .tenant_ledger import tenant_ledger_service
+
+logger = logging.getLogger(__name__)
+
+# Tenants per insert batch (one commit each)
+INVOICE_CHUNK_SIZE = int(os.getenv("INVOICE_CHUNK_SIZE", "1000"))
+
+def invoice_key(kind: str, tenant_id: int, period: date, source_id: Optional[int] = None) -> str:
+    """Idempotency key of one generated charge, e.g. unit_utility:12:7:202501 or utility:12:3:202501"""
+    parts = [kind, str(tenant_id)] + ([str(source_id)] if source_id is not None else [])
+    return ":".join(parts + [period.strftime("%Y%m")])
+
+class RentInvoicingService:
+    """
+    One run invoices one calendar month. Tenants and utilities are read with
+    a few set queries, the payment rows are built in memory and inserted per
+    chunk of tenants; keys already present (an earlier or concurrent run)
+    are skipped, and the unique invoice_key index backs that up.
+
+    Charges are due on the tenant's move-in day of month. Unit utilities go
+    to the unit's tenant; property utilities are split evenly between the
+    property's invoiced tenants.
+    """
+
+    def __init__(self, chunk_size: int = INVOICE_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def generate(
+        self,
+        db: Session,
+        period: Optional[date] = None,
+        owner_id: Optional[int] = None,
+        property_id: Optional[int] = None
+    ) -> Dict:
+        """Create the month's invoices (any day of the month selects it). Commits per chunk."""
+        period_start = (period or date.today()).replace(day=1)
+        period_end = period_start.replace(day=calendar.monthrange(period_start.year, period_start.month)[1])
+
+        tenants = self._tenants(db, period_start, period_end, owner_id, property_id)
+        unit_utilities, property_utilities = self._utilities(db, tenants)
+        tenants_per_property: Dict[int, int] = {}
+        for tenant in tenants:
+            tenants_per_property[tenant.property_id] = tenants_per_property.get(tenant.property_id, 0) + 1
+
+        summary = {
+            "period": period_start.strftime("%Y-%m"),
+            "tenants": len(tenants),
+            "utility": 0,
+            "skipped": 0,
+            "created": 0
+        }
+
+        for start in range(0, len(tenants), self.chunk_size):
+            rows = []
+            for tenant in tenants[start:start + self.chunk_size]:
+                rows.extend(self._tenant_rows(
+                    tenant, period_start, period_end,
+                    unit_utilities.get(tenant.unit_id, []),
+                    property_utilities.get(tenant.property_id, []),
+                    tenants_per_property[tenant.property_id]
+                ))
+            self._insert_chunk(db, rows, summary)
+
+        summary["rows_processed"] = summary["created"]
+        logger.info(
+            f"Invoiced {summary['period']}: {summary['utility']} utility charges "
+            f"for {summary['tenants']} tenants ({summary['skipped']} already invoiced)"
+        )
+        return summary
+
+    @staticmethod
+    def _tenants(
+        db: Session, period_start: date, period_end: date,
+        owner_id: Optional[int], property_id: Optional[int]
+    ) -> List:
+        query = db.query(
+            Tenant.id,
+            Tenant.unit_id,
+            Tenant.property_id,
+            Tenant.move_in_date,
+            Property.owner_id
+        ).join(
+            Property, Property.id == Tenant.property_id
+        ).filter(
+            Tenant.is_active == True,
+            Tenant.move_in_date <= period_end,
+            or_(Tenant.move_out_date == None, Tenant.move_out_date >= period_start)
+        )
+        if owner_id is not None:
+            query = query.filter(Property.owner_id == owner_id)
+        if property_id is not None:
+            query = query.filter(Tenant.property_id == property_id)
+        return query.order_by(Tenant.id).all()
+
+    @staticmethod
+    def _utilities(db: Session, tenants: List) -> tuple:
+        """Billable unit utilities by unit id and property utilities by property id"""
+        unit_ids = {tenant.unit_id for tenant in tenants}
+        property_ids = {tenant.property_id for tenant in tenants}
+
+        unit_utilities: Dict[int, List] = {}
+        for utility in db.query(
+            UnitUtility.id, UnitUtility.unit_id, UnitUtility.utility_type, UnitUtility.monthly_cost
+        ).filter(
+            UnitUtility.is_included_in_rent == False,
+            UnitUtility.monthly_cost > 0
+        ).all():
+            if utility.unit_id in unit_ids:
+                unit_utilities.setdefault(utility.unit_id, []).append(utility)
+
+        property_utilities: Dict[int, List] = {}
+        for utility in db.query(
+            Utility.id, Utility.property_id, Utility.utility_type, Utility.monthly_cost
+        ).filter(
+            Utility.is_included_in_rent == False,
+            Utility.monthly_cost > 0
+        ).all():
+            if utility.property_id in property_ids:
+                property_utilities.setdefault(utility.property_id, []).append(utility)
+
+        return unit_utilities, property_utilities
+
+    @staticmethod
+    def _tenant_rows(
+        tenant, period_start: date, period_end: date,
+        unit_utilities: List, property_utilities: List, property_tenants: int
+    ) -> List[Dict]:
+        due_date = period_start.replace(day=min(tenant.move_in_date.day, period_end.day))
+        if due_date < tenant.move_in_date:
+            due_date = tenant.move_in_date
+        month = period_start.strftime("%B %Y")
+        now = datetime.utcnow()
+
+        def row(key: str, payment_type: PaymentType, amount, notes: str, **links) -> Dict:
+            return {
+                "unit_id": tenant.unit_id,
+                "tenant_id": tenant.id,
+                "payer_id": tenant.owner_id,
+                "amount": amount,
+                "payment_type": payment_type,
+                "status": PaymentStatus.PENDING,
+                "due_date": due_date,
+                "notes": notes,
+                "invoice_key": key,
+                "created_at": now,
+                "updated_at": now,
+                **links
+            }
+
+        rows = []
+        for utility in unit_utilities:
+            rows.append(row(
+                invoice_key("unit_utility", tenant.id, period_start, utility.id), PaymentType.UTILITY,
+                utility.monthly_cost, f"{_enum_value(utility.utility_type).title()} {month}",
+                unit_utility_id=utility.id
+            ))
+        for utility in property_utilities:
+            share = (Decimal(str(utility.monthly_cost)) / property_tenants).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            if share <= 0:
+                continue
+            rows.append(row(
+                invoice_key("utility", tenant.id, period_start, utility.id), PaymentType.UTILITY,
+                share, f"{_enum_value(utility.utility_type).title()} {month} (shared)",
+                utility_id=utility.id
+            ))
+        return rows
+
+    def _insert_chunk(self, db: Session, rows: List[Dict], summary: Dict):
+        if not rows:
+            return
+
+        for attempt in range(2):
+            existing = {
+                row[0] for row in db.query(Payment.invoice_key).filter(
+                    Payment.invoice_key.in_([row["invoice_key"] for row in rows])
+                ).all()
+            }
+            new_rows = [row for row in rows if row["invoice_key"] not in existing]
+            try:
+                with db.begin_nested():
+                    if new_rows:
+                        db.bulk_insert_mappings(Payment, new_rows)
+                break
+            except IntegrityError:
+                # A concurrent run inserted some of these keys; re-read and retry once
+                if attempt:
+                    raise
+                logger.warning("Invoice keys inserted concurrently, retrying chunk")
+
+        # Utility invoices are charges on the tenant ledger
+        utility_tenants = sorted({row["tenant_id"] for row in new_rows})
+        if utility_tenants:
+            tenant_ledger_service.rebuild(db, utility_tenants)
+        db.commit()
+
+        summary["utility"] += len(new_rows)
+        summary["created"] += len(new_rows)
+        summary["skipped"] += len(rows) - len(new_rows)
+
+def _enum_value(value) -> str:
+    return value.value if hasattr(value, "value") else str(value)
+
+# Global instance
+rent_invoicing_service = RentInvoicingService()
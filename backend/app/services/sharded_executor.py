@@ -0,0 +1,151 @@
+"""
+Sharded Job Execution
+Splits portfolio-wide background work into shards of properties and runs the
+shards in parallel, each with its own session and transaction
+"""
+
+import logging
+import os
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.property import Property
+from ..models.tenant import Tenant
+
+logger = logging.getLogger(__name__)
+
+# Keep below the engine pool size (10 + 20 overflow) so request handlers still get connections
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "4"))
+SHARD_MAX_RETRIES = int(os.getenv("SHARD_MAX_RETRIES", "2"))
+
+class ShardedExecutor:
+    """
+    Runs work(db, property_ids) once per shard on a thread pool.
+
+    Properties are spread over shards by tenant count so shards finish at
+    about the same time. Each shard gets a fresh session; it is committed
+    when work returns and rolled back (then retried) when it raises.
+    Shard results are merged with merge_results.
+    """
+
+    def __init__(self, max_workers: int = SHARD_WORKERS, max_retries: int = SHARD_MAX_RETRIES):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+
+    def run(
+        self,
+        work: Callable[[Session, List[int]], Dict],
+        property_ids: Optional[List[int]] = None,
+        shard_count: Optional[int] = None,
+        job_name: str = "sharded job"
+    ) -> Dict:
+        """
+        Run work over all properties (or the given ones).
+        Returns the merged shard results plus shard bookkeeping:
+        shards, failed_shards and errors.
+        """
+        shards = self.build_shards(property_ids, shard_count or self.max_workers)
+        result: Dict = {"shards": len(shards), "failed_shards": 0, "errors": []}
+
+        if not shards:
+            return result
+
+        started = time_module.monotonic()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(shards)), thread_name_prefix="shard") as executor:
+            futures = {
+                executor.submit(self._run_shard, work, shard, index, job_name): index
+                for index, shard in enumerate(shards)
+            }
+            for future in as_completed(futures):
+                shard_result, error = future.result()
+                if error:
+                    result["failed_shards"] += 1
+                    result["errors"].append(f"Shard {futures[future]}: {error}")
+                else:
+                    self.merge_results(result, shard_result)
+
+        logger.info(
+            f"{job_name}: {len(shards)} shards in {time_module.monotonic() - started:.2f}s "
+            f"({result['failed_shards']} failed)"
+        )
+        return result
+
+    def build_shards(self, property_ids: Optional[List[int]], shard_count: int) -> List[List[int]]:
+        """Assign properties to shards, heaviest (most tenants) first, each to the lightest shard"""
+        db = SessionLocal()
+        try:
+            if property_ids is None:
+                property_ids = [row[0] for row in db.query(Property.id).all()]
+            if not property_ids:
+                return []
+
+            weights = dict(
+                db.query(Tenant.property_id, func.count(Tenant.id)).filter(
+                    Tenant.property_id.in_(property_ids)
+                ).group_by(Tenant.property_id).all()
+            )
+        finally:
+            db.close()
+
+        shard_count = max(1, min(shard_count, len(property_ids)))
+        shards: List[List[int]] = [[] for _ in range(shard_count)]
+        loads = [0] * shard_count
+
+        for property_id in sorted(property_ids, key=lambda pid: weights.get(pid, 0), reverse=True):
+            lightest = loads.index(min(loads))
+            shards[lightest].append(property_id)
+            # Count empty properties as 1 so they are spread out too
+            loads[lightest] += weights.get(property_id, 0) or 1
+
+        return [shard for shard in shards if shard]
+
+    def _run_shard(self, work: Callable[[Session, List[int]], Dict], property_ids: List[int], index: int, job_name: str):
+        """Run one shard in its own transaction, retrying with backoff. Returns (result, error)."""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            db = SessionLocal()
+            try:
+                shard_result = work(db, property_ids) or {}
+                db.commit()
+                return shard_result, None
+            except Exception as e:
+                db.rollback()
+                last_error = str(e)
+                logger.warning(f"{job_name}: shard {index} attempt {attempt + 1} failed: {last_error}")
+            finally:
+                db.close()
+
+            if attempt < self.max_retries:
+                time_module.sleep(0.5 * (2 ** attempt))
+
+        logger.error(f"{job_name}: shard {index} gave up after {self.max_retries + 1} attempts")
+        return None, last_error
+
+    @staticmethod
+    def merge_results(target: Dict, source: Dict) -> Dict:
+        """Merge shard results: numbers are summed, lists concatenated, dicts merged recursively"""
+        for key, value in source.items():
+            if key not in target:
+                if isinstance(value, list):
+                    target[key] = list(value)
+                elif isinstance(value, dict):
+                    target[key] = ShardedExecutor.merge_results({}, value)
+                else:
+                    target[key] = value
+            elif isinstance(value, bool):
+                continue
+            elif isinstance(value, (int, float)) and isinstance(target[key], (int, float)):
+                target[key] += value
+            elif isinstance(value, list) and isinstance(target[key], list):
+                target[key].extend(value)
+            elif isinstance(value, dict) and isinstance(target[key], dict):
+                ShardedExecutor.merge_results(target[key], value)
+        return target
+
+# Global instance
+sharded_executor = ShardedExecutor()
@@ -0,0 +1,415 @@
+"""
+Statement Import
+Parses MTN, Airtel and bank statements (CSV or Excel) with pandas, matches
+credit lines to tenants and open rent payments with joins, and records the
+matched lines as paid payments with their journal entries in one transaction
+"""
+
+import io
+import logging
+import os
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.accounting import AccountingTransaction, JournalEntry, Account
+from ..models.enums import PaymentStatus, PaymentType
+from ..models.payment import Payment
+from ..models.property import Property
+from ..models.tenant import Tenant
+from .tenant_ledger import tenant_ledger_service
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_MAX_ROWS = int(os.getenv("STATEMENT_MAX_ROWS", "20000"))
+# Statement amounts within this of an open payment's amount settle it
+AMOUNT_TOLERANCE = 1.0
+JOURNAL_BATCH_SIZE = 500
+
+# Accepted header names per field, compared lower-cased and stripped
+COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "value date", "posting date", "txn date", "date/time"],
+    "amount": ["amount", "credit", "credit amount", "deposit", "amount (ugx)", "paid in"],
+    "phone": ["phone", "phone number", "msisdn", "sender", "from", "payer", "sender number", "from number"],
+    "reference": ["reference", "ref", "transaction id", "transaction reference", "txn id", "receipt no", "receipt number"],
+    "name": ["name", "sender name", "payer name", "from name", "description", "narration", "details"],
+}
+
+SUPPORTED_SOURCES = {"mtn", "airtel", "bank"}
+SOURCE_PAYMENT_METHODS = {
+    "mtn": "mtn_mobile_money",
+    "airtel": "airtel_money",
+    "bank": "bank_transfer",
+}
+
+class StatementError(ValueError):
+    """Raised when an upload cannot be read as a statement"""
+
+class StatementImportService:
+    """
+    Statement lines are normalized column-wise (phones to their last 9
+    digits, references to upper-case alphanumerics) and matched with
+    DataFrame merges:
+
+    1. reference -> an open payment with that reference number
+    2. phone -> the single tenant with that phone in scope, then that
+       tenant's oldest open payment when the amount matches it
+
+    Lines whose reference is already recorded on a paid payment are
+    duplicates, as are phone matches that repeat a paid payment of the
+    tenant on the same date with the same amount (re-imported or overlapping
+    statements). Matched lines either settle the open payment or create a
+    new paid rent payment for the tenant.
+    """
+
+    def parse(self, content: bytes, filename: str) -> pd.DataFrame:
+        """Read an upload into date, amount, phone, reference and name columns"""
+        try:
+            if (filename or "").lower().endswith((".xlsx", ".xls")):
+                frame = pd.read_excel(io.BytesIO(content), dtype=str)
+            else:
+                frame = pd.read_csv(io.BytesIO(content), dtype=str, sep=None, engine="python")
+        except Exception as e:
+            raise StatementError(f"Could not read statement: {str(e)}")
+
+        if len(frame) > STATEMENT_MAX_ROWS:
+            raise StatementError(f"Statement has {len(frame)} rows; the limit is {STATEMENT_MAX_ROWS}")
+
+        headers = {str(column).strip().lower(): column for column in frame.columns}
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in headers:
+                    columns[field] = headers[alias]
+                    break
+
+        missing = [field for field in ("date", "amount") if field not in columns]
+        if missing or ("phone" not in columns and "reference" not in columns):
+            raise StatementError(
+                "Statement needs date and amount columns and a phone or reference column; "
+                f"found: {', '.join(str(column) for column in frame.columns)}"
+            )
+
+        lines = pd.DataFrame({"line": range(1, len(frame) + 1)})
+        for field in COLUMN_ALIASES:
+            lines[field] = frame[columns[field]].values if field in columns else None
+        return self.normalize(lines)
+
+    @staticmethod
+    def normalize(lines: pd.DataFrame) -> pd.DataFrame:
+        """Vectorized clean-up; lines without a positive amount or a readable date are marked invalid"""
+        lines["amount"] = pd.to_numeric(
+            lines["amount"].astype(str).str.replace(r"[^\d.\-]", "", regex=True),
+            errors="coerce"
+        )
+        lines["paid_date"] = pd.to_datetime(lines["date"], errors="coerce", dayfirst=True).dt.date
+        for field in ("phone", "reference", "name"):
+            lines[field] = lines[field].fillna("").astype(str).str.strip()
+        lines["phone_key"] = lines["phone"].str.replace(r"\D", "", regex=True).str[-9:]
+        lines["reference_key"] = lines["reference"].str.upper().str.replace(r"[^A-Z0-9]", "", regex=True)
+
+        valid = lines["amount"].gt(0) & lines["paid_date"].notna()
+        lines["status"] = "unmatched"
+        lines.loc[~valid, "status"] = "invalid"
+        # The same reference twice in one file is one payment
+        repeated = lines["reference_key"].ne("") & lines.duplicated("reference_key", keep="first")
+        lines.loc[valid & repeated, "status"] = "duplicate"
+        return lines
+
+    def match(self, db: Session, lines: pd.DataFrame, owner_id: Optional[int] = None, property_id: Optional[int] = None) -> pd.DataFrame:
+        """Add tenant_id, unit_id, payment_id (open payment to settle), status and action to each line"""
+        tenant_scope = self._tenant_scope(owner_id, property_id)
+        tenants = self._tenants_frame(db, tenant_scope)
+        open_payments = self._open_payments_frame(db, tenant_scope)
+
+        lines = lines.assign(tenant_id=pd.NA, unit_id=pd.NA, payment_id=pd.NA, match_type=None, action=None)
+        pending = lines["status"].eq("unmatched")
+
+        # Already imported: the reference is on a paid payment
+        references = lines.loc[pending & lines["reference_key"].ne(""), "reference"].unique().tolist()
+        if references:
+            paid_keys = self._paid_reference_keys(db, references)
+            lines.loc[pending & lines["reference_key"].isin(paid_keys), "status"] = "duplicate"
+            pending = lines["status"].eq("unmatched")
+
+        # 1. Reference -> open payment
+        if not open_payments.empty:
+            by_reference = open_payments[open_payments["reference_key"].ne("")].drop_duplicates("reference_key", keep=False)
+            joined = lines.loc[pending, ["line", "reference_key"]].merge(by_reference, on="reference_key", how="inner")
+            lines = self._apply_matches(lines, joined, "reference")
+            pending = lines["status"].eq("unmatched")
+
+        # 2. Phone -> the one tenant with that phone
+        unique_phones = tenants[tenants["phone_key"].ne("")].drop_duplicates("phone_key", keep=False)
+        joined = lines.loc[pending & lines["phone_key"].ne(""), ["line", "phone_key", "amount"]].merge(
+            unique_phones[["phone_key", "tenant_id", "unit_id"]], on="phone_key", how="inner"
+        )
+        if not joined.empty and not open_payments.empty:
+            # The tenant's oldest open payment, when the amount covers it
+            oldest = open_payments.sort_values("due_date").drop_duplicates("tenant_id", keep="first")
+            joined = joined.merge(
+                oldest[["tenant_id", "payment_id", "open_amount"]], on="tenant_id", how="left"
+            )
+            settles = (joined["amount"] - joined["open_amount"]).abs().le(AMOUNT_TOLERANCE)
+            joined.loc[~settles, "payment_id"] = pd.NA
+            # Two lines must not settle the same open payment
+            joined.loc[joined["payment_id"].notna() & joined.duplicated("payment_id", keep="first"), "payment_id"] = pd.NA
+        lines = self._apply_matches(lines, joined, "phone")
+        lines = self._mark_recorded(db, lines)
+
+        lines.loc[lines["status"].eq("matched") & lines["payment_id"].isna(), "action"] = "create"
+        lines.loc[lines["status"].eq("matched") & lines["payment_id"].notna(), "action"] = "settle"
+        lines["tenant_name"] = lines["tenant_id"].map(dict(zip(tenants["tenant_id"], tenants["tenant_name"])))
+        return lines
+
+    @staticmethod
+    def _apply_matches(lines: pd.DataFrame, joined: pd.DataFrame, match_type: str) -> pd.DataFrame:
+        if joined.empty:
+            return lines
+        joined = joined.drop_duplicates("line", keep=False).set_index("line")
+        rows = lines["line"].isin(joined.index)
+        for column in ("tenant_id", "unit_id", "payment_id"):
+            if column in joined.columns:
+                lines.loc[rows, column] = lines.loc[rows, "line"].map(joined[column]).values
+        lines.loc[rows, "status"] = "matched"
+        lines.loc[rows, "match_type"] = match_type
+        return lines
+
+    @staticmethod
+    def _mark_recorded(db: Session, lines: pd.DataFrame) -> pd.DataFrame:
+        """Mark phone matches already recorded as a paid payment (tenant, date, amount) as duplicates"""
+        candidates = lines.loc[
+            lines["status"].eq("matched") & lines["match_type"].eq("phone"),
+            ["line", "tenant_id", "paid_date", "amount"]
+        ]
+        if candidates.empty:
+            return lines
+        candidates = candidates.astype({"tenant_id": int})
+
+        rows = db.query(Payment.id, Payment.tenant_id, Payment.paid_date, Payment.amount).filter(
+            Payment.status == PaymentStatus.PAID,
+            Payment.tenant_id.in_(candidates["tenant_id"].unique().tolist()),
+            Payment.paid_date.in_(candidates["paid_date"].unique().tolist())
+        ).all()
+        if not rows:
+            return lines
+        paid = pd.DataFrame(rows, columns=["paid_payment_id", "tenant_id", "paid_date", "paid_amount"])
+        paid["paid_amount"] = pd.to_numeric(paid["paid_amount"], errors="coerce")
+
+        joined = candidates.merge(paid, on=["tenant_id", "paid_date"], how="inner")
+        joined = joined[(joined["amount"] - joined["paid_amount"]).abs().le(AMOUNT_TOLERANCE)]
+        # Each recorded payment accounts for one line
+        joined = joined.drop_duplicates("paid_payment_id", keep="first").drop_duplicates("line", keep="first")
+
+        recorded = lines["line"].isin(joined["line"])
+        lines.loc[recorded, "status"] = "duplicate"
+        lines.loc[recorded, "payment_id"] = pd.NA
+        return lines
+
+    @staticmethod
+    def _tenant_scope(owner_id: Optional[int], property_id: Optional[int]):
+        """Ids of the active tenants an import may match"""
+        scope = select(Tenant.id).where(Tenant.is_active == True)
+        if property_id:
+            scope = scope.where(Tenant.property_id == property_id)
+        if owner_id is not None:
+            scope = scope.where(Tenant.property_id.in_(select(Property.id).where(Property.owner_id == owner_id)))
+        return scope
+
+    def _tenants_frame(self, db: Session, tenant_scope) -> pd.DataFrame:
+        rows = db.query(Tenant.id, Tenant.phone, Tenant.unit_id, Tenant.first_name, Tenant.last_name).filter(
+            Tenant.id.in_(tenant_scope)
+        ).all()
+        tenants = pd.DataFrame(rows, columns=["tenant_id", "phone", "unit_id", "first_name", "last_name"])
+        tenants["phone_key"] = tenants["phone"].fillna("").astype(str).str.replace(r"\D", "", regex=True).str[-9:]
+        tenants["tenant_name"] = tenants["first_name"] + " " + tenants["last_name"]
+        return tenants
+
+    def _open_payments_frame(self, db: Session, tenant_scope) -> pd.DataFrame:
+        rows = db.query(
+            Payment.id, Payment.tenant_id, Payment.unit_id, Payment.amount, Payment.due_date, Payment.reference_number
+        ).filter(
+            Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.OVERDUE]),
+            Payment.tenant_id.in_(tenant_scope)
+        ).all()
+        frame = pd.DataFrame(rows, columns=["payment_id", "tenant_id", "unit_id", "open_amount", "due_date", "reference_number"])
+        frame["open_amount"] = pd.to_numeric(frame["open_amount"], errors="coerce")
+        frame["reference_key"] = frame["reference_number"].fillna("").astype(str).str.upper().str.replace(r"[^A-Z0-9]", "", regex=True)
+        return frame
+
+    def _paid_reference_keys(self, db: Session, references: List[str]) -> set:
+        rows = db.query(Payment.reference_number).filter(
+            Payment.status == PaymentStatus.PAID,
+            Payment.reference_number.in_(references)
+        ).all()
+        return {"".join(char for char in str(reference).upper() if char.isalnum()) for (reference,) in rows}
+
+    @staticmethod
+    def preview(lines: pd.DataFrame) -> Dict:
+        """Counts per status and one entry per line, for review before committing"""
+        counts = lines["status"].value_counts().to_dict()
+        return {
+            "total_lines": int(len(lines)),
+            "matched": int(counts.get("matched", 0)),
+            "unmatched": int(counts.get("unmatched", 0)),
+            "duplicates": int(counts.get("duplicate", 0)),
+            "invalid": int(counts.get("invalid", 0)),
+            "matched_amount": float(lines.loc[lines["status"].eq("matched"), "amount"].sum()),
+            "to_settle": int(lines["action"].eq("settle").sum()),
+            "to_create": int(lines["action"].eq("create").sum()),
+            "lines": [
+                {
+                    "line": int(row.line),
+                    "date": str(row.paid_date) if pd.notna(row.paid_date) else None,
+                    "amount": float(row.amount) if pd.notna(row.amount) else None,
+                    "phone": row.phone or None,
+                    "reference": row.reference or None,
+                    "name": row.name or None,
+                    "status": row.status,
+                    "match_type": row.match_type,
+                    "action": row.action if isinstance(row.action, str) else None,
+                    "tenant_id": int(row.tenant_id) if pd.notna(row.tenant_id) else None,
+                    "tenant_name": row.tenant_name if isinstance(row.tenant_name, str) else None,
+                    "payment_id": int(row.payment_id) if pd.notna(row.payment_id) else None
+                }
+                for row in lines.itertuples(index=False)
+            ]
+        }
+
+    def import_statement(
+        self,
+        db: Session,
+        content: bytes,
+        filename: str,
+        source: str,
+        user_id: int,
+        owner_id: Optional[int] = None,
+        property_id: Optional[int] = None,
+        commit: bool = False
+    ) -> Dict:
+        """
+        Parse and match a statement. With commit, record matched lines: settle
+        open payments, create paid rent payments for the rest, and add a
+        balanced journal transaction per payment, all in one transaction.
+        """
+        if source not in SUPPORTED_SOURCES:
+            raise StatementError(f"Unknown statement source '{source}'; use one of {', '.join(sorted(SUPPORTED_SOURCES))}")
+
+        lines = self.match(db, self.parse(content, filename), owner_id, property_id)
+        result = self.preview(lines)
+        result["committed"] = False
+        if not commit or not result["matched"]:
+            return result
+
+        payment_method = SOURCE_PAYMENT_METHODS[source]
+        matched = lines[lines["status"].eq("matched")]
+        now = datetime.utcnow()
+
+        try:
+            settle = matched[matched["action"].eq("settle")]
+            # Keep an open payment's own reference (e.g. an invoice number); the
+            # statement reference is recorded on its journal transaction
+            references = dict(db.query(Payment.id, Payment.reference_number).filter(
+                Payment.id.in_([int(payment_id) for payment_id in settle["payment_id"]])
+            ).all()) if not settle.empty else {}
+            db.bulk_update_mappings(Payment, [
+                {
+                    "id": int(row.payment_id),
+                    "status": PaymentStatus.PAID,
+                    "paid_date": row.paid_date,
+                    "payment_method": payment_method,
+                    "reference_number": references.get(int(row.payment_id)) or row.reference or None,
+                    "updated_at": now
+                }
+                for row in settle.itertuples(index=False)
+            ])
+
+            created = [
+                Payment(
+                    unit_id=int(row.unit_id),
+                    tenant_id=int(row.tenant_id),
+                    payer_id=user_id,
+                    amount=float(row.amount),
+                    payment_type=PaymentType.RENT,
+                    status=PaymentStatus.PAID,
+                    due_date=row.paid_date,
+                    paid_date=row.paid_date,
+                    payment_method=payment_method,
+                    reference_number=row.reference or None,
+                    notes=f"Imported from {source} statement {filename}, line {int(row.line)}"
+                )
+                for row in matched[matched["action"].eq("create")].itertuples(index=False)
+            ]
+            db.add_all(created)
+            db.flush()
+
+            recorded = [
+                (int(row.payment_id), float(row.amount), row.paid_date, row.reference or None, int(row.unit_id))
+                for row in settle.itertuples(index=False)
+            ] + [
+                (payment.id, float(payment.amount), payment.paid_date, payment.reference_number, payment.unit_id)
+                for payment in created
+            ]
+            result["journal_transactions"] = self._record_journal(db, recorded, user_id)
+            tenant_ledger_service.rebuild(db, sorted({int(tenant_id) for tenant_id in matched["tenant_id"]}))
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        result["committed"] = True
+        result["settled"] = len(settle)
+        result["created"] = len(created)
+        logger.info(
+            f"Imported {source} statement {filename}: {len(settle)} payments settled, {len(created)} created"
+        )
+        return result
+
+    def _record_journal(self, db: Session, recorded: List[tuple], user_id: int) -> int:
+        """Debit bank, credit rental income for each recorded payment, inserted in batches"""
+        bank_account = db.query(Account).filter(Account.code == "1010").first()  # Bank Account
+        rental_income = db.query(Account).filter(Account.code == "4010").first()  # Rental Income
+        if not bank_account or not rental_income or not recorded:
+            if recorded:
+                logger.warning("Chart of accounts not seeded; statement import recorded no journal entries")
+            return 0
+
+        from ..models.unit import Unit
+        property_by_unit = dict(db.query(Unit.id, Unit.property_id).filter(
+            Unit.id.in_({unit_id for *_, unit_id in recorded})
+        ).all())
+
+        for start in range(0, len(recorded), JOURNAL_BATCH_SIZE):
+            db.add_all([
+                AccountingTransaction(
+                    date=paid_date or date.today(),
+                    description=f"Rent payment - {payment_id}",
+                    reference=reference,
+                    property_id=property_by_unit.get(unit_id),
+                    created_by_user_id=user_id,
+                    journal_entries=[
+                        JournalEntry(
+                            account_id=bank_account.id,
+                            debit_amount=amount,
+                            credit_amount=0,
+                            description=f"Rent received - {payment_id}"
+                        ),
+                        JournalEntry(
+                            account_id=rental_income.id,
+                            debit_amount=0,
+                            credit_amount=amount,
+                            description=f"Rent income - {payment_id}"
+                        )
+                    ]
+                )
+                for payment_id, amount, paid_date, reference, unit_id in recorded[start:start + JOURNAL_BATCH_SIZE]
+            ])
+            db.flush()
+        return len(recorded)
+
+# Global instance
+statement_import_service = StatementImportService()
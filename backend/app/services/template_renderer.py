@@ -0,0 +1,154 @@
+"""
+Message Template Rendering
+Compiles message bodies with {placeholder} variables into render plans once,
+caches them by template id and version, and renders them per recipient
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ..models.message_template import MessageTemplate
+
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+
+# Variables a recipient row can fill in
+TEMPLATE_VARIABLES = ["tenant_name", "amount", "due_date", "unit_number"]
+
+# GSM 03.38 basic character set (plus the extension table, which costs two characters)
+GSM_BASIC_CHARS = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM_EXTENDED_CHARS = set("^{}\\[~]|€\f")
+
+SMS_MAX_SEGMENTS = int(os.getenv("SMS_MAX_SEGMENTS", "1"))
+PLAN_CACHE_SIZE = 256
+
+class TemplateError(ValueError):
+    """Raised when a message uses placeholders no recipient row can fill"""
+
+class RenderPlan:
+    """
+    A message body split once into literal text and placeholder names.
+    render() joins the parts for one recipient without rescanning the text.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts: List[Tuple[bool, str]] = []  # (is_placeholder, literal text or variable name)
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > position:
+                self.parts.append((False, text[position:match.start()]))
+            self.parts.append((True, match.group(1)))
+            position = match.end()
+        if position < len(text):
+            self.parts.append((False, text[position:]))
+
+        self.variables = [name for is_placeholder, name in self.parts if is_placeholder]
+        self.unknown_variables = sorted(set(self.variables) - set(TEMPLATE_VARIABLES))
+
+    def validate(self):
+        if self.unknown_variables:
+            placeholders = ", ".join(f"{{{name}}}" for name in self.unknown_variables)
+            raise TemplateError(
+                f"Unknown placeholders: {placeholders}. "
+                f"Available: {', '.join(f'{{{name}}}' for name in TEMPLATE_VARIABLES)}"
+            )
+        return self
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(
+            values.get(value, f"{{{value}}}") if is_placeholder else value
+            for is_placeholder, value in self.parts
+        )
+
+    def render_sms(self, values: Dict[str, str], max_segments: int = SMS_MAX_SEGMENTS) -> str:
+        """
+        Render for SMS within max_segments. When too long, literal text is cut
+        at the limit but a placeholder value is either included whole or dropped.
+        """
+        full = self.render(values)
+        if sms_segments(full) <= max_segments:
+            return full
+
+        limit = sms_capacity(full, max_segments)
+        rendered = ""
+        for is_placeholder, value in self.parts:
+            piece = values.get(value, f"{{{value}}}") if is_placeholder else value
+            if sms_length(rendered + piece) <= limit:
+                rendered += piece
+                continue
+            if not is_placeholder:
+                for char in piece:
+                    if sms_length(rendered + char) > limit:
+                        break
+                    rendered += char
+            break
+        return rendered.rstrip()
+
+    def substitutions(self, values: Dict[str, str]) -> Dict[str, str]:
+        """SendGrid substitutions for the placeholders this plan uses"""
+        return {f"{{{name}}}": values.get(name, "") for name in dict.fromkeys(self.variables)}
+
+def is_gsm(text: str) -> bool:
+    return all(char in GSM_BASIC_CHARS or char in GSM_EXTENDED_CHARS for char in text)
+
+def sms_length(text: str) -> int:
+    """Length in encoding units: GSM extension characters count twice"""
+    if is_gsm(text):
+        return sum(2 if char in GSM_EXTENDED_CHARS else 1 for char in text)
+    return len(text)
+
+def sms_capacity(text: str, segments: int) -> int:
+    """Characters that fit in the given number of segments for this text's encoding"""
+    single, multi = (160, 153) if is_gsm(text) else (70, 67)
+    return single if segments <= 1 else multi * segments
+
+def sms_segments(text: str) -> int:
+    """Number of SMS segments the text is billed as"""
+    length = sms_length(text)
+    single, multi = (160, 153) if is_gsm(text) else (70, 67)
+    if length <= single:
+        return 1
+    return -(-length // multi)
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_message(text: str) -> RenderPlan:
+    """Compile an ad-hoc message body (cached by text)"""
+    return RenderPlan(text or "")
+
+_template_plans: "OrderedDict[Tuple[int, str], RenderPlan]" = OrderedDict()
+_template_plans_lock = threading.Lock()
+
+def get_template_plan(template: MessageTemplate) -> RenderPlan:
+    """Compiled plan for a template body, cached by template id and version (updated_at)"""
+    version = template.updated_at.isoformat() if template.updated_at else ""
+    key = (template.id, version)
+
+    with _template_plans_lock:
+        plan = _template_plans.get(key)
+        if plan is not None:
+            _template_plans.move_to_end(key)
+            return plan
+
+    plan = RenderPlan(template.body or "")
+    with _template_plans_lock:
+        _template_plans[key] = plan
+        while len(_template_plans) > PLAN_CACHE_SIZE:
+            _template_plans.popitem(last=False)
+    return plan
+
+def recipient_values(recipient) -> Dict[str, str]:
+    """Template variable values from a recipient row (tenant columns plus unit_number)"""
+    unit_number: Optional[str] = getattr(recipient, "unit_number", None)
+    return {
+        "tenant_name": f"{recipient.first_name} {recipient.last_name}",
+        "amount": str(recipient.monthly_rent),
+        "due_date": str(recipient.next_payment_due),
+        "unit_number": str(unit_number if unit_number is not None else "N/A")
+    }
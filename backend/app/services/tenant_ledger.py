@@ -0,0 +1,466 @@
+"""
+Tenant Ledger
+Charge and payment lines per tenant with a maintained running balance and
+paid-through date, so status checks, dashboards and reminders read one
+balance row instead of re-aggregating payment history
+"""
+
+import calendar
+import logging
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.enums import PaymentStatus, PaymentType
+from ..models.mobile_payment import MobilePayment
+from ..models.payment import Payment
+from ..models.tenant import Tenant
+from ..models.tenant_ledger import TenantLedgerEntry, TenantBalance
+from .payment_monitor import payment_monitor
+
+logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 500
+
+# Rent periods starting before this date (YYYY-MM-DD) count as settled before
+# the ledger existed; unset, only each tenant's next_payment_due is used
+LEDGER_CUTOVER_DATE = os.getenv("LEDGER_CUTOVER_DATE")
+
+# Payment types that pay rent; any other payment is also charged to the ledger
+RENT_PAYMENT_TYPES = {PaymentType.RENT, PaymentType.QR_CODE}
+
+def add_months(day: date, months: int) -> date:
+    """Same day of month, months later (clamped to the month's last day)"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+def period_key(day: date) -> int:
+    """Rent period id, e.g. 202501"""
+    return day.year * 100 + day.month
+
+def rent_periods(move_in: date, until: date) -> List[date]:
+    """Charge dates of every rent period from move-in up to and including until"""
+    periods = []
+    charge_date = move_in
+    months = 0
+    while charge_date <= until:
+        periods.append(charge_date)
+        months += 1
+        charge_date = add_months(move_in, months)
+    return periods
+
+class TenantLedgerService:
+    """
+    Lines are posted with post_charge/post_payment in the caller's
+    transaction (the caller commits). Each post locks the tenant's balance
+    row, so concurrent posts for one tenant serialize, and is idempotent per
+    (source_type, source_id, entry_type).
+
+    paid_through is derived from payments towards rent: what is paid beyond
+    non-rent charges, in whole months of monthly_rent from the move-in date.
+
+    Rent from before the ledger has no payment rows, so the first build adds
+    an opening credit for periods the tenant had already settled: those
+    before their next_payment_due (the current period too if they were
+    marked paid), or before LEDGER_CUTOVER_DATE. The credit is stored on the
+    balance row and later rebuilds replay it, since next_payment_due itself
+    moves with every payment.
+    """
+
+    def __init__(self, cutover_date: Optional[date] = None):
+        self.cutover_date = cutover_date or (date.fromisoformat(LEDGER_CUTOVER_DATE) if LEDGER_CUTOVER_DATE else None)
+
+    def post_charge(
+        self, db: Session, tenant_id: int, amount, entry_date: date,
+        source_type: str, source_id: int, description: str = None
+    ) -> Optional[TenantLedgerEntry]:
+        return self._post(db, tenant_id, "charge", amount, entry_date, source_type, source_id, description)
+
+    def post_payment(
+        self, db: Session, tenant_id: int, amount, entry_date: date,
+        source_type: str, source_id: int, description: str = None
+    ) -> Optional[TenantLedgerEntry]:
+        return self._post(db, tenant_id, "payment", amount, entry_date, source_type, source_id, description)
+
+    def post_rent_charge(self, db: Session, tenant: Tenant, charge_date: date) -> Optional[TenantLedgerEntry]:
+        """Charge one period's rent (idempotent per tenant and month)"""
+        return self.post_charge(
+            db, tenant.id, tenant.monthly_rent, charge_date,
+            "rent", period_key(charge_date), f"Rent {charge_date.strftime('%B %Y')}"
+        )
+
+    def post_payment_record(self, db: Session, payment: Payment):
+        """Post a payments row: non-rent types are charged, and paid rows are paid"""
+        if not payment.tenant_id:
+            return
+        if payment.payment_type not in RENT_PAYMENT_TYPES:
+            self.post_charge(
+                db, payment.tenant_id, payment.amount, payment.due_date or date.today(),
+                "payment", payment.id, f"{_enum_value(payment.payment_type).replace('_', ' ').title()} charge"
+            )
+        if payment.status == PaymentStatus.PAID:
+            self.post_payment(
+                db, payment.tenant_id, payment.amount, payment.paid_date or date.today(),
+                "payment", payment.id, f"Payment {payment.reference_number or payment.id}"
+            )
+
+    def post_mobile_payment(self, db: Session, mobile_payment: MobilePayment):
+        """Post a paid mobile payment that belongs to a tenant"""
+        if not mobile_payment.tenant_id or mobile_payment.status != PaymentStatus.PAID:
+            return
+        paid_at = mobile_payment.completed_at or mobile_payment.initiated_at or datetime.utcnow()
+        self.post_payment(
+            db, mobile_payment.tenant_id, mobile_payment.amount, paid_at.date(),
+            "mobile_payment", mobile_payment.id, f"Mobile money {mobile_payment.transaction_id or mobile_payment.external_id}"
+        )
+
+    def _post(
+        self, db: Session, tenant_id: int, entry_type: str, amount, entry_date: date,
+        source_type: str, source_id: int, description: Optional[str]
+    ) -> Optional[TenantLedgerEntry]:
+        amount = Decimal(str(amount or 0))
+        if amount <= 0:
+            return None
+
+        balance = self._lock_balance(db, tenant_id)
+        if balance is None:
+            # First line for this tenant: create the balance row if absent, then
+            # reconstruct history so the balance starts right. A concurrent first
+            # post fails the insert and waits on the row lock for the rebuild.
+            try:
+                with db.begin_nested():
+                    db.execute(insert(TenantBalance).values(tenant_id=tenant_id))
+            except IntegrityError:
+                pass
+            else:
+                # The line being posted is not part of the pre-ledger state
+                self._rebuild_chunk(db, [tenant_id], date.today(), new_source=(source_type, source_id))
+            balance = self._lock_balance(db, tenant_id)
+
+        exists = db.query(TenantLedgerEntry.id).filter(
+            TenantLedgerEntry.tenant_id == tenant_id,
+            TenantLedgerEntry.source_type == source_type,
+            TenantLedgerEntry.source_id == source_id,
+            TenantLedgerEntry.entry_type == entry_type
+        ).first()
+        if exists:
+            return None
+
+        tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+        if entry_type == "charge":
+            balance.total_charged = (balance.total_charged or 0) + amount
+            if source_type != "rent":
+                balance.other_charged = (balance.other_charged or 0) + amount
+        else:
+            balance.total_paid = (balance.total_paid or 0) + amount
+        balance.balance = (balance.total_charged or 0) - (balance.total_paid or 0)
+        balance.paid_through = self._paid_through(tenant, balance.total_paid, balance.other_charged)
+
+        entry = TenantLedgerEntry(
+            tenant_id=tenant_id,
+            entry_type=entry_type,
+            amount=amount,
+            balance_after=balance.balance,
+            entry_date=entry_date,
+            description=description,
+            source_type=source_type,
+            source_id=source_id
+        )
+        db.add(entry)
+        db.flush()
+        balance.last_entry_id = entry.id
+        return entry
+
+    def sync_tenant(self, db: Session, tenant: Tenant) -> bool:
+        """
+        Set the tenant's next due date and payment status from the ledger
+        balance. The due date only moves forward; a balance still owed gives
+        the due/overdue/pending status the payment monitor would derive.
+        Returns False if the ledger cannot tell (no balance or rent terms).
+        """
+        balance = db.query(TenantBalance).filter(TenantBalance.tenant_id == tenant.id).first()
+        if not balance or not tenant.move_in_date or not tenant.monthly_rent:
+            return False
+        if balance.paid_through:
+            next_due = balance.paid_through + timedelta(days=1)
+            if not tenant.next_payment_due or next_due > tenant.next_payment_due:
+                tenant.next_payment_due = next_due
+        if (balance.balance or 0) <= 0:
+            tenant.rent_payment_status = "paid"
+        else:
+            tenant.rent_payment_status = payment_monitor._determine_tenant_payment_status(tenant)
+        tenant.updated_at = datetime.utcnow()
+        return True
+
+    @staticmethod
+    def _lock_balance(db: Session, tenant_id: int) -> Optional[TenantBalance]:
+        return db.query(TenantBalance).filter(
+            TenantBalance.tenant_id == tenant_id
+        ).with_for_update().populate_existing().first()
+
+    @staticmethod
+    def _paid_through(tenant: Optional[Tenant], total_paid, other_charged) -> Optional[date]:
+        if not tenant or not tenant.move_in_date or not tenant.monthly_rent:
+            return None
+        rent_paid = max(Decimal(str(total_paid or 0)) - Decimal(str(other_charged or 0)), Decimal(0))
+        months = int(rent_paid // Decimal(str(tenant.monthly_rent)))
+        if months == 0:
+            return None
+        return date.fromordinal(add_months(tenant.move_in_date, months).toordinal() - 1)
+
+    def rebuild(
+        self, db: Session, tenant_ids: Optional[List[int]] = None, as_of: Optional[date] = None,
+        reset_opening: bool = False
+    ) -> Dict:
+        """
+        Recreate ledger lines and balances from payments, mobile_payments and
+        monthly rent since move-in, plus the stored opening credit, for the
+        given tenants or all of them. The opening credit is worked out only
+        for tenants without one yet, or for all with reset_opening (e.g. at a
+        cutover). Does not commit.
+        """
+        as_of = as_of or date.today()
+        if tenant_ids is None:
+            tenant_ids = [row[0] for row in db.query(Tenant.id).order_by(Tenant.id).all()]
+
+        summary = {"tenants": 0, "entries": 0}
+        for start in range(0, len(tenant_ids), REBUILD_CHUNK_SIZE):
+            chunk = tenant_ids[start:start + REBUILD_CHUNK_SIZE]
+            summary["entries"] += self._rebuild_chunk(db, chunk, as_of, reset_opening=reset_opening)
+            summary["tenants"] += len(chunk)
+        return summary
+
+    def _rebuild_chunk(
+        self, db: Session, tenant_ids: List[int], as_of: date,
+        reset_opening: bool = False, new_source: Optional[Tuple[str, int]] = None
+    ) -> int:
+        tenants = db.query(Tenant).filter(Tenant.id.in_(tenant_ids)).all()
+
+        stored_opening: Dict[int, Decimal] = {}
+        if not reset_opening:
+            stored_opening = dict(db.query(TenantBalance.tenant_id, TenantBalance.opening_credit).filter(
+                TenantBalance.tenant_id.in_(tenant_ids),
+                TenantBalance.opening_credit != None
+            ).all())
+
+        lines_by_tenant: Dict[int, List[tuple]] = {tenant.id: [] for tenant in tenants}
+        # (entry_date, order, entry_type, amount, source_type, source_id, description); charges sort first
+        for tenant in tenants:
+            if not tenant.move_in_date or not tenant.monthly_rent:
+                continue
+            until = min(as_of, tenant.move_out_date) if tenant.move_out_date else as_of
+            for charge_date in rent_periods(tenant.move_in_date, until):
+                lines_by_tenant[tenant.id].append((
+                    charge_date, 0, "charge", Decimal(str(tenant.monthly_rent)),
+                    "rent", period_key(charge_date), f"Rent {charge_date.strftime('%B %Y')}"
+                ))
+
+        payments = db.query(
+            Payment.id, Payment.tenant_id, Payment.amount, Payment.payment_type, Payment.status,
+            Payment.due_date, Payment.paid_date, Payment.reference_number
+        ).filter(Payment.tenant_id.in_(tenant_ids)).all()
+        for payment in payments:
+            lines = lines_by_tenant.get(payment.tenant_id)
+            if lines is None or not payment.amount:
+                continue
+            amount = Decimal(str(payment.amount))
+            if payment.payment_type not in RENT_PAYMENT_TYPES:
+                lines.append((
+                    payment.due_date or as_of, 0, "charge", amount, "payment", payment.id,
+                    f"{_enum_value(payment.payment_type).replace('_', ' ').title()} charge"
+                ))
+            if payment.status == PaymentStatus.PAID:
+                lines.append((
+                    payment.paid_date or payment.due_date or as_of, 1, "payment", amount, "payment", payment.id,
+                    f"Payment {payment.reference_number or payment.id}"
+                ))
+
+        mobile_payments = db.query(
+            MobilePayment.id, MobilePayment.tenant_id, MobilePayment.amount, MobilePayment.completed_at,
+            MobilePayment.initiated_at, MobilePayment.transaction_id, MobilePayment.external_id
+        ).filter(
+            MobilePayment.tenant_id.in_(tenant_ids),
+            MobilePayment.status == PaymentStatus.PAID
+        ).all()
+        for mobile_payment in mobile_payments:
+            lines = lines_by_tenant.get(mobile_payment.tenant_id)
+            if lines is None or not mobile_payment.amount:
+                continue
+            paid_at = mobile_payment.completed_at or mobile_payment.initiated_at
+            lines.append((
+                paid_at.date() if paid_at else as_of, 1, "payment", Decimal(str(mobile_payment.amount)),
+                "mobile_payment", mobile_payment.id,
+                f"Mobile money {mobile_payment.transaction_id or mobile_payment.external_id}"
+            ))
+
+        db.query(TenantLedgerEntry).filter(TenantLedgerEntry.tenant_id.in_(tenant_ids)).delete(synchronize_session=False)
+        db.query(TenantBalance).filter(TenantBalance.tenant_id.in_(tenant_ids)).delete(synchronize_session=False)
+
+        entries = []
+        balances = []
+        now = datetime.utcnow()
+        for tenant in tenants:
+            opening = stored_opening.get(tenant.id)
+            if opening is None:
+                opening = self._opening_credit(tenant, lines_by_tenant[tenant.id], as_of, new_source)
+            opening = Decimal(str(opening))
+            if opening:
+                lines_by_tenant[tenant.id].append((
+                    tenant.move_in_date, -1, "payment", opening, "opening", 0, "Opening balance"
+                ))
+
+            running = total_charged = total_paid = other_charged = Decimal(0)
+            for entry_date, _, entry_type, amount, source_type, source_id, description in sorted(
+                lines_by_tenant[tenant.id], key=lambda line: (line[0], line[1], line[4], line[5])
+            ):
+                if entry_type == "charge":
+                    running += amount
+                    total_charged += amount
+                    if source_type != "rent":
+                        other_charged += amount
+                else:
+                    running -= amount
+                    total_paid += amount
+                entries.append({
+                    "tenant_id": tenant.id,
+                    "entry_type": entry_type,
+                    "amount": amount,
+                    "balance_after": running,
+                    "entry_date": entry_date,
+                    "description": description,
+                    "source_type": source_type,
+                    "source_id": source_id,
+                    "created_at": now
+                })
+            balances.append({
+                "tenant_id": tenant.id,
+                "balance": running,
+                "total_charged": total_charged,
+                "total_paid": total_paid,
+                "other_charged": other_charged,
+                "paid_through": self._paid_through(tenant, total_paid, other_charged),
+                "opening_credit": opening,
+                "updated_at": now
+            })
+
+        if entries:
+            db.bulk_insert_mappings(TenantLedgerEntry, entries)
+        if balances:
+            db.bulk_insert_mappings(TenantBalance, balances)
+        db.flush()
+        return len(entries)
+
+    def _opening_credit(
+        self, tenant: Tenant, lines: List[tuple], as_of: date, new_source: Optional[Tuple[str, int]] = None
+    ) -> Decimal:
+        """
+        Rent the tenant had settled before the ledger beyond the payments on
+        record (except new_source, the line whose posting triggered the first
+        build): enough to cover every period starting before the
+        settled-until date, so the first build never moves next_payment_due
+        earlier.
+        """
+        if not tenant.move_in_date or not tenant.monthly_rent:
+            return Decimal(0)
+
+        settled_until = [day for day in (tenant.next_payment_due, self.cutover_date) if day]
+        if tenant.rent_payment_status == "paid" and not tenant.next_payment_due:
+            # Marked paid without a due date: the current period is paid
+            settled_until.append(as_of + timedelta(days=1))
+        if not settled_until:
+            return Decimal(0)
+
+        last_day = min(max(settled_until), tenant.move_out_date or date.max) - timedelta(days=1)
+        rent = Decimal(str(tenant.monthly_rent))
+        required = rent * len(rent_periods(tenant.move_in_date, last_day))
+
+        paid = sum(line[3] for line in lines if line[2] == "payment" and (line[4], line[5]) != new_source)
+        other_charged = sum(line[3] for line in lines if line[2] == "charge" and line[4] != "rent")
+        rent_paid = max(paid - other_charged, Decimal(0))
+        return max(required - rent_paid, Decimal(0))
+
+    def accrue_rent(self, db: Session, as_of: Optional[date] = None) -> Dict:
+        """Charge each active tenant's current rent period once its charge date (move-in day) has come"""
+        as_of = as_of or date.today()
+        tenants = db.query(Tenant).filter(
+            Tenant.is_active == True,
+            Tenant.move_in_date <= as_of
+        ).all()
+
+        due = {}
+        for tenant in tenants:
+            if not tenant.monthly_rent:
+                continue
+            months = (as_of.year - tenant.move_in_date.year) * 12 + as_of.month - tenant.move_in_date.month
+            charge_date = add_months(tenant.move_in_date, months)
+            if charge_date > as_of:
+                charge_date = add_months(tenant.move_in_date, months - 1)
+            due[tenant.id] = (tenant, charge_date)
+
+        # Skip tenants already charged for their period with one lookup
+        charged = set()
+        tenant_ids = list(due)
+        for start in range(0, len(tenant_ids), REBUILD_CHUNK_SIZE):
+            chunk = tenant_ids[start:start + REBUILD_CHUNK_SIZE]
+            charged.update(db.query(TenantLedgerEntry.tenant_id, TenantLedgerEntry.source_id).filter(
+                TenantLedgerEntry.tenant_id.in_(chunk),
+                TenantLedgerEntry.source_type == "rent",
+                TenantLedgerEntry.source_id.in_({period_key(due[tenant_id][1]) for tenant_id in chunk})
+            ).all())
+
+        posted = 0
+        for tenant_id, (tenant, charge_date) in due.items():
+            if (tenant_id, period_key(charge_date)) in charged:
+                continue
+            if self.post_rent_charge(db, tenant, charge_date):
+                posted += 1
+        db.commit()
+        return {"tenants": len(due), "charged": posted, "rows_processed": posted}
+
+    def get_balances(self, db: Session, tenant_ids: List[int]) -> Dict[int, TenantBalance]:
+        """Balance rows by tenant id; tenants without a ledger yet get one built first"""
+        if not tenant_ids:
+            return {}
+        balances = {
+            balance.tenant_id: balance
+            for balance in db.query(TenantBalance).filter(TenantBalance.tenant_id.in_(tenant_ids)).all()
+        }
+        missing = [tenant_id for tenant_id in tenant_ids if tenant_id not in balances]
+        if missing:
+            try:
+                with db.begin_nested():
+                    self.rebuild(db, missing)
+            except IntegrityError:
+                # Built concurrently by another request; read theirs
+                pass
+            db.commit()
+            for balance in db.query(TenantBalance).filter(TenantBalance.tenant_id.in_(missing)).all():
+                balances[balance.tenant_id] = balance
+        return balances
+
+    def get_entries(self, db: Session, tenant_id: int, skip: int = 0, limit: int = 100) -> List[TenantLedgerEntry]:
+        """Ledger lines, newest first"""
+        return db.query(TenantLedgerEntry).filter(
+            TenantLedgerEntry.tenant_id == tenant_id
+        ).order_by(TenantLedgerEntry.id.desc()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def months_ahead(balance: Optional[TenantBalance], today: Optional[date] = None) -> int:
+        """Whole months of rent paid beyond the current one"""
+        if not balance or not balance.paid_through:
+            return 0
+        today = today or date.today()
+        months = (balance.paid_through.year - today.year) * 12 + balance.paid_through.month - today.month
+        return max(months, 0)
+
+def _enum_value(value) -> str:
+    return value.value if hasattr(value, "value") else str(value)
+
+# Global instance
+tenant_ledger_service = TenantLedgerService()
@@ -0,0 +1,493 @@
+"""
+Inbound Webhook Events
+Mobile money callbacks are stored raw in inbound_webhook_events, deduplicated
+on provider, transaction id and reported status, and acknowledged straight away. A background
+worker applies them to mobile payments in order per external_id, with
+retries, dead-lettering and replay
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.enums import PaymentStatus, QRCodeStatus
+from ..models.inbound_webhook_event import InboundWebhookEvent
+from ..models.mobile_payment import MobilePayment
+from ..models.qr_payment import QRCodePayment
+from ..models.tenant import Tenant
+from .outbox import enqueue_email
+from .tenant_ledger import tenant_ledger_service
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+# Retry delays: base * 2^(attempts - 1), capped
+WEBHOOK_BACKOFF_BASE_SECONDS = int(os.getenv("WEBHOOK_BACKOFF_BASE_SECONDS", "15"))
+WEBHOOK_BACKOFF_MAX_SECONDS = int(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "1800"))
+# A claimed event whose worker died becomes due again after this long
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "120"))
+
+# Provider statuses that settle a mobile payment
+SUCCESS_STATUSES = {"SUCCESSFUL", "SUCCESS", "COMPLETED", "TS"}
+FAILED_STATUSES = {"FAILED", "REJECTED", "TIMEOUT", "TF"}
+
+UNFINISHED_STATUSES = ["pending", "processing"]
+
+def _parse_mtn(data: Dict) -> Dict:
+    return {
+        "transaction_id": data.get("financialTransactionId"),
+        "external_id": data.get("externalId"),
+        "status": data.get("status"),  # SUCCESSFUL, FAILED, PENDING
+        "amount": data.get("amount"),
+        "currency": data.get("currency"),
+        "failure_reason": data.get("reason")
+    }
+
+def _parse_airtel(data: Dict) -> Dict:
+    transaction = data.get("transaction", {}) or {}
+    return {
+        "transaction_id": transaction.get("id"),
+        "external_id": transaction.get("airtel_money_id"),
+        "status": transaction.get("status"),  # SUCCESS, FAILED, PENDING
+        "amount": transaction.get("amount"),
+        "currency": transaction.get("currency"),
+        "failure_reason": data.get("message")
+    }
+
+CALLBACK_PARSERS = {
+    "mtn": _parse_mtn,
+    "airtel": _parse_airtel,
+}
+
+def record_event(db: Session, provider: str, body: bytes) -> Tuple[InboundWebhookEvent, bool]:
+    """
+    Store a raw callback. Returns (event, created); a callback already seen
+    for the same provider, transaction id and status returns the stored event.
+    Raises ValueError if the body is not a JSON object.
+    """
+    payload = body.decode("utf-8") if isinstance(body, bytes) else body
+    data = json.loads(payload)
+    if not isinstance(data, dict):
+        raise ValueError("Callback body must be a JSON object")
+
+    fields = CALLBACK_PARSERS[provider](data)
+    # Without a provider transaction id, identical bodies are still deduplicated
+    transaction_id = str(fields["transaction_id"] or "sha256:" + hashlib.sha256(payload.encode("utf-8")).hexdigest())
+
+    provider_status = fields["status"]
+    existing = _find_event(db, provider, transaction_id, provider_status)
+    if existing:
+        return existing, False
+
+    event = InboundWebhookEvent(
+        provider=provider,
+        transaction_id=transaction_id,
+        external_id=fields["external_id"] or transaction_id,
+        provider_status=provider_status,
+        payload=payload,
+        status="pending",
+        attempts=0,
+        max_attempts=WEBHOOK_MAX_ATTEMPTS,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(event)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent delivery of the same callback
+        db.rollback()
+        return _find_event(db, provider, transaction_id, provider_status), False
+    db.refresh(event)
+    return event, True
+
+def _find_event(db: Session, provider: str, transaction_id: str, provider_status: Optional[str]) -> Optional[InboundWebhookEvent]:
+    return db.query(InboundWebhookEvent).filter(
+        InboundWebhookEvent.provider == provider,
+        InboundWebhookEvent.transaction_id == transaction_id,
+        func.coalesce(InboundWebhookEvent.provider_status, "") == (provider_status or "")
+    ).first()
+
+def apply_mobile_payment_update(
+    db: Session,
+    mobile_payment: MobilePayment,
+    provider_status: Optional[str],
+    transaction_id: Optional[str] = None,
+    data: Optional[Dict] = None,
+    failure_reason: Optional[str] = None
+) -> str:
+    """
+    Apply a provider status to a mobile payment: mark it paid (QR code used,
+    tenant paid through, confirmation email queued) or failed. The caller
+    commits. Returns what happened: paid, failed, pending or already_final.
+    """
+    if mobile_payment.status in [PaymentStatus.PAID, PaymentStatus.FAILED]:
+        # Settled by an earlier callback or status check; never apply twice
+        return "already_final"
+
+    if transaction_id:
+        mobile_payment.transaction_id = transaction_id
+    mobile_payment.provider_status = provider_status
+    if data is not None:
+        mobile_payment.provider_response = json.dumps(data)
+        mobile_payment.callback_data = json.dumps(data)
+
+    if provider_status in SUCCESS_STATUSES:
+        now = datetime.utcnow()
+        mobile_payment.status = PaymentStatus.PAID
+        mobile_payment.completed_at = now
+
+        if mobile_payment.qr_payment_id:
+            qr_payment = db.query(QRCodePayment).filter(QRCodePayment.id == mobile_payment.qr_payment_id).first()
+            if qr_payment:
+                qr_payment.status = QRCodeStatus.USED
+                qr_payment.used_at = now
+
+        if mobile_payment.tenant_id:
+            tenant = db.query(Tenant).filter(Tenant.id == mobile_payment.tenant_id).first()
+            if tenant:
+                tenant.last_payment_date = date.today()
+                tenant.updated_at = now
+
+                # Queue confirmation email, committed with the payment update
+                if tenant.email:
+                    enqueue_email(
+                        db,
+                        tenant.email,
+                        "Payment Confirmed",
+                        f"Your rent payment of {mobile_payment.currency} {mobile_payment.amount} has been received. Thank you!",
+                        source_type="mobile_payment",
+                        source_id=mobile_payment.id
+                    )
+
+                # The ledger's paid-through date accounts for earlier payments and credit;
+                # tenants without rent terms fall back to 30 days per month paid
+                tenant_ledger_service.post_mobile_payment(db, mobile_payment)
+                if not tenant_ledger_service.sync_tenant(db, tenant):
+                    tenant.next_payment_due = date.today() + timedelta(days=30 * (mobile_payment.months_advance or 1))
+                    tenant.rent_payment_status = "paid"
+        return "paid"
+
+    if provider_status in FAILED_STATUSES:
+        mobile_payment.status = PaymentStatus.FAILED
+        mobile_payment.failed_at = datetime.utcnow()
+        mobile_payment.failure_reason = failure_reason or "Payment failed"
+        return "failed"
+
+    return "pending"
+
+class InboundEventWorker:
+    """
+    Applies stored callbacks in the background.
+
+    Due events are claimed with a conditional UPDATE and a lease. Events for
+    the same external_id are claimed together only from the oldest
+    unfinished one, and are applied one after another by a single task, so
+    a late PENDING callback never overwrites an earlier SUCCESSFUL one.
+    Different external_ids are applied in parallel. Failures are retried
+    with exponential backoff and dead-lettered after max_attempts.
+    """
+
+    def __init__(self, max_workers: int = WEBHOOK_WORKERS, batch_size: int = WEBHOOK_BATCH_SIZE, poll_seconds: float = WEBHOOK_POLL_SECONDS):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.is_running = False
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> bool:
+        if self.is_running:
+            logger.warning("Inbound webhook worker is already running")
+            return False
+
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webhook-apply")
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run_loop, name="webhook-worker", daemon=True)
+        self._thread.start()
+        logger.info(f"Inbound webhook worker started with {self.max_workers} appliers")
+        return True
+
+    def stop(self):
+        self.is_running = False
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Inbound webhook worker stopped")
+
+    def notify(self):
+        """Wake the worker after a new event is stored instead of waiting for the next poll"""
+        self._wake_event.set()
+
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            claimed = 0
+            try:
+                claimed = self.drain_once()
+            except Exception as e:
+                logger.error(f"Error draining inbound webhook events: {str(e)}")
+            # Keep going while there is a backlog, otherwise poll
+            if claimed < self.batch_size:
+                self._wake_event.wait(self.poll_seconds)
+                self._wake_event.clear()
+
+    def drain_once(self) -> int:
+        """Claim one batch of due events and apply them. Returns the number claimed."""
+        groups = self._claim_batch()
+        if groups:
+            list(self._executor.map(self._apply_group, groups))
+        return sum(len(group) for group in groups)
+
+    def _claim_batch(self) -> List[List[int]]:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            due = db.query(InboundWebhookEvent.id, InboundWebhookEvent.external_id).filter(
+                or_(
+                    and_(InboundWebhookEvent.status == "pending", InboundWebhookEvent.next_attempt_at <= now),
+                    and_(InboundWebhookEvent.status == "processing", InboundWebhookEvent.locked_until < now)
+                )
+            ).order_by(InboundWebhookEvent.id.asc()).limit(self.batch_size).all()
+            if not due:
+                return []
+
+            # Per external_id, take due events in order up to the first one that is
+            # not due (backing off or held by another worker)
+            due_ids = {event_id for event_id, _ in due}
+            external_ids = list({external_id for _, external_id in due})
+            unfinished = db.query(InboundWebhookEvent.id, InboundWebhookEvent.external_id).filter(
+                InboundWebhookEvent.external_id.in_(external_ids),
+                InboundWebhookEvent.status.in_(UNFINISHED_STATUSES)
+            ).order_by(InboundWebhookEvent.id.asc()).all()
+
+            runnable: Dict[str, List[int]] = {}
+            blocked = set()
+            for event_id, external_id in unfinished:
+                if external_id in blocked:
+                    continue
+                if event_id in due_ids:
+                    runnable.setdefault(external_id, []).append(event_id)
+                else:
+                    blocked.add(external_id)
+
+            groups = []
+            lease = now + timedelta(seconds=WEBHOOK_LEASE_SECONDS)
+            for event_ids in runnable.values():
+                claimed = []
+                for event_id in event_ids:
+                    updated = db.query(InboundWebhookEvent).filter(
+                        InboundWebhookEvent.id == event_id,
+                        or_(
+                            InboundWebhookEvent.status == "pending",
+                            and_(InboundWebhookEvent.status == "processing", InboundWebhookEvent.locked_until < now)
+                        )
+                    ).update(
+                        {InboundWebhookEvent.status: "processing", InboundWebhookEvent.locked_until: lease},
+                        synchronize_session=False
+                    )
+                    if not updated:
+                        # Someone else got it; later events for this id must wait
+                        break
+                    claimed.append(event_id)
+                if claimed:
+                    groups.append(claimed)
+            db.commit()
+            return groups
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _apply_group(self, event_ids: List[int]):
+        """Apply one external_id's claimed events in order, stopping at the first failure"""
+        for position, event_id in enumerate(event_ids):
+            if not self._apply(event_id):
+                self._release(event_ids[position + 1:])
+                return
+
+    def _apply(self, event_id: int) -> bool:
+        """Apply one claimed event and record the outcome. Returns False if it will be retried."""
+        db = SessionLocal()
+        try:
+            event = db.query(InboundWebhookEvent).filter(InboundWebhookEvent.id == event_id).first()
+            if not event:
+                return True
+
+            try:
+                result = self._apply_event(db, event)
+                error = None
+            except Exception as e:
+                db.rollback()
+                result = None
+                error = str(e)
+
+            event.attempts = (event.attempts or 0) + 1
+            event.locked_until = None
+            if error is None:
+                event.status = "processed"
+                event.result = result
+                event.processed_at = datetime.utcnow()
+                event.last_error = None
+            else:
+                event.last_error = error
+                if event.attempts >= (event.max_attempts or WEBHOOK_MAX_ATTEMPTS):
+                    event.status = "dead"
+                    logger.warning(f"Inbound webhook event {event.id} dead-lettered after {event.attempts} attempts: {error}")
+                else:
+                    event.status = "pending"
+                    event.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff_seconds(event.attempts))
+            db.commit()
+            return error is None or event.status == "dead"
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error applying inbound webhook event {event_id}: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    def _apply_event(self, db: Session, event: InboundWebhookEvent) -> str:
+        data = json.loads(event.payload)
+        fields = CALLBACK_PARSERS[event.provider](data)
+
+        # Row lock so the pending payment poller cannot settle it concurrently
+        mobile_payment = None
+        if fields["external_id"]:
+            mobile_payment = db.query(MobilePayment).filter(
+                MobilePayment.external_id == fields["external_id"]
+            ).with_for_update().first()
+        if not mobile_payment and fields["transaction_id"]:
+            mobile_payment = db.query(MobilePayment).filter(
+                MobilePayment.transaction_id == fields["transaction_id"]
+            ).with_for_update().first()
+        if not mobile_payment:
+            return "payment_not_found"
+
+        return apply_mobile_payment_update(
+            db,
+            mobile_payment,
+            fields["status"],
+            transaction_id=fields["transaction_id"],
+            data=data,
+            failure_reason=fields["failure_reason"]
+        )
+
+    def _release(self, event_ids: List[int]):
+        """Hand claimed events back untouched after an earlier event for the same id failed"""
+        if not event_ids:
+            return
+        db = SessionLocal()
+        try:
+            db.query(InboundWebhookEvent).filter(
+                InboundWebhookEvent.id.in_(event_ids),
+                InboundWebhookEvent.status == "processing"
+            ).update(
+                {InboundWebhookEvent.status: "pending", InboundWebhookEvent.locked_until: None},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error releasing inbound webhook events: {str(e)}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def backoff_seconds(attempts: int) -> int:
+        return min(WEBHOOK_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), WEBHOOK_BACKOFF_MAX_SECONDS)
+
+    def get_status_counts(self, db: Session) -> Dict:
+        """Event counts per provider and status"""
+        rows = db.query(
+            InboundWebhookEvent.provider, InboundWebhookEvent.status, func.count(InboundWebhookEvent.id)
+        ).group_by(InboundWebhookEvent.provider, InboundWebhookEvent.status).all()
+
+        counts: Dict = {}
+        for provider, event_status, count in rows:
+            counts.setdefault(provider, {})[event_status] = count
+
+        oldest_pending = db.query(func.min(InboundWebhookEvent.received_at)).filter(
+            InboundWebhookEvent.status.in_(UNFINISHED_STATUSES)
+        ).scalar()
+
+        return {
+            "counts": counts,
+            "oldest_pending_at": oldest_pending.isoformat() if oldest_pending else None,
+            "worker_running": self.is_running
+        }
+
+    def get_events(
+        self,
+        db: Session,
+        status_filter: Optional[str] = None,
+        provider: Optional[str] = None,
+        external_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[InboundWebhookEvent]:
+        query = db.query(InboundWebhookEvent)
+        if status_filter:
+            query = query.filter(InboundWebhookEvent.status == status_filter)
+        if provider:
+            query = query.filter(InboundWebhookEvent.provider == provider)
+        if external_id:
+            query = query.filter(InboundWebhookEvent.external_id == external_id)
+        return query.order_by(InboundWebhookEvent.id.desc()).offset(skip).limit(limit).all()
+
+    def replay(
+        self,
+        db: Session,
+        event_ids: Optional[List[int]] = None,
+        status_filter: Optional[str] = "dead",
+        provider: Optional[str] = None,
+        received_since: Optional[datetime] = None
+    ) -> int:
+        """
+        Requeue events for immediate processing with a fresh attempt budget:
+        the given ids, or every event matching the filters. Applying is
+        idempotent, so replaying processed events is safe. Returns the count.
+        """
+        query = db.query(InboundWebhookEvent).filter(InboundWebhookEvent.status != "processing")
+        if event_ids:
+            query = query.filter(InboundWebhookEvent.id.in_(event_ids))
+        elif status_filter:
+            query = query.filter(InboundWebhookEvent.status == status_filter)
+        if provider:
+            query = query.filter(InboundWebhookEvent.provider == provider)
+        if received_since:
+            query = query.filter(InboundWebhookEvent.received_at >= received_since)
+
+        requeued = query.update({
+            InboundWebhookEvent.status: "pending",
+            InboundWebhookEvent.attempts: 0,
+            InboundWebhookEvent.next_attempt_at: datetime.utcnow(),
+            InboundWebhookEvent.locked_until: None,
+            InboundWebhookEvent.last_error: None
+        }, synchronize_session=False)
+        db.commit()
+        if requeued:
+            self.notify()
+        return requeued
+
+# Global instance
+inbound_event_worker = InboundEventWorker()
@@ -0,0 +1,105 @@
+"""
+Explode communication log delivery reports into communication_deliveries rows
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+from app.database import engine, SessionLocal, Base
+from app.models import CommunicationLog, CommunicationDelivery
+
+BATCH_SIZE = 500
+
+def _rows_for_log(log):
+    """One row per recipient and channel from a log's delivery_report JSON"""
+    try:
+        report = json.loads(log.delivery_report or "[]")
+    except (ValueError, TypeError):
+        return []
+
+    rows = []
+    for entry in report:
+        if not isinstance(entry, dict) or entry.get("tenant_id") is None:
+            continue
+
+        channels = [
+            channel for channel in ("email", "sms")
+            if f"{channel}_sent" in entry or entry.get(f"{channel}_error")
+        ]
+        if channels:
+            for channel in channels:
+                sent = bool(entry.get(f"{channel}_sent"))
+                rows.append({
+                    "log_id": log.id,
+                    "tenant_id": entry["tenant_id"],
+                    "channel": channel,
+                    "status": "sent" if sent else ("error" if entry.get(f"{channel}_error") else "failed"),
+                    "provider_message_id": entry.get(f"{channel}_message_id"),
+                    "provider_status": str(entry.get(f"{channel}_status") or entry.get(f"{channel}_status_code") or "") or None,
+                    "error": entry.get(f"{channel}_error"),
+                    "created_at": log.sent_at or log.created_at,
+                    "sent_at": (log.sent_at or log.created_at) if sent else None
+                })
+        else:
+            # Older reports only have an overall status; keep the log method as the channel
+            sent = entry.get("status") == "sent"
+            rows.append({
+                "log_id": log.id,
+                "tenant_id": entry["tenant_id"],
+                "channel": log.method,
+                "status": entry.get("status") or "failed",
+                "error": entry.get("error"),
+                "created_at": log.sent_at or log.created_at,
+                "sent_at": (log.sent_at or log.created_at) if sent else None
+            })
+    return rows
+
+def migrate_deliveries():
+    """Create communication_deliveries rows for logs that have none yet"""
+    Base.metadata.create_all(bind=engine, tables=[CommunicationDelivery.__table__])
+    db = SessionLocal()
+
+    try:
+        print("🔧 Exploding communication log delivery reports...")
+
+        migrated = {row[0] for row in db.query(CommunicationDelivery.log_id).distinct().all()}
+        log_ids = [
+            row[0] for row in db.query(CommunicationLog.id).filter(
+                CommunicationLog.delivery_report != None
+            ).order_by(CommunicationLog.id).all()
+            if row[0] not in migrated
+        ]
+        print(f"📋 Logs to migrate: {len(log_ids)} ({len(migrated)} already migrated)")
+
+        total_rows = 0
+        for start in range(0, len(log_ids), BATCH_SIZE):
+            chunk = log_ids[start:start + BATCH_SIZE]
+            rows = []
+            for log in db.query(CommunicationLog).filter(CommunicationLog.id.in_(chunk)).all():
+                rows.extend(_rows_for_log(log))
+
+            if rows:
+                db.bulk_insert_mappings(CommunicationDelivery, rows)
+            db.commit()
+            total_rows += len(rows)
+            print(f"   ➕ Logs {start + 1}-{start + len(chunk)}: {len(rows)} deliveries")
+
+        print(f"\n✅ Migrated {len(log_ids)} logs into {total_rows} delivery rows")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Error migrating deliveries: {str(e)}")
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        return False
+
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("\n🔧 Migrate Communication Deliveries Script")
+    print("=" * 50)
+    success = migrate_deliveries()
+    sys.exit(0 if success else 1)
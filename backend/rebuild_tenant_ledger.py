@@ -0,0 +1,63 @@
+"""
+Rebuild tenant ledger entries and balances from rent, payments and mobile payments
+
+Rent periods before a tenant's next_payment_due (or LEDGER_CUTOVER_DATE, if
+set) get an opening credit, since they were settled before the ledger existed.
+The credit is worked out once per tenant and kept; --reset-opening recomputes
+it from the current due dates (use only at a cutover).
+
+Usage:
+    python rebuild_tenant_ledger.py                       # every tenant
+    python rebuild_tenant_ledger.py --tenant-ids 4 9      # specific tenants
+    python rebuild_tenant_ledger.py --reset-opening       # recompute opening credits
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+from app.database import engine, SessionLocal, Base
+from app.models import Tenant, TenantLedgerEntry, TenantBalance
+from app.services.tenant_ledger import tenant_ledger_service, REBUILD_CHUNK_SIZE
+
+def rebuild_ledger(args):
+    """Replace each tenant's ledger, committing one chunk of tenants at a time"""
+    Base.metadata.create_all(bind=engine, tables=[TenantLedgerEntry.__table__, TenantBalance.__table__])
+    db = SessionLocal()
+
+    try:
+        print("🔧 Rebuilding tenant ledgers...")
+
+        if args.tenant_ids:
+            tenant_ids = sorted(set(args.tenant_ids))
+        else:
+            tenant_ids = [row[0] for row in db.query(Tenant.id).order_by(Tenant.id).all()]
+        print(f"📋 Tenants to rebuild: {len(tenant_ids)}")
+
+        for start in range(0, len(tenant_ids), REBUILD_CHUNK_SIZE):
+            chunk = tenant_ids[start:start + REBUILD_CHUNK_SIZE]
+            tenant_ledger_service.rebuild(db, chunk, reset_opening=args.reset_opening)
+            db.commit()
+            print(f"   ➕ Tenants {start + 1}-{start + len(chunk)} rebuilt")
+
+        print(f"\n✅ Rebuilt ledgers for {len(tenant_ids)} tenants")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Error rebuilding ledgers: {str(e)}")
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        return False
+
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild tenant ledgers")
+    parser.add_argument("--tenant-ids", type=int, nargs="+", help="Tenant ids to rebuild (default: all)")
+    parser.add_argument("--reset-opening", action="store_true", help="Recompute opening credits from current due dates")
+    print("\n🔧 Rebuild Tenant Ledger Script")
+    print("=" * 50)
+    success = rebuild_ledger(parser.parse_args())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,57 @@
+"""
+Requeue stored mobile money callbacks for the webhook worker to apply again
+
+Usage:
+    python replay_webhook_events.py                  # all dead events
+    python replay_webhook_events.py --ids 12 15      # specific events
+    python replay_webhook_events.py --status processed --provider mtn --since 2025-01-01
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+from datetime import datetime
+from app.database import engine, SessionLocal, Base
+from app.models import InboundWebhookEvent
+from app.services.webhook_events import inbound_event_worker
+
+def replay_events(args):
+    """Reset matching events to pending; a running app's worker picks them up"""
+    Base.metadata.create_all(bind=engine, tables=[InboundWebhookEvent.__table__])
+    db = SessionLocal()
+
+    try:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        print("🔁 Requeueing inbound webhook events...")
+        requeued = inbound_event_worker.replay(
+            db,
+            event_ids=args.ids,
+            status_filter=None if args.status == "any" else args.status,
+            provider=args.provider,
+            received_since=since
+        )
+        print(f"\n✅ Requeued {requeued} events")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Error replaying events: {str(e)}")
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        return False
+
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay inbound webhook events")
+    parser.add_argument("--ids", type=int, nargs="*", help="Event ids to replay (ignores --status)")
+    parser.add_argument("--status", default="dead", help="Event status to replay, or 'any' (default: dead)")
+    parser.add_argument("--provider", choices=["mtn", "airtel"], help="Only this provider's events")
+    parser.add_argument("--since", help="Only events received on or after this ISO date/time")
+
+    print("\n🔁 Replay Webhook Events Script")
+    print("=" * 50)
+    success = replay_events(parser.parse_args())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,146 @@
+"""
+Pending payment poller against a local stub of the MTN status API
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("requests")
+pytest.importorskip("redis")
+
+from app.database import Base, SessionLocal, engine
+from app.models.enums import PaymentMethod, PaymentStatus
+from app.models.mobile_payment import MobilePayment
+from app.services.mobile_money_service import mobile_money_service
+from app.services.payment_poller import PendingPaymentPoller
+
+STUB_DELAY_SECONDS = 0.2
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.query(MobilePayment).delete()
+    session.commit()
+    yield session
+    session.query(MobilePayment).delete()
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def mtn_stub(stub_server, monkeypatch):
+    """
+    MTN status stand-in: transaction ids starting with "paid" are SUCCESSFUL,
+    "failed" FAILED, anything else PENDING. Each answer takes a moment so
+    overlapping calls can be counted.
+    """
+    in_flight = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def handler(method, path, body):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        time.sleep(STUB_DELAY_SECONDS)
+        with lock:
+            in_flight["now"] -= 1
+
+        transaction_id = path.rsplit("/", 1)[-1]
+        if transaction_id.startswith("paid"):
+            return 200, {"status": "SUCCESSFUL"}
+        if transaction_id.startswith("failed"):
+            return 200, {"status": "FAILED", "reason": "stub failure"}
+        return 200, {"status": "PENDING"}
+
+    stub = stub_server(handler)
+    stub.in_flight = in_flight
+    monkeypatch.setattr(mobile_money_service, "mtn_api_url", stub.url)
+    monkeypatch.setattr(mobile_money_service, "mtn_api_key", "test-key")
+    return stub
+
+def _add_payments(db, transaction_ids, age=timedelta(minutes=5)):
+    payments = [
+        MobilePayment(
+            qr_payment_id=1,
+            unit_id=1,
+            payer_id=1,
+            amount=100000,
+            provider=PaymentMethod.MTN_MOBILE_MONEY,
+            external_id=f"ext-{uuid.uuid4().hex}",
+            transaction_id=transaction_id,
+            payer_phone_number="256700000000",
+            payee_phone_number="256700000001",
+            status=PaymentStatus.PENDING,
+            initiated_at=datetime.utcnow() - age
+        )
+        for transaction_id in transaction_ids
+    ]
+    db.add_all(payments)
+    db.commit()
+    return [payment.id for payment in payments]
+
+def _statuses(db, ids):
+    db.expire_all()
+    return {
+        payment.transaction_id: payment.status
+        for payment in db.query(MobilePayment).filter(MobilePayment.id.in_(ids))
+    }
+
+def test_due_payments_are_claimed_and_rescheduled(db, mtn_stub):
+    due_ids = _add_payments(db, ["pending-1", "pending-2"])
+    young_ids = _add_payments(db, ["pending-young"], age=timedelta(seconds=5))
+
+    summary = PendingPaymentPoller(batch_size=10, concurrency=4).poll(db)
+
+    assert summary["checked"] == 2
+    assert summary["pending"] == 2
+    assert sorted(request["path"] for request in mtn_stub.requests) == [
+        "/v1/requesttopay/pending-1", "/v1/requesttopay/pending-2"
+    ]
+
+    db.expire_all()
+    for payment in db.query(MobilePayment).filter(MobilePayment.id.in_(due_ids)):
+        assert payment.status_checked_at is not None
+        assert payment.next_status_check_at > datetime.utcnow()
+    young = db.query(MobilePayment).filter(MobilePayment.id.in_(young_ids)).one()
+    assert young.status_checked_at is None
+
+    # Rescheduled payments are not due again on the next run
+    assert PendingPaymentPoller(batch_size=10, concurrency=4).poll(db)["checked"] == 0
+
+def test_status_checks_are_bounded_by_concurrency(db, mtn_stub):
+    _add_payments(db, [f"pending-{i}" for i in range(9)])
+
+    summary = PendingPaymentPoller(batch_size=20, concurrency=3).poll(db)
+
+    assert summary["checked"] == 9
+    assert 1 < mtn_stub.in_flight["max"] <= 3
+
+def test_simulated_answers_are_skipped(db, monkeypatch):
+    monkeypatch.setattr(mobile_money_service, "mtn_api_key", None)
+    ids = _add_payments(db, ["paid-unconfigured"])
+
+    summary = PendingPaymentPoller(batch_size=10, concurrency=2).poll(db)
+
+    assert summary["skipped"] == 1
+    assert summary["paid"] == 0
+    assert _statuses(db, ids) == {"paid-unconfigured": PaymentStatus.PENDING}
+
+def test_settled_statuses_are_applied(db, mtn_stub):
+    ids = _add_payments(db, ["paid-1", "failed-1", "pending-1"])
+
+    summary = PendingPaymentPoller(batch_size=10, concurrency=3).poll(db)
+
+    assert (summary["paid"], summary["failed"], summary["pending"]) == (1, 1, 1)
+    assert _statuses(db, ids) == {
+        "paid-1": PaymentStatus.PAID,
+        "failed-1": PaymentStatus.FAILED,
+        "pending-1": PaymentStatus.PENDING
+    }
+    failed = db.query(MobilePayment).filter(MobilePayment.transaction_id == "failed-1").one()
+    assert failed.failure_reason
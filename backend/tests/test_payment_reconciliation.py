@@ -0,0 +1,111 @@
+"""
+Auto-matching unattributed mobile payments to tenants
+"""
+
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("requests")
+pytest.importorskip("redis")
+
+from app.database import Base, SessionLocal, engine
+from app.models.enums import PaymentMethod, PaymentStatus
+from app.models.mobile_payment import MobilePayment
+from app.models.tenant import Tenant
+from app.models.tenant_ledger import TenantBalance, TenantLedgerEntry
+from app.services.payment_reconciliation import payment_reconciliation_service
+from app.services.tenant_ledger import add_months
+
+RENT = Decimal("300000")
+PHONE = "256772000111"
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.query(TenantLedgerEntry).delete()
+    session.query(TenantBalance).delete()
+    session.query(MobilePayment).delete()
+    session.query(Tenant).delete()
+    session.commit()
+    session.close()
+
+def _tenant(db, **fields):
+    tenant = Tenant(
+        first_name="Test",
+        last_name="Tenant",
+        email=f"{uuid.uuid4().hex}@example.com",
+        phone=PHONE,
+        age=30,
+        national_id=uuid.uuid4().hex,
+        previous_address="1 Road",
+        previous_city="Kampala",
+        previous_state="Central",
+        previous_country="Uganda",
+        occupation="Teacher",
+        property_id=1,
+        unit_id=7,
+        monthly_rent=RENT,
+        **fields
+    )
+    db.add(tenant)
+    db.commit()
+    return tenant
+
+def _unattributed_payment(db, amount, phone=PHONE, unit_id=7):
+    payment = MobilePayment(
+        qr_payment_id=1,
+        unit_id=unit_id,
+        payer_id=1,
+        amount=amount,
+        provider=PaymentMethod.MTN_MOBILE_MONEY,
+        external_id=f"ext-{uuid.uuid4().hex}",
+        payer_phone_number=phone,
+        payee_phone_number="256700000001",
+        status=PaymentStatus.PAID,
+        completed_at=datetime.utcnow()
+    )
+    db.add(payment)
+    db.commit()
+    return payment
+
+def test_matched_payment_is_posted_to_the_ledger(db):
+    today = date.today()
+    move_in = add_months(today, -2)
+    # Three periods charged, none paid
+    tenant = _tenant(db, move_in_date=move_in, next_payment_due=move_in, rent_payment_status="overdue")
+    payment = _unattributed_payment(db, RENT)
+
+    result = payment_reconciliation_service.auto_match_payments(db=db)
+
+    assert result["matched"] == 1
+    db.expire_all()
+    assert db.query(MobilePayment).get(payment.id).tenant_id == tenant.id
+    balance = db.query(TenantBalance).filter(TenantBalance.tenant_id == tenant.id).one()
+    assert balance.balance == RENT * 2
+    tenant = db.query(Tenant).get(tenant.id)
+    assert tenant.rent_payment_status != "paid"
+    assert tenant.next_payment_due == add_months(move_in, 1)
+
+def test_phone_and_unit_match_with_wrong_amount_needs_review(db):
+    tenant = _tenant(db, move_in_date=add_months(date.today(), -1))
+    payment = _unattributed_payment(db, RENT / 3)
+
+    result = payment_reconciliation_service.auto_match_payments(db=db)
+
+    assert result["matched"] == 0
+    assert result["needs_review"] == [{
+        "mobile_payment_id": payment.id,
+        "tenant_id": tenant.id,
+        "confidence": 0.8,
+        "ambiguous": False,
+        "amount_matched": False
+    }]
+    db.expire_all()
+    assert db.query(MobilePayment).get(payment.id).tenant_id is None
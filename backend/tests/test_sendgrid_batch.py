@@ -0,0 +1,59 @@
+"""
+Batched SendGrid emails against a local stub of the v3 mail/send API
+"""
+
+import pytest
+
+pytest.importorskip("sendgrid")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("requests")
+pytest.importorskip("redis")
+
+from app.services import notification
+from app.services.notification import notification_service
+
+@pytest.fixture
+def sendgrid_stub(stub_server, monkeypatch):
+    """SendGrid stand-in that accepts every request except the second one"""
+    calls = {"count": 0}
+
+    def handler(method, path, body):
+        calls["count"] += 1
+        return (500, {"errors": [{"message": "stub failure"}]}) if calls["count"] == 2 else (202, None)
+
+    stub = stub_server(handler)
+    monkeypatch.setattr(notification, "SENDGRID_API_HOST", stub.url)
+    monkeypatch.setattr(notification_service, "sendgrid_api_key", "test-key")
+    return stub
+
+def _recipients(count):
+    return [
+        {"email": f"tenant{i}@example.com", "substitutions": {"{tenant_name}": f"Tenant {i}", "{amount}": i}}
+        for i in range(count)
+    ]
+
+def test_batches_are_chunked_at_1000_personalizations(sendgrid_stub):
+    notification_service.send_batch_email_blocking(_recipients(2500), "Rent due", "Hi {tenant_name}, {amount} is due")
+
+    assert [request["path"] for request in sendgrid_stub.requests] == ["/v3/mail/send"] * 3
+    sizes = [len(request["body"]["personalizations"]) for request in sendgrid_stub.requests]
+    assert sizes == [1000, 1000, 500]
+
+def test_each_personalization_carries_its_recipient_substitutions(sendgrid_stub):
+    notification_service.send_batch_email_blocking(_recipients(3), "Rent due", "Hi {tenant_name}, {amount} is due")
+
+    personalizations = sendgrid_stub.requests[0]["body"]["personalizations"]
+    substitutions = {p["to"][0]["email"]: p["substitutions"] for p in personalizations}
+    assert substitutions == {
+        f"tenant{i}@example.com": {"{tenant_name}": f"Tenant {i}", "{amount}": str(i)} for i in range(3)
+    }
+
+def test_results_are_recorded_per_chunk(sendgrid_stub):
+    recipients = _recipients(2500)
+    results = notification_service.send_batch_email_blocking(recipients, "Rent due", "Hi {tenant_name}")
+
+    assert [result["chunk"] for result in results] == [0, 1, 2]
+    assert [result["success"] for result in results] == [True, False, True]
+    assert [result["status_code"] for result in results] == [202, 500, 202]
+    assert results[1]["error"] == "SendGrid returned 500"
+    assert results[1]["emails"] == [recipient["email"] for recipient in recipients[1000:2000]]
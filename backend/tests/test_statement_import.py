@@ -0,0 +1,111 @@
+"""
+Statement imports: re-imported lines are duplicates and settling keeps the
+open payment's own reference
+"""
+
+import uuid
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("requests")
+pytest.importorskip("redis")
+
+from app.database import Base, SessionLocal, engine
+from app.models.enums import PaymentStatus, PaymentType
+from app.models.payment import Payment
+from app.models.tenant import Tenant
+from app.models.tenant_ledger import TenantBalance, TenantLedgerEntry
+from app.services.statement_import import statement_import_service
+
+RENT = Decimal("300000")
+PHONE = "256772000222"
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.query(TenantLedgerEntry).delete()
+    session.query(TenantBalance).delete()
+    session.query(Payment).delete()
+    session.query(Tenant).delete()
+    session.commit()
+    session.close()
+
+def _tenant(db):
+    tenant = Tenant(
+        first_name="Test",
+        last_name="Tenant",
+        email=f"{uuid.uuid4().hex}@example.com",
+        phone=PHONE,
+        age=30,
+        national_id=uuid.uuid4().hex,
+        previous_address="1 Road",
+        previous_city="Kampala",
+        previous_state="Central",
+        previous_country="Uganda",
+        occupation="Teacher",
+        property_id=1,
+        unit_id=1,
+        move_in_date=date(2026, 1, 1),
+        monthly_rent=RENT
+    )
+    db.add(tenant)
+    db.commit()
+    return tenant
+
+def _import(db, csv):
+    return statement_import_service.import_statement(
+        db, csv.encode(), "statement.csv", "mtn", user_id=1, commit=True
+    )
+
+def _line(result):
+    (line,) = result["lines"]
+    return line
+
+def test_reimported_line_without_reference_is_a_duplicate(db):
+    tenant = _tenant(db)
+    csv = f"date,amount,phone\n2026-10-05,300000,0{PHONE[-9:]}\n"
+
+    first = _import(db, csv)
+    assert _line(first)["action"] == "create"
+    assert first["created"] == 1
+
+    second = _import(db, csv)
+    assert _line(second)["status"] == "duplicate"
+    assert second["duplicates"] == 1
+    assert db.query(Payment).filter(Payment.tenant_id == tenant.id).count() == 1
+
+def test_settling_keeps_the_open_payments_reference(db):
+    tenant = _tenant(db)
+    invoice = Payment(
+        unit_id=1,
+        tenant_id=tenant.id,
+        payer_id=1,
+        amount=RENT,
+        payment_type=PaymentType.RENT,
+        status=PaymentStatus.PENDING,
+        due_date=date(2026, 10, 1),
+        reference_number="INV-1"
+    )
+    db.add(invoice)
+    db.commit()
+
+    csv = f"date,amount,phone,reference\n2026-10-05,300000,{PHONE},inv1\n"
+    result = _import(db, csv)
+
+    assert _line(result)["action"] == "settle"
+    db.expire_all()
+    settled = db.query(Payment).get(invoice.id)
+    assert settled.status == PaymentStatus.PAID
+    assert settled.reference_number == "INV-1"
+
+    # The same line again is not settled or created twice
+    again = _import(db, csv)
+    assert _line(again)["status"] == "duplicate"
+    assert db.query(Payment).filter(Payment.tenant_id == tenant.id).count() == 1
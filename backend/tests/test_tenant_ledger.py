@@ -0,0 +1,197 @@
+"""
+Tenant ledger rebuilds: opening balance from pre-ledger state and syncing
+the tenant's due date and status from the balance
+"""
+
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("requests")
+pytest.importorskip("redis")
+
+from app.crud.payment import payment_crud
+from app.database import Base, SessionLocal, engine
+from app.models.enums import PaymentStatus, PaymentType
+from app.models.payment import Payment
+from app.models.tenant import Tenant
+from app.models.tenant_ledger import TenantBalance, TenantLedgerEntry
+from app.schemas.payment import PaymentCreate, PaymentUpdate
+from app.services.tenant_ledger import TenantLedgerService, add_months, tenant_ledger_service
+
+RENT = Decimal("500000")
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.query(TenantLedgerEntry).delete()
+    session.query(TenantBalance).delete()
+    session.query(Payment).delete()
+    session.query(Tenant).delete()
+    session.commit()
+    session.close()
+
+def _tenant(db, move_in, **fields):
+    tenant = Tenant(
+        first_name="Test",
+        last_name="Tenant",
+        email=f"{uuid.uuid4().hex}@example.com",
+        phone="256700000000",
+        age=30,
+        national_id=uuid.uuid4().hex,
+        previous_address="1 Road",
+        previous_city="Kampala",
+        previous_state="Central",
+        previous_country="Uganda",
+        occupation="Teacher",
+        property_id=1,
+        unit_id=1,
+        move_in_date=move_in,
+        monthly_rent=RENT,
+        **fields
+    )
+    db.add(tenant)
+    db.commit()
+    return tenant
+
+def _balance(db, tenant):
+    return db.query(TenantBalance).filter(TenantBalance.tenant_id == tenant.id).one()
+
+def test_opening_credit_covers_periods_before_next_payment_due(db):
+    today = date.today()
+    move_in = add_months(today, -12)
+    next_due = add_months(move_in, 13)
+    tenant = _tenant(db, move_in, next_payment_due=next_due, rent_payment_status="paid")
+
+    TenantLedgerService().rebuild(db, [tenant.id], as_of=today)
+
+    balance = _balance(db, tenant)
+    # 13 periods charged up to today, 13 settled before the ledger
+    assert balance.balance == 0
+    assert balance.paid_through == next_due - timedelta(days=1)
+    opening = db.query(TenantLedgerEntry).filter(
+        TenantLedgerEntry.tenant_id == tenant.id,
+        TenantLedgerEntry.source_type == "opening"
+    ).one()
+    assert opening.amount == RENT * 13
+
+def test_overdue_tenant_keeps_arrears_after_next_payment_due(db):
+    today = date.today()
+    move_in = add_months(today, -12)
+    next_due = add_months(move_in, 10)
+    tenant = _tenant(db, move_in, next_payment_due=next_due, rent_payment_status="overdue")
+    service = TenantLedgerService()
+
+    service.rebuild(db, [tenant.id], as_of=today)
+    assert _balance(db, tenant).balance == RENT * 3
+
+    assert service.sync_tenant(db, tenant)
+    assert tenant.next_payment_due == next_due
+    assert tenant.rent_payment_status == "overdue"
+
+def test_cutover_date_settles_earlier_periods(db):
+    today = date.today()
+    move_in = add_months(today, -12)
+    tenant = _tenant(db, move_in)
+
+    TenantLedgerService(cutover_date=add_months(move_in, 12)).rebuild(db, [tenant.id], as_of=today)
+
+    assert _balance(db, tenant).balance == RENT
+
+def test_sync_never_moves_next_payment_due_earlier(db):
+    today = date.today()
+    move_in = add_months(today, -2)
+    next_due = add_months(today, 2)
+    tenant = _tenant(db, move_in, next_payment_due=next_due, rent_payment_status="paid")
+    service = TenantLedgerService()
+    service.rebuild(db, [tenant.id], as_of=today)
+
+    # A later data fix lowers the ledger's paid-through date
+    balance = _balance(db, tenant)
+    balance.paid_through = today
+    balance.balance = RENT
+
+    assert service.sync_tenant(db, tenant)
+    assert tenant.next_payment_due == next_due
+    assert tenant.rent_payment_status != "paid"
+
+def test_first_post_with_existing_balance_row_does_not_rebuild(db):
+    today = date.today()
+    tenant = _tenant(db, add_months(today, -1))
+    db.add(TenantBalance(tenant_id=tenant.id, balance=0, total_charged=0, total_paid=0, other_charged=0))
+    db.commit()
+
+    TenantLedgerService().post_payment(db, tenant.id, RENT, today, "payment", 1)
+    db.commit()
+
+    balance = _balance(db, tenant)
+    assert balance.total_paid == RENT
+    assert db.query(TenantLedgerEntry).filter(TenantLedgerEntry.tenant_id == tenant.id).count() == 1
+
+def test_first_post_creates_the_balance_row_and_rebuilds(db):
+    today = date.today()
+    tenant = _tenant(db, add_months(today, -1))
+
+    TenantLedgerService().post_payment(db, tenant.id, RENT, today, "payment", 1)
+    db.commit()
+
+    balance = _balance(db, tenant)
+    assert balance.total_charged == RENT * 2
+    assert balance.balance == RENT
+
+def _pay(db, tenant, amount):
+    return payment_crud.create_payment(db, PaymentCreate(
+        unit_id=1,
+        payer_id=1,
+        tenant_id=tenant.id,
+        amount=amount,
+        payment_type=PaymentType.RENT,
+        status=PaymentStatus.PAID,
+        due_date=date.today(),
+        paid_date=date.today()
+    ))
+
+def test_deleting_or_editing_a_payment_reverts_the_balance(db):
+    today = date.today()
+    move_in = add_months(today, -2)
+    # Three periods charged, the first two settled before the ledger
+    tenant = _tenant(db, move_in, next_payment_due=add_months(move_in, 2), rent_payment_status="overdue")
+
+    payment = _pay(db, tenant, RENT)
+    assert _balance(db, tenant).balance == 0
+    assert _balance(db, tenant).opening_credit == RENT * 2
+
+    # The payment moves the due date forward; rebuilds must not fold it into the credit
+    tenant_ledger_service.sync_tenant(db, tenant)
+    db.commit()
+    assert tenant.next_payment_due == add_months(move_in, 3)
+
+    payment_crud.update_payment(db, payment.id, PaymentUpdate(amount=RENT / 2))
+    db.expire_all()
+    assert _balance(db, tenant).balance == RENT / 2
+
+    payment_crud.delete_payment(db, payment.id)
+    db.expire_all()
+    assert _balance(db, tenant).balance == RENT
+    assert _balance(db, tenant).paid_through == add_months(move_in, 2) - timedelta(days=1)
+
+def test_reset_opening_recomputes_from_the_due_date(db):
+    today = date.today()
+    move_in = add_months(today, -2)
+    tenant = _tenant(db, move_in)
+    service = TenantLedgerService()
+    service.rebuild(db, [tenant.id], as_of=today)
+    assert _balance(db, tenant).balance == RENT * 3
+
+    tenant.next_payment_due = add_months(move_in, 3)
+    service.rebuild(db, [tenant.id], as_of=today)
+    assert _balance(db, tenant).balance == RENT * 3
+
+    service.rebuild(db, [tenant.id], as_of=today, reset_opening=True)
+    assert _balance(db, tenant).balance == 0
@@ -176,7 +176,7 @@ const Communications = () => {
       const result = await communicationsAPI.sendBulkMessage(messageData);
       setSnackbar({
         open: true,
-        message: `Sent to ${result.sent} recipient${result.sent === 1 ? '' : 's'}`,
+        message: `Sending to ${result.total_recipients} recipient${result.total_recipients === 1 ? '' : 's'}`,
         severity: 'success',
       });
       setOpenBulkMessageDialog(false);